@@ -0,0 +1,261 @@
+"""
+Table of cell properties stored column-wise in numpy arrays.
+
+The table is extracted from parsed cards in one pass and is used to select
+cells by number, material or universe, to compute new cell densities for all
+cells at once, e.g. in the cdens mode, and to sum volumes and weights of
+cells by material in the matinfo mode.
+"""
+
+from __future__ import print_function
+
+import re
+
+try:
+    # try because numpy might be unavailable.
+    import numpy
+except ImportError:
+    print("Numpy package is required for --mode variants and matinfo but ")
+    print("cannot be found. Install it with ")
+    print("")
+    print(" > pip install numpy")
+    print("")
+    raise
+except:
+    raise
+
+from numjuggler import parser as mp
+from numjuggler.materials import avogadro
+
+# Importance keys, as returned by Card.get_imp()
+imp_keys = ('imp:n', 'imp:p', 'imp:e')
+
+# MAT and RHO parameters of like-but cells
+re_mat = re.compile(r'(?<![a-z])mat\s*=?\s*(\d+)(?![\d.])', re.I)
+re_rho = re.compile(r'(?<![a-z])rho\s*=?\s*([-+]?[\d.]+(e[-+]?\d+)?)', re.I)
+
+
+class CellTable(object):
+    """
+    Properties of cells in the input file, one row per cell card.
+
+    Columns are numpy arrays:
+
+        index -- position of the cell card in the list of cards
+        name  -- cell number
+        mat   -- material number. 0 for void, -2 for like-but cells
+        dens  -- density as given in the input. 0 for void, -100 for like-but
+                 cells
+        u     -- universe the cell belongs to. 0 if not specified
+        fill  -- universe the cell is filled with. 0 if not specified
+        imp   -- dictionary, key -> array of importances, for keys in
+                 imp_keys, as returned by Card.get_imp(). Importances not
+                 specified in the cell card are nan.
+
+    Like-but cells are listed in the dictionary like, row -> (cell, mat,
+    rho), where cell is the name of the referenced cell, mat and rho -- the
+    MAT and RHO parameters, or None if not given.
+
+    Method get_values() must be called for all cell cards before the table is
+    constructed.
+    """
+    def __init__(self, cards):
+        index = []
+        name = []
+        mat = []
+        dens = []
+        u = []
+        fill = []
+        imp = dict((k, []) for k in imp_keys)
+        like = {}
+        for i, c in enumerate(cards):
+            if c.ctype != mp.CID.cell:
+                continue
+            if c.get_m() == -2:
+                inpt = c.card(comment=False)
+                inpt = inpt[inpt.lower().index('but') + 3:]
+                m = re_mat.search(inpt)
+                r = re_rho.search(inpt)
+                like[len(index)] = (c.values[1][0],
+                                    int(m.group(1)) if m else None,
+                                    float(r.group(1)) if r else None)
+            index.append(i)
+            name.append(c.name)
+            mat.append(c.get_m())
+            dens.append(c.get_d())
+            u.append(c.get_u() or 0)
+            fill.append(c.get_f() or 0)
+            ci = c.get_imp()
+            for k in imp_keys:
+                imp[k].append(ci.get(k, numpy.nan))
+
+        self.index = numpy.array(index, dtype=int)
+        self.name = numpy.array(name, dtype=int)
+        self.mat = numpy.array(mat, dtype=int)
+        self.dens = numpy.array(dens, dtype=float)
+        self.u = numpy.array(u, dtype=int)
+        self.fill = numpy.array(fill, dtype=int)
+        self.imp = dict((k, numpy.array(v, dtype=float))
+                        for k, v in imp.items())
+        self.like = like
+
+        # Sorting orders of columns, computed when needed
+        self.__orders = {}
+        return
+
+    def __len__(self):
+        return len(self.index)
+
+    def select(self, col, r):
+        """
+        Return array of rows where column col (one of 'name', 'mat', 'u',
+        'fill' or a one-letter abbreviation 'c', 'm', 'u', 'f') has values in
+        the range r, an instance of likefunc.Range.
+        """
+        col = {'c': 'name', 'm': 'mat', 'f': 'fill'}.get(col, col)
+        if col not in self.__orders:
+            a = getattr(self, col)
+            o = numpy.argsort(a, kind='mergesort')
+            self.__orders[col] = (o, a[o])
+        o, a = self.__orders[col]
+        i1 = numpy.searchsorted(a, r.x1, side='left')
+        i2 = numpy.searchsorted(a, r.x2, side='right')
+        return o[i1:i2]
+
+    def resolved(self):
+        """
+        Return tuple (mat, dens) of arrays of materials and densities, where
+        like-but cells get the MAT and RHO parameters or, if not given, the
+        material and density of the referenced cell. Like-but cells referring
+        to cells not in the table keep mat -2 and density -100.
+        """
+        mat = self.mat.copy()
+        dens = self.dens.copy()
+        rows = dict(zip(self.name.tolist(), range(len(self))))
+        todo = dict(self.like)
+        while todo:
+            # referenced cells can be like-but cells themselves
+            done = []
+            for i, (ref, m, r) in todo.items():
+                j = rows.get(ref)
+                if j is None or j in todo:
+                    continue
+                mat[i] = mat[j] if m is None else m
+                dens[i] = dens[j] if r is None else r
+                if mat[i] == 0:
+                    dens[i] = 0
+                done.append(i)
+            if not done:
+                break
+            for i in done:
+                del todo[i]
+        return mat, dens
+
+    def mass_densities(self, mats):
+        """
+        Return array of cell densities in g/cm3. Atomic densities are
+        converted with the molar masses of materials, mats is a dictionary
+        material number -> materials.Material. Void cells, and cells with
+        atomic density whose material is not in mats, get 0. Materials and
+        densities of like-but cells are resolved, see resolved(); unresolved
+        like-but cells get nan.
+        """
+        mat, dens = self.resolved()
+        mu, inv = numpy.unique(mat, return_inverse=True)
+        mm = numpy.array([mats[m].molar_mass() if m in mats else 0.
+                          for m in mu.tolist()])
+        res = numpy.where(dens > 0, dens * mm[inv] / avogadro, -dens)
+        res[mat == 0] = 0.
+        res[mat == -2] = numpy.nan
+        return res
+
+    def no_material(self, mats):
+        """
+        Return array of names of cells with atomic density whose material is
+        not in mats, a dictionary as in mass_densities().
+        """
+        mat, dens = self.resolved()
+        known = numpy.array(sorted(mats), dtype=int)
+        rows = (dens > 0) & (mat > 0) & ~numpy.isin(mat, known)
+        return self.name[rows]
+
+    def material_weights(self, cn, cv, mats):
+        """
+        Return tuple (m, v, w, missing) of arrays: material numbers, their
+        volumes and weights, and names of cells without volume. Cell volumes
+        cv are given for cell numbers cn, mats is as in mass_densities().
+        Weights of void cells and of cells without material card are 0.
+        Like-but cells are included with their resolved material and
+        density, unresolved ones are not included.
+        """
+        mat = self.resolved()[0]
+        o = numpy.argsort(cn, kind='mergesort')
+        cs = numpy.asarray(cn)[o]
+        pos = numpy.searchsorted(cs, self.name)
+        found = pos < len(cs)
+        found[found] = cs[pos[found]] == self.name[found]
+        missing = self.name[~found]
+        found &= mat != -2
+        v = numpy.asarray(cv, dtype=float)[o][pos[found]]
+        rho = self.mass_densities(mats)[found]
+
+        m, inv = numpy.unique(mat[found], return_inverse=True)
+        vol = numpy.bincount(inv, weights=v, minlength=len(m))
+        wgt = numpy.bincount(inv, weights=v * rho, minlength=len(m))
+        return m, vol, wgt, missing
+
+    def scale_densities(self, rules, default={}):
+        """
+        Return dictionary row -> new density string, for cells whose density
+        is changed by the cdens rules.
+
+        rules is an OrderedDict of the form (t, Range) -> (coef, fmt), and
+        default is a dictionary t -> (coef, fmt), as returned by
+        mapparsers.cdens(). Rules of type 'c' select cells by number, rules of
+        type 'm' -- by material. Each cell's density is multiplied by
+        coefficients of all rules selecting it, in the order of rules, and is
+        rounded after each multiplication according to the rule's format. The
+        default coefficients are applied to cells not selected by any rule.
+        Densities of void and like-but cells are not changed.
+        """
+        dens = self.dens.copy()
+        selected = numpy.zeros(len(self), dtype=bool)
+        res = {}
+        for (t, r), (coef, fmt) in rules.items():
+            if t not in 'cm':
+                continue
+            rows = self.select(t, r)
+            selected[rows] = True
+            rows = rows[self.mat[rows] > 0]
+            strs = [fmt.format(d) for d in (dens[rows] * coef).tolist()]
+            dens[rows] = [float(s) for s in strs]
+            res.update(zip(rows.tolist(), strs))
+
+        if default:
+            rows = numpy.nonzero(~selected & (self.mat > 0))[0]
+            dnew = dens[rows]
+            for t, (coef, fmt) in default.items():
+                dnew = dnew * coef
+            strs = [fmt.format(d) for d in dnew.tolist()]
+            res.update(zip(rows.tolist(), strs))
+        return res
+
+    def render_densities(self, cards, base, dstrings):
+        """
+        Iterable over strings of the input file with new densities.
+
+        base is the list of cards rendered with the original densities and
+        dstrings is a dictionary row -> density string, as returned by
+        scale_densities(). Only cards with changed densities are rendered
+        again; cards are restored after rendering.
+        """
+        changed = {}
+        for row, s in dstrings.items():
+            i = self.index[row]
+            c = cards[i]
+            dorig = c.hidden['~'][0]
+            c.set_d(s)
+            changed[i] = c.card()
+            c.set_d(dorig)
+        for i, text in enumerate(base):
+            yield changed.get(i, text)
@@ -0,0 +1,180 @@
+"""
+Complexity of cell geometry descriptions.
+
+For each cell card the geometry part is read once and the metrics that drive
+MCNP tracking time and memory are computed: number of surfaces (all and
+unique), number of complement operators, parentheses nesting depth, number of
+unions and number of words, i.e. entries stored by MCNP in its lja array.
+"""
+
+from __future__ import print_function
+
+import re
+
+from numjuggler import parser as mp
+from numjuggler import scanner
+
+# Geometry tokens: cell complement, complement, surface, parentheses, union
+re_geom = re.compile(r'#\d+|#|\d+|[():]')
+
+# Columns of the statistics table: attribute name and column header
+columns = (('name', 'Cell'),
+           ('pos', 'Line'),
+           ('surfaces', 'all'),
+           ('unique', 'unique'),
+           ('hashcell', '#cell'),
+           ('hashsurf', '#surf'),
+           ('depth', 'depth'),
+           ('unions', 'unions'),
+           ('words', 'words'),
+           ('lja', 'lja'))
+
+
+class CellStats(object):
+    """
+    Complexity metrics of one cell.
+
+    Attributes:
+
+        name -- cell number
+        pos -- line number of the cell card in the input file
+        surfaces -- list of surfaces in the geometry, with repetitions
+        unique -- number of unique surfaces
+        hashcell -- number of cell complements, #n
+        hashsurf -- number of complements of surface combinations, #(...)
+        depth -- maximal nesting depth of parentheses
+        unions -- number of union operators
+        words -- number of geometry words: surfaces, cells, operators and
+                 parentheses
+        lja -- estimate of the cell's contribution to the MCNP lja array.
+               Complements add to the array later, when MCNP expands them,
+               and are not included
+    """
+    def __init__(self, name, pos, geom):
+        self.name = name
+        self.pos = pos
+        self.surfaces = []
+        self.hashcell = 0
+        self.hashsurf = 0
+        self.depth = 0
+        self.unions = 0
+        self.words = 0
+        self.lja = 0
+
+        d = 0
+        for m in re_geom.finditer(geom):
+            s = m.group()
+            if s[0] == '#':
+                if len(s) > 1:
+                    self.hashcell += 1
+                    self.words += 1
+                else:
+                    self.hashsurf += 1
+            elif s == '(':
+                d += 1
+                self.depth = max(self.depth, d)
+            elif s == ')':
+                d -= 1
+            elif s == ':':
+                self.unions += 1
+            else:
+                self.surfaces.append(int(s))
+            self.words += 1
+        self.unique = len(set(self.surfaces))
+        return
+
+    def row(self):
+        """
+        Return tuple of values, in order of columns.
+        """
+        return tuple(len(self.surfaces) if a == 'surfaces'
+                     else getattr(self, a) for a, h in columns)
+
+
+def geometry(inpt):
+    """
+    Return tuple (name, geom) for the meaningful part inpt of a cell card,
+    where geom is the part of the card describing the cell geometry. For
+    like-but cells geom is an empty string.
+    """
+    t = inpt.replace('=', ' ').split()
+    name = int(t.pop(0))
+    if t[0].lower() == 'like':
+        return name, ''
+    if int(t.pop(0)) != 0:
+        t.pop(0)  # density
+    geom = []
+    for e in t:
+        if e[0].isalpha() or e[0] == '*':
+            break
+        geom.append(e)
+    return name, ' '.join(geom)
+
+
+def cell_stats(card, pos=None):
+    """
+    Return CellStats for the cell card given as string, or None if the card
+    has no meaningful part. The lja estimate depends on the preceding cells
+    and is left zero, see estimate_lja().
+    """
+    inpt = scanner._meaningful(card.splitlines(True))
+    if not inpt.strip():
+        return None
+    name, geom = geometry(inpt)
+    return CellStats(name, pos, geom)
+
+
+def estimate_lja(stats):
+    """
+    Set the lja attribute of CellStats in stats, given in order of the cells
+    in the input file, and yield them.
+
+    The lja contribution of a cell is estimated as in the minfo mode: 17
+    entries per word, or 7 entries per word when more than 50 cells are read
+    and the array is longer than 3250 entries.
+    """
+    ic = 0
+    mlja = 0
+    for cs in stats:
+        ic += 1
+        if ic > 50 and mlja > 3250:
+            cs.lja = 7 * cs.words
+        else:
+            cs.lja = 17 * cs.words
+        mlja += cs.lja
+        yield cs
+
+
+def get_stats(inp, preservetabs=False):
+    """
+    Iterable over CellStats for cells of the input file inp, in order of
+    their appearance, with the lja estimate set. Cards are read block by
+    block, without parsing them.
+    """
+    def stats():
+        for lines, ctype, pos in mp.get_raw_cards(inp,
+                                                  preservetabs=preservetabs):
+            if ctype == mp.CID.surface:
+                break
+            if ctype == mp.CID.cell:
+                cs = cell_stats(''.join(lines), pos)
+                if cs is not None:
+                    yield cs
+    return estimate_lja(stats())
+
+
+def histogram(values):
+    """
+    Return list of tuples (v1, v2, n), where n is the number of values in
+    the range v1 <= v < v2. Ranges are powers of 2: [0, 1), [1, 2), [2, 4),
+    etc.
+    """
+    counts = {}
+    for v in values:
+        b = 0 if v < 1 else int(v).bit_length()
+        counts[b] = counts.get(b, 0) + 1
+    res = []
+    for b in range(max(counts) + 1 if counts else 0):
+        v1 = 0 if b == 0 else 2**(b - 1)
+        res.append((v1, 2**b, counts.get(b, 0)))
+    return res
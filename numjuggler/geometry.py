@@ -0,0 +1,234 @@
+"""
+Boolean simplification of cell geometry descriptions.
+
+The geometry part of a cell card is read into an expression tree of
+intersections, unions and complements of signed surfaces. The tree is
+simplified with the rules of Boolean algebra:
+
+    * repeated operands are removed: `1 1 -2` -> `1 -2`, `(1:1)` -> `1`,
+    * absorption: `1 (1:2)` -> `1`, `1 : 1 2` -> `1`,
+    * contradictions: `1 -1` is empty, `1 : -1` is the whole space,
+    * nested intersections or unions are merged and parentheses around
+      single operands are removed.
+
+Operands are compared up to the order of their parts, i.e. `(1 2)` and
+`(2 1)` are the same. Cell complements `#n` are not expanded and are
+treated as operands.
+"""
+
+from __future__ import print_function
+
+import re
+
+# Geometry tokens: cell complement, complement, signed surface or facet,
+# parentheses, union.
+re_token = re.compile(r'\s*(#\s*\d+|#|[-+]?\d+(?:\.\d+)?|[():])')
+
+# Constants: empty set and the whole space
+FALSE = ('false',)
+TRUE = ('true',)
+
+
+def tokens(geom):
+    """
+    Return list of tokens in the geometry string geom. Signs `+` and
+    spaces after `#` are removed. ValueError is raised if geom contains
+    anything else than geometry tokens and spaces.
+    """
+    res = []
+    i = 0
+    geom = geom.rstrip()
+    while i < len(geom):
+        m = re_token.match(geom, i)
+        if not m:
+            raise ValueError('Unexpected geometry entry: {}'.format(geom[i:]))
+        t = m.group(1)
+        if t[0] == '#':
+            t = t.replace(' ', '')
+        elif t[0] == '+':
+            t = t[1:]
+        res.append(t)
+        i = m.end()
+    return res
+
+
+def parse(geom):
+    """
+    Return expression tree for the geometry string geom.
+
+    Nodes of the tree are: strings for signed surfaces ('-1', '2.3') and
+    cell complements ('#5'), tuples ('not', node) for complements,
+    ('and', nodes) for intersections and ('or', nodes) for unions.
+    """
+    tl = tokens(geom)
+    node, i = _union(tl, 0)
+    if i != len(tl):
+        raise ValueError('Unbalanced parentheses in geometry')
+    return node
+
+
+def _union(tl, i):
+    ol = []
+    while True:
+        node, i = _intersection(tl, i)
+        ol.append(node)
+        if i < len(tl) and tl[i] == ':':
+            i += 1
+        else:
+            break
+    return (ol[0] if len(ol) == 1 else ('or', tuple(ol))), i
+
+
+def _intersection(tl, i):
+    ol = []
+    while i < len(tl) and tl[i] not in ':)':
+        node, i = _factor(tl, i)
+        ol.append(node)
+    if not ol:
+        raise ValueError('Empty geometry term')
+    return (ol[0] if len(ol) == 1 else ('and', tuple(ol))), i
+
+
+def _factor(tl, i):
+    t = tl[i]
+    if t == '#':
+        if i + 1 >= len(tl) or tl[i + 1] != '(':
+            raise ValueError('Complement without parentheses')
+        node, i = _factor(tl, i + 1)
+        return ('not', node), i
+    if t == '(':
+        node, i = _union(tl, i + 1)
+        if i >= len(tl) or tl[i] != ')':
+            raise ValueError('Unbalanced parentheses in geometry')
+        return node, i + 1
+    return t, i + 1
+
+
+def key(node):
+    """
+    Return hashable key of node, that does not depend on the order of
+    operands in intersections and unions.
+    """
+    if isinstance(node, str):
+        return node
+    if node[0] in ('and', 'or'):
+        return (node[0], frozenset(key(n) for n in node[1]))
+    if node[0] == 'not':
+        return ('not', key(node[1]))
+    return node
+
+
+def _negated(k):
+    """
+    Return key of the complement of the node with key k, if it can be
+    written without complement operator, otherwise None.
+    """
+    if isinstance(k, str):
+        if k[0] == '#':
+            return None
+        return k[1:] if k[0] == '-' else '-' + k
+    if k[0] == 'not':
+        return k[1]
+    return None
+
+
+def simplify(node):
+    """
+    Return simplified expression tree.
+    """
+    if isinstance(node, str):
+        return node
+    if node[0] == 'not':
+        n = simplify(node[1])
+        if n == TRUE:
+            return FALSE
+        if n == FALSE:
+            return TRUE
+        if isinstance(n, str) and n[0] != '#':
+            return _negated(n)
+        if not isinstance(n, str) and n[0] == 'not':
+            return n[1]
+        return ('not', n)
+    if node[0] in ('and', 'or'):
+        return _simplify_op(node[0], node[1])
+    return node
+
+
+def _simplify_op(op, operands):
+    if op == 'and':
+        neutral, dominant, dual = TRUE, FALSE, 'or'
+    else:
+        neutral, dominant, dual = FALSE, TRUE, 'and'
+
+    # simplify operands and merge nested operations of the same type
+    ol = []
+    for n in operands:
+        n = simplify(n)
+        if n == neutral:
+            continue
+        if n == dominant:
+            return dominant
+        if isinstance(n, tuple) and n[0] == op:
+            ol.extend(n[1])
+        else:
+            ol.append(n)
+
+    # remove repeated operands
+    kl = []
+    seen = set()
+    for n in ol:
+        k = key(n)
+        if k not in seen:
+            seen.add(k)
+            kl.append((k, n))
+
+    # contradiction: operand together with its complement
+    for k, n in kl:
+        nk = _negated(k)
+        if nk is not None and nk in seen:
+            return dominant
+
+    # absorption: operand of the dual type containing another operand, or
+    # containing all parts of another operand of the dual type
+    parts = []
+    for k, n in kl:
+        if isinstance(k, tuple) and k[0] == dual:
+            parts.append(k[1])
+        else:
+            parts.append(None)
+    single = set(k for (k, n), p in zip(kl, parts) if p is None)
+    res = []
+    for (k, n), p in zip(kl, parts):
+        if p is not None:
+            if p & single:
+                continue
+            if any(q is not None and q < p for q in parts):
+                continue
+        res.append(n)
+
+    if not res:
+        return neutral
+    if len(res) == 1:
+        return res[0]
+    return (op, tuple(res))
+
+
+def to_string(node):
+    """
+    Return geometry string for the expression tree node.
+    """
+    if isinstance(node, str):
+        return node
+    if node[0] == 'not':
+        return '#(' + to_string(node[1]) + ')'
+    if node[0] == 'and':
+        sl = []
+        for n in node[1]:
+            s = to_string(n)
+            if isinstance(n, tuple) and n[0] == 'or':
+                s = '(' + s + ')'
+            sl.append(s)
+        return ' '.join(sl)
+    if node[0] == 'or':
+        return ':'.join(to_string(n) for n in node[1])
+    raise ValueError('Geometry is {}'.format(node[0]))
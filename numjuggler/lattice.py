@@ -0,0 +1,224 @@
+"""
+Lattice fill arrays.
+
+A fill array, i.e. the entries following `fill=i1:i2 j1:j2 k1:k2` in a
+lattice cell card, is stored as a numpy array of universe numbers, one entry
+per lattice element. Repetitions `nR` in the input are expanded when the
+array is read and used again when the array is written out.
+"""
+
+from __future__ import print_function
+
+import re
+
+try:
+    # try because numpy might be unavailable.
+    import numpy
+except ImportError:
+    print("Numpy package is required to parse lattice fill arrays but ")
+    print("cannot be found. Install it with ")
+    print("")
+    print(" > pip install numpy")
+    print("")
+    raise
+except:
+    raise
+
+from numjuggler import ri_notation as rin
+
+# Index ranges of the fill array
+re_ranges = re.compile(r'(-?\d+\s*:\s*-?\d+\s+){2}-?\d+\s*:\s*-?\d+')
+
+# Tokens of the array text
+re_token = re.compile(r'[()]|[^\s()]+')
+
+# Array entries: universe, repetition or transformation in parentheses.
+re_entry = re.compile(r'\s*(\([^)]*\)|-?\d+[rR]?(?=[\s(]|$))')
+
+
+def find_array(inpt):
+    """
+    Return tuple (a, b, n) where a and b are start and end of the fill array
+    in the meaningful part inpt of a cell card, and n is the number of
+    array elements. If there is no fill array, return None.
+    """
+    m = re.search(r'fill[=\s]+', inpt, flags=re.IGNORECASE)
+    if not m:
+        return None
+    mr = re_ranges.match(inpt, m.end())
+    if not mr:
+        return None
+    n = 1
+    for i1, i2 in _ranges(mr.group()):
+        n *= i2 - i1 + 1
+    b = mr.end()
+    ne = 0
+    last = False  # True if the last element has transformation
+    while ne < n or not last:
+        me = re_entry.match(inpt, b)
+        if not me:
+            break
+        e = me.group(1)
+        if e[0] == '(':
+            if last or ne == 0:
+                break
+            last = True
+        elif ne >= n:
+            break
+        else:
+            last = False
+            if e[-1] in 'rR':
+                ne += int(e[:-1])
+            else:
+                ne += 1
+        b = me.end()
+    return m.end(), b, n
+
+
+def _ranges(s):
+    """
+    Return list of index ranges (i1, i2) from string 'i1:i2 j1:j2 k1:k2'.
+    """
+    res = []
+    for r in s.replace(' :', ':').replace(': ', ':').split():
+        i1, i2 = r.split(':')
+        res.append((int(i1), int(i2)))
+    return res
+
+
+def _join_tr(tokens):
+    """
+    Return string representation of the transformation given as a list of
+    tokens, including parentheses.
+    """
+    return '(' + ' '.join(tokens[1:-1]) + ')'
+
+
+def _tr_number(s):
+    """
+    Return transformation number given in parentheses s, or None if s
+    contains transformation parameters.
+    """
+    try:
+        return int(s[1:-1])
+    except ValueError:
+        return None
+
+
+class FillArray(object):
+    """
+    Fill array of a lattice cell.
+
+    Attributes:
+
+        ranges -- list of index ranges (i1, i2), (j1, j2), (k1, k2)
+        u -- numpy array of universes, one entry per lattice element
+        tr -- dictionary element index -> transformation in parentheses, as
+              given in the input.
+
+    The array is read from pieces, a list of strings, one per line of the
+    input, that together give the text of the array. When written out,
+    each piece is written again, so that the lines of the card are kept.
+    """
+    def __init__(self, pieces):
+        self.ranges = []
+        self.tr = {}
+        # index of the first element of each piece
+        self.__starts = []
+        # leading text of the first piece, i.e. the index ranges
+        self.__head = ''
+
+        u = []
+        trs = None  # tokens of the transformation being read
+        for n, piece in enumerate(pieces):
+            if n == 0:
+                mr = re_ranges.match(piece)
+                self.__head = mr.group()
+                self.ranges = _ranges(self.__head)
+                piece = piece[mr.end():]
+            self.__starts.append(len(u))
+            for e in re_token.findall(piece):
+                if e == '(':
+                    trs = [e]
+                elif trs is not None:
+                    # transformation of the previous element, can contain
+                    # spaces
+                    trs.append(e)
+                    if e == ')':
+                        self.tr[len(u) - 1] = _join_tr(trs)
+                        trs = None
+                elif e[-1] in 'rR':
+                    u.extend([u[-1]] * int(e[:-1]))
+                else:
+                    u.append(int(e))
+        self.u = numpy.array(u, dtype=int)
+        return
+
+    def __len__(self):
+        return len(self.u)
+
+    def universes(self):
+        """
+        Return sorted list of unique non-zero universes in the array.
+        """
+        return [x for x in numpy.unique(self.u).tolist() if x != 0]
+
+    def transformations(self):
+        """
+        Return list of transformation numbers given in parentheses after array
+        elements, in order of the elements. Transformations given by
+        parameters are not listed.
+        """
+        res = []
+        for i in sorted(self.tr):
+            n = _tr_number(self.tr[i])
+            if n is not None:
+                res.append(n)
+        return res
+
+    def apply_map(self, f, ftr=None):
+        """
+        Replace universes u with f(u) and, if ftr is given, transformation
+        numbers t with ftr(t). Zero universes are not changed. Return True if
+        any entry changed.
+        """
+        changed = False
+        if ftr is not None:
+            for i, t in list(self.tr.items()):
+                n = _tr_number(t)
+                if n is not None and ftr(n) != n:
+                    self.tr[i] = '({})'.format(ftr(n))
+                    changed = True
+        uu, inv = numpy.unique(self.u, return_inverse=True)
+        new = numpy.array([x if x == 0 else f(x) for x in uu.tolist()],
+                          dtype=int)
+        if (new != uu).any():
+            self.u = new[inv].reshape(self.u.shape)
+            changed = True
+        return changed
+
+    def pieces(self):
+        """
+        Return list of strings representing the array, one per input line.
+        Repeated universes are written with the `nR` notation.
+        """
+        res = []
+        stops = self.__starts[1:] + [len(self.u)]
+        for n, (i1, i2) in enumerate(zip(self.__starts, stops)):
+            tokens = [self.__head] if n == 0 else []
+            run = []  # elements without transformation
+            for i, x in enumerate(self.u[i1:i2].tolist(), i1):
+                if i in self.tr:
+                    tokens.extend(map(str, self._shorten(run)))
+                    tokens.append('{} {}'.format(x, self.tr[i]))
+                    run = []
+                else:
+                    run.append(x)
+            tokens.extend(map(str, self._shorten(run)))
+            res.append(' '.join(tokens))
+        return res
+
+    @staticmethod
+    def _shorten(l):
+        # only repetitions are used in fill arrays
+        return rin.shorten(l, imin=len(l) + 1)
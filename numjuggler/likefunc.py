@@ -7,6 +7,7 @@ different functions for different ranges and separate values.
 
 from __future__ import print_function
 from collections import OrderedDict
+from bisect import bisect_right
 
 from numjuggler.utils.io import resolve_fname_or_stream
 
@@ -36,6 +37,19 @@ def add_func(c):
     return f
 
 
+def offset_function(dn, log=False):
+    """
+    Return LikeFunction that adds dn to all numbers except zero.
+
+    Zero numbers are not modified, which is important for material and
+    universe numbers.
+    """
+    m = LikeFunction(log=log)
+    m.default = add_func(dn)
+    m.mappings[Range(0)] = const_func(0)
+    return m
+
+
 class LikeFunctionBase(object):
     """
     Base class for other like-function classes.
@@ -191,6 +205,33 @@ class LikeIndexFunction(LikeFunctionBase):
         return res
 
 
+class LikeDictFunction(LikeFunctionBase):
+    """
+    Maps values according to a dictionary.
+
+    The dictionary is in self.d, values not in the dictionary are mapped with
+    the default function.
+    """
+    def __init__(self, d=None, log=False):
+        super(LikeDictFunction, self).__init__(log)
+
+        # Dictionary x -> y
+        self.d = {} if d is None else d
+        return
+
+    def get_value(self, x):
+        try:
+            return self.d[x]
+        except KeyError:
+            return self.default(x)
+
+    def _str(self):
+        res = []
+        for x in sorted(self.d.keys()):
+            res.append('{} -> {}'.format(x, self.d[x]))
+        return res
+
+
 class Range(object):
     """
     Represents a range or a point. Should be considered as immutable.
@@ -205,6 +246,18 @@ class Range(object):
             self.__x2 = x2
         return
 
+    @property
+    def x1(self):
+        """Lower bound of the range."""
+        return self.__x1
+
+    @property
+    def x2(self):
+        """Upper bound of the range. For a point it coincides with x1."""
+        if self.__x2 is None:
+            return self.__x1
+        return self.__x2
+
     def __contains__(self, value):
         if self.__x2 is None:
             return value == self.__x1
@@ -226,6 +279,54 @@ class Range(object):
     def __ne__(self, o):
         return hash(self) != hash(o)
 
+
+class RangeIndex(object):
+    """
+    Index to find all ranges containing a value.
+
+    Constructed from a sequence of (range, key) pairs, where range is a Range
+    instance with integer bounds. The ranges are split into elementary
+    segments, for each segment the keys of the ranges covering it are
+    stored. The segment containing a value is found by bisection, thus
+    get(x) does not loop over all ranges::
+
+        ri = RangeIndex([(Range(1, 10), 'a'), (Range(5), 'b')])
+        ri.get(5)    # ['a', 'b']
+        ri.get(11)   # []
+
+    """
+    def __init__(self, pairs=()):
+        # Events: at x1 a range starts, at x2 + 1 it stops.
+        events = {}
+        for i, (r, key) in enumerate(pairs):
+            events.setdefault(r.x1, ([], []))[0].append((i, key))
+            events.setdefault(r.x2 + 1, ([], []))[1].append(i)
+
+        # Segment starts and keys of ranges covering the segments, in order
+        # of the pairs.
+        self.__starts = []
+        self.__keys = []
+        active = {}
+        for x in sorted(events.keys()):
+            started, stopped = events[x]
+            for i in stopped:
+                del active[i]
+            for i, key in started:
+                active[i] = key
+            self.__starts.append(x)
+            self.__keys.append([active[i] for i in sorted(active.keys())])
+        return
+
+    def get(self, x):
+        """
+        Return list of keys of all ranges containing x.
+        """
+        i = bisect_right(self.__starts, x) - 1
+        if i < 0:
+            return []
+        return self.__keys[i]
+
+
 # Possible number types:
 ntList = ('cel', 'sur', 'u', 'tr', 'mat')
 
@@ -319,12 +420,19 @@ def get_indices(scards, log=False):
     The LikeFuncitons describe mapping for cell, surface, material and universe
     numbers to their indices -- as they appear in the MCNP input file.
     """
-    from numbering import get_numbers
+    from numjuggler.numbering import get_numbers
     # get list of numbers as they appear in input
-    d = get_numbers(scards)
+    return get_index_maps(get_numbers(scards), log=log)
+
 
+def get_index_maps(numbers, log=False):
+    """
+    Return a dict of LikeIndexFunctions for numbers, a dictionary of the form
+    type -> list of numbers as they appear in the input file, as returned by
+    numbering.get_numbers() or scanner.get_numbers().
+    """
     res = {}
-    for k, l in d.items():
+    for k, l in numbers.items():
         # do not rename universe 0 and material 0
         if k in ('u', 'mat'):
             skip = [0]
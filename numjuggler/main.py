@@ -3,7 +3,9 @@
 from __future__ import print_function
 
 import argparse as ap
+import re
 import sys
+import warnings
 from math import pi as Pi
 import os.path
 from numjuggler import numbering as mn
@@ -11,14 +13,115 @@ from numjuggler import parser as mp
 from numjuggler import ri_notation as rin
 from numjuggler import string_cells as stc
 from numjuggler import likefunc as lf
+from numjuggler import scanner
 from numjuggler import version
 
-try:
-    import pirs.mcnp.mctal.Mctal as Mctal, Vector3, Material
-except:
-    Material = None
-    Mctal = None
-    Vector3 = None
+
+def renum_maps(args, get_numbers):
+    """
+    Return dictionary type -> mapping, as defined by the --map, -c, -s, -m,
+    -u and -t command line options of the renum mode.
+
+    get_numbers is a callable returning a dictionary type -> list of numbers
+    in the input file. It is called only if indexing ("i") is required.
+    """
+    if args.map:
+        maps = lf.read_map_file(args.map, log=args.log != '')
+    else:
+        maps = {}
+
+    # index dictionary only if needed:
+    if 'i' in (args.c, args.s, args.m, args.u):
+        imaps = lf.get_index_maps(get_numbers(), log=args.log != '')
+
+    for t in ['cel', 'sur', 'mat', 'u', 'tr']:
+        # If command line paramters are specified, they rewrite maps
+        # from the map file
+        dn = getattr(args, t[0])
+        if dn == 'i':
+            maps[t] = imaps[t]
+            maps[t].doc = 'Indexing function for {}'.format(t)
+            maps[t].default = None   # This will raise error if applied to non-existent value
+        elif dn != '0':
+            # do not modify zero numbers (important for material
+            # numbers)
+            maps[t] = lf.offset_function(int(dn), log=args.log != '')
+            maps[t].doc = 'Function for {} from command line'.format(t)
+    return maps
+
+
+# Universe placeholders in tally templates of the tallies mode
+re_uplaceholder = re.compile(r'\bu(\d+)\b')
+
+
+def tally_cards(template, cells):
+    """
+    Return list of card strings for the tally template, e.g. 'f4:n (u4 <
+    u5)', where uN are placeholders for the lists of cells in universe N.
+    cells is a dictionary u -> list of cells in u.
+
+    The tally card is followed by the SD card, with unit volumes for each
+    cell of the first universe, and by the FC card with the number of cells
+    in each universe.
+    """
+    ul = [int(u) for u in re_uplaceholder.findall(template)]
+    cl = {}
+    for u in ul:
+        cl[u] = sorted(cells.get(u, []))
+        if not cl[u]:
+            warnings.warn('Universe {} in tally template {!r} has '
+                          'no cells'.format(u, template))
+
+    def repl(m):
+        return ' '.join(map(str, rin.shorten(cl[int(m.group(1))])))
+    res = [re_uplaceholder.sub(repl, template)]
+    if ul:
+        # SD card. Requires tally number and number of cells
+        nt = template.split(':')[0].strip()[1:]
+        nc = len(cl[ul[0]])
+        if nc > 1:
+            res.append('sd{} 1 {}r'.format(nt, nc - 1))
+        else:
+            res.append('sd{} 1'.format(nt))
+        res.append('fc{} {}'.format(nt, ' '.join(str(len(cl[u])) for u in ul)))
+    return res
+
+
+def cdens_text(cards, base, rules, default):
+    """
+    Iterable over strings of the input file with cell densities changed by
+    the cdens rules, as returned by mapparsers.cdens(). base is the list of
+    cards rendered with the original densities.
+
+    This is the pure-Python counterpart of CellTable.scale_densities() and
+    CellTable.render_densities(), used when numpy is not available. Rules
+    applying to a cell are found in interval indexes of cell and material
+    rules, and are applied in the order of the map file.
+    """
+    rl = list(rules.items())
+    cind = lf.RangeIndex([(r, i) for i, ((t, r), v) in enumerate(rl)
+                          if t == 'c'])
+    mind = lf.RangeIndex([(r, i) for i, ((t, r), v) in enumerate(rl)
+                          if t == 'm'])
+    for c, text in zip(cards, base):
+        if c.ctype == mp.CID.cell:
+            m = c.get_m()
+            ind = sorted(cind.get(c.name) + mind.get(m))
+            if m > 0 and (ind or default):
+                d = c.get_d()
+                for i in ind:
+                    coef, fmt = rl[i][1]
+                    ds = fmt.format(d * coef)
+                    d = float(ds)
+                if not ind:
+                    for t, (coef, fmt) in default.items():
+                        d = d * coef
+                    ds = fmt.format(d)
+                dorig = c.hidden['~'][0]
+                c.set_d(ds)
+                text = c.card()
+                c.set_d(dorig)
+        yield text
 
 
 def multiline(lines, prefix=''):
@@ -83,7 +186,14 @@ modes = ('renum', 'info', 'wrap', 'uexp', 'rems', 'remc', 'remh', 'remrp', 'minf
          'nogq', 'nogq2', 'count', 'nofill', 'matinfo', 'uinfo',
          'impinfo', 'fillempty', 'sinfo', 'vsource',
          'tallies', 'addgeom', 'merge', 'remu', 'zrotate',
-         'annotate', 'getc', 'mnew', 'combinec', 'cdens')
+         'annotate', 'getc', 'mnew', 'combinec', 'cdens', 'mmerge', 'plan',
+         'compact', 'variants', 'unused', 'prune', 'cinfo', 'gsimp',
+         'transform', 'dedup')
+
+# Modes that read the input file(s) themselves, block by block or card by
+# card, instead of reading all cards into memory at once:
+streaming_modes = ('info', 'mmerge', 'plan', 'uinfo', 'unused', 'prune',
+                   'count', 'cinfo', 'tallies')
 
 
 def main(args=sys.argv[1:]):
@@ -127,6 +237,33 @@ def main(args=sys.argv[1:]):
     p.add_argument('--log', help='Log file.',
                    type=str,
                    default='')
+    p.add_argument('--offset',
+                   help='mmerge option. Renumber merged inputs with automatic non-overlapping offsets',
+                   action='store_true')
+    p.add_argument('--export',
+                   help='uinfo, sinfo and unused option. Write universe tree or references to this JSON (or, for sinfo and unused, CSV) file',
+                   type=str,
+                   default='')
+    p.add_argument('--jobs',
+                   help='remrp, remh, gsimp and minfo option. Number of worker processes',
+                   type=int,
+                   default=1)
+    p.add_argument('--bake',
+                   help='transform option. Change coefficients of planes, spheres and cylinders parallel to axes instead of adding TR to them',
+                   action='store_true')
+    p.add_argument('--budget',
+                   help='remh option. Do not substitute complementary cells making cell geometry longer than this number of words. 0 means no limit',
+                   type=int,
+                   default=0)
+    p.add_argument('--sort',
+                   help='cinfo option. Sort cells by this column, largest first',
+                   type=str,
+                   choices=['surfaces', 'unique', 'hashcell', 'hashsurf',
+                            'depth', 'unions', 'words', 'lja'],
+                   default='')
+    p.add_argument('--inorder',
+                   help='compact option. Number in order of appearance instead of increasing order',
+                   action='store_true')
 
     # parse help option in another parser:
     ph = ap.ArgumentParser(add_help=False)
@@ -174,19 +311,27 @@ def main(args=sys.argv[1:]):
             debuglog = None
 
         # process input file only once:
-        cards = list(mp.get_cards(args.inp,
-                                  debuglog,
-                                  preservetabs=args.preservetabs))
+        if args.mode in streaming_modes:
+            cards = None
+        else:
+            cards = list(mp.get_cards(args.inp,
+                                      debuglog,
+                                      preservetabs=args.preservetabs))
 
         if args.mode == 'info':
             indent = ' '*8
-            for c in cards:
-                c.get_values()
-            d = mn.get_numbers(cards)
-
             if args.debug:
+                # Full parse, to get numbers of all types in the debug log
+                cards = list(mp.get_cards(args.inp,
+                                          debuglog,
+                                          preservetabs=args.preservetabs))
+                for c in cards:
+                    c.get_values()
+                d = mn.get_numbers(cards)
                 types = sorted(d.keys())
             else:
+                d = scanner.get_numbers(args.inp,
+                                        preservetabs=args.preservetabs)
                 types = ['cel', 'sur', 'mat', 'u', 'tal', 'tr']
             for t in types:
                 if t[0] != '#':  # for meaning of '#' see parser.
@@ -209,7 +354,7 @@ def main(args=sys.argv[1:]):
                         print('{:<30s} {:>8s} {:>8s}'.format(rs, ur, fr))
                         rp = r2
         elif args.mode == 'remh':
-            stc.remove_hash(cards,args.log)
+            stc.remove_hash(cards,args.log,jobs=args.jobs,budget=args.budget)
             for c in cards:
                if c.cstrg :   # strg: flags setting if card has been modified with remove
                   c.get_input()
@@ -223,25 +368,50 @@ def main(args=sys.argv[1:]):
                flog = open(args.log,'w')
                flog.write('      Cell :  Parentheses removed\n')
                print_log = True
+            cells = [''.join(c.lines) for c in cards if c.ctype == mp.CID.cell]
+            res = iter(stc.map_cells(stc.remove_redundant_card, cells,
+                                     jobs=args.jobs, remopt=args.opt))
             for c in cards:
                if c.ctype == mp.CID.cell:
-                  cardstr = stc.cell_card_string(''.join(c.lines))
-                  cardstr.geom.remove_redundant(remopt=args.opt)
-                  c.lines = cardstr.get_lines()
+                  c.lines, cname, removedp = next(res)
                   c.get_input()
                   if print_log:
-                     if cardstr.geom.removedp :
-                       cname = cardstr.headstr.split()[0]
-                       if (cardstr.geom.removedp[0] != cardstr.geom.removedp[1] ):
+                     if removedp :
+                       if (removedp[0] != removedp[1] ):
                            flog.write(' {:>9s} : unbalanced\n'.format(cname))
-                       elif ( args.opt == 'nochg' and cardstr.geom.removedp[0] == 0) :
+                       elif ( args.opt == 'nochg' and removedp[0] == 0) :
                           flog.write(' {:>9s} : nochg\n'.format(cname))
                        else:
-                          flog.write(' {:>9s} : {:>5}\n'.format(cname,cardstr.geom.removedp[0]))
+                          flog.write(' {:>9s} : {:>5}\n'.format(cname,removedp[0]))
                   print(c.card(True), end='')
                else:
                   print(c.card(), end='')
 
+        elif args.mode == 'gsimp':
+            print_log = False
+            if args.log != '' :
+               flog = open(args.log,'w')
+               flog.write('      Cell :  words  simplified\n')
+               print_log = True
+            cells = [''.join(c.lines) for c in cards if c.ctype == mp.CID.cell]
+            res = iter(stc.map_cells(stc.simplify_card, cells, jobs=args.jobs))
+            for c in cards:
+               if c.ctype == mp.CID.cell:
+                  lines, cname, words, newwords = next(res)
+                  if newwords is None:
+                     print(c.card(), end='')
+                     continue
+                  if print_log:
+                     flog.write(' {:>9s} : {:>6} {:>6}\n'.format(cname,words,newwords))
+                  if newwords in ('empty', 'all'):
+                     print(c.card(), end='')
+                  else:
+                     c.lines = lines
+                     c.get_input()
+                     print(c.card(True), end='')
+               else:
+                  print(c.card(), end='')
+
         elif args.mode == 'ext':
             # output list of cells for ext:n card
             for c in cards:
@@ -251,83 +421,89 @@ def main(args=sys.argv[1:]):
 
         elif args.mode == 'cdens':
             from .mapparsers import cdens
-            # Change density of cells, specified in the map file. Map file
-            m, mdef = cdens(args.map)
-
+            # Change density of cells, specified in the map file. Several
+            # map files separated by os.pathsep can be given in --map, in
+            # this case the input is parsed once and for each map file the
+            # resulting input is written to a separate file.
+            try:
+                # numpy is optional, without it the densities are computed
+                # cell by cell.
+                import numpy
+            except ImportError:
+                numpy = None
             for c in cards:
                 if c.ctype == mp.CID.cell:
                     c.get_values()
-                    modified = False
-                    for tr in m.keys():
-                        t, r = tr
-                        if t == 'c' and  c.name in r:
-                            dorig = c.get_d()
-                            coef, fmt = m[tr]
-                            dnew = dorig * coef
-                            c.set_d(fmt.format(dnew))
-                            modified = True
-                        if t == 'm' and c.get_m() in r:
-                            dorig = c.get_d()
-                            coef, fmt = m[tr]
-                            dnew = dorig * coef
-                            c.set_d(fmt.format(dnew))
-                            modified = True
-                    if not modified and mdef:
-                        # If no rules to modify density found, apply the
-                        # default:
-                        dnew = c.get_d()
-                        for t, (val, fmt) in mdef.items():
-                            dnew *= val
-                        c.set_d(fmt.format(dnew))
-                print(c.card(), end='')
+            if numpy is not None:
+                from numjuggler.celltable import CellTable
+                table = CellTable(cards)
+            base = [c.card() for c in cards]
+
+            mapfiles = args.map.split(os.pathsep)
+            for mapfile in mapfiles:
+                m, mdef = cdens(mapfile)
+                if numpy is not None:
+                    dstrings = table.scale_densities(m, mdef)
+                    text = table.render_densities(cards, base, dstrings)
+                else:
+                    text = cdens_text(cards, base, m, mdef)
+                if len(mapfiles) == 1:
+                    for t in text:
+                        print(t, end='')
+                else:
+                    fname = '{}.{}'.format(args.inp,
+                                           os.path.basename(mapfile))
+                    with open(fname, 'w') as f:
+                        for t in text:
+                            print(t, end='', file=f)
+
+
+        elif args.mode == 'variants':
+            from .mapparsers import variants
+            from numjuggler.celltable import CellTable
+            from numjuggler.variants import write_variants
+            # Variants of cell parameters are given in the table file
+            # specified in --map. All variants are written from one parsed
+            # model.
+            for c in cards:
+                if c.ctype == mp.CID.cell:
+                    c.get_values()
+            table = CellTable(cards)
+            base = [c.card() for c in cards]
 
+            res = write_variants(args.inp, cards, base, table,
+                                 variants(args.map))
+            for fname, n, skipped in res:
+                print('{}: {} cells changed'.format(fname, n))
+                for name, k in skipped:
+                    print('    {} is not set in cell {}'.format(k, name))
 
         elif args.mode == 'tallies':
-            # New version: tally number and universes should be specified in the
-            # format string passed via -m argument.  -m must be present and have
-            # form: 'f4:n (u4 < u5)', where uN -- placeholders for lists of
+            # Tally templates are given in the file specified in --map, one
+            # per line, or a single template is given in -m. Template has the
+            # form 'f4:n (u4 < u5)', where uN -- placeholders for lists of
             # cells that belong to universe N. Usual cell numbers can be used
             # as well.
+            from numjuggler.universes import get_tree
 
-            import re
-            r = re.compile(r'(u)(\d+)')
-
-            csets = {}
-            ulst = []
-            fmt = args.m[:]
-            for s in r.findall(args.m):
-                ss = s[0] + s[1]
-                u = int(s[1])
-                csets[u] = set()
-                fmt = fmt.replace(ss, '{' + ss + '}', 1)
-                ulst += [u]
-
-            for c in cards:
-                c.get_values()
-                if c.ctype == mp.CID.cell:
-                    cu = c.get_u()
-                    if cu is None:
-                        cu = 0
-                    if cu in csets:
-                        csets[cu].add(c.name)
-                elif c.ctype == mp.CID.surface:
-                    break
-
-            farg = {}
-            for k, v in list(csets.items()):
-                farg['u' + str(k)] = ' '.join(map(str, rin.shorten(sorted(v))))
-
-            # Tally card
-            print(fmt.format(**farg))
-
-            # SD card. Requires tally number and number of cells
-            nt = fmt.split(':')[0][1:]
-            nc = len(csets[ulst[0]])  # number of cells
-            print('sd{} 1 {}r'.format(nt, nc - 1))
-            print('fc{} '.format(nt), end='')
-            for u in ulst:
-                print(len(csets[u]), end='')
-            print()
+            if args.map:
+                with open(args.map) as f:
+                    templates = [l.strip() for l in f if l.strip() and
+                                 not mp.is_commented(l)]
+            elif args.m != '0':
+                templates = [args.m]
+            else:
+                p.error('--mode tallies requires --map or -m')
+
+            # universe -> cells index is built once for all templates
+            tree = get_tree(args.inp, preservetabs=args.preservetabs)
+            for t in templates:
+                tl = tally_cards(t, tree.cells)
+                # long lists of cells are wrapped
+                c = mp.Card([tl[0] + '\n'], mp.CID.data, 0)
+                print(c.card(True), end='')
+                for l in tl[1:]:
+                    print(l)
 
         elif args.mode == 'addgeom':
             # add stuff to geometry definition of cells.
@@ -443,6 +619,90 @@ def main(args=sys.argv[1:]):
                     # do not add empty line after data block
                     print('')
 
+        elif args.mode == 'mmerge':
+            # Merge several inputs, the main one and additional ones listed in
+            # -m. In contrast to merge, the inputs are not read into memory,
+            # but streamed block by block: all cell blocks are written first,
+            # then all surface blocks, then all data blocks.
+            inputs = [args.inp] + args.m.split()
+
+            def block(inp, cid):
+                return mp.get_block(inp, cid, debuglog,
+                                    preservetabs=args.preservetabs)
+
+            # Optional renumbering with automatic offsets, computed from
+            # number ranges of the inputs.
+            offsets = [{} for inp in inputs]
+            if args.offset:
+                ranges = []
+                for inp in inputs:
+                    vals = scanner.scan(inp, preservetabs=args.preservetabs)
+                    ranges.append(mn.get_ranges(v[2] for v in vals))
+                offsets = mn.get_offsets(ranges)
+            maps = []
+            for od in offsets:
+                maps.append(dict((t, lf.offset_function(dn))
+                                 for t, dn in od.items() if dn != 0))
+
+            # Message -- from the 1-st input that has it.
+            for inp in inputs:
+                mb = list(block(inp, mp.CID.message))
+                if mb:
+                    for c in mb:
+                        print(c.card(), end='')
+                    print('')
+                    break
+
+            # Titles of all inputs. The 1-st one is the title of the result,
+            # unless given in -t.
+            titles = []
+            for inp in inputs:
+                tl = list(block(inp, mp.CID.title))
+                titles.append(tl[0].card()[:-1] if tl else inp)
+            if args.t == "0":
+                print(titles[0])
+            else:
+                print(args.t)
+            if args.offset:
+                for inp, od in zip(inputs, offsets):
+                    print('c offsets for {}: '.format(inp) +
+                          ' '.join('{} {}'.format(t, od[t])
+                                   for t in sorted(od.keys())))
+
+            # Cells, surfaces and data:
+            for t in [mp.CID.cell, mp.CID.surface, mp.CID.data]:
+                for i, inp in enumerate(inputs):
+                    if i == 0:
+                        cmnt = None
+                    elif args.c == "0":
+                        cmnt = 'c {} {} cards ' + '"{}"'.format(titles[i])
+                    else:
+                        cmnt = 'c {} {} cards ' + args.c
+
+                    started = cmnt is None
+                    cbc = []  # comments preceding the 1-st card
+                    for c in block(inp, t):
+                        if c.ctype == t and maps[i]:
+                            c.get_values()
+                            c.apply_map(maps[i])
+                        if not started:
+                            # the start comment is written only if the block
+                            # actually contains any cards
+                            if c.ctype != t:
+                                cbc.append(c)
+                                continue
+                            print(cmnt.format('start', mp.CID.get_name(t)))
+                            for cc in cbc:
+                                print(cc.card(), end='')
+                            started = True
+                        print(c.card(), end='')
+                    if started and cmnt is not None:
+                        print(cmnt.format('end', mp.CID.get_name(t)))
+
+                if t != mp.CID.data:
+                    # do not add empty line after data block
+                    print('')
+
         elif args.mode == 'uexp':
             if args.u == "0":
                 N = " u=0 "
@@ -473,6 +733,7 @@ def main(args=sys.argv[1:]):
                     if (cfunc(c.name) and
                        'u' not in [t[1] for t in c.values]):
                         c.input[-1] += N  # ' u=0'
+                        c.modified = True
                 print(c.card(), end='')
 
         elif args.mode == 'wrap':
@@ -506,29 +767,26 @@ def main(args=sys.argv[1:]):
                         fout.close()
 
         elif args.mode == 'matan':
-            # Compare pairwise mateiral cards. Two materials are compared by
-            # their string representation
+            # Compare pairwise material cards. Two materials are compared by
+            # their normalized composition, library suffixes are ignored.
+            from numjuggler import materials as mt
 
-            from pirs.mcnp import Material
-            # read all material cards and convert to string representation
             sd = {}
+            kl = []  # keys in order of appearance
             for c in cards:
                 c.get_values()
                 if c.ctype == mp.CID.data and c.dtype == 'Mn':
-                    m = Material.parseCard(c)
-                    m.remove_duplicates()
-                    m.normalize(1.0)
-                    s = m.card(sort=True, suffixes=False, comments=False)
-                    if s not in sd:
-                        sd[s] = [m.name]
+                    m = mt.read_material(c.card(comment=False))
+                    k = m.key(suffixes=False)
+                    if k not in sd:
+                        sd[k] = [m.name]
+                        kl.append(k)
                     else:
-                        sd[s].append(m.name)
+                        sd[k].append(m.name)
 
             # analyse material cards:
-            i = 1
-            for s, m in list(sd.items()):
-                print(i, m)
-                i += 1
+            for i, k in enumerate(kl, 1):
+                print(i, sd[k])
 
         elif args.mode == 'mdupl':
             # remove duplicate material cards, if they are equal.
@@ -543,42 +801,112 @@ def main(args=sys.argv[1:]):
                 else:
                     print(c.card(), end='')
 
+        elif args.mode == 'dedup':
+            # remove material and tr cards with the same content as previous
+            # ones and renumber references to them.
+            from numjuggler import materials as mt
+
+            mcards = []
+            extra = {}  # meaningful parts of MTn and MPNn cards
+            trcards = []
+            for c in cards:
+                c.get_values()
+                if c.ctype == mp.CID.data:
+                    if c.dtype == 'Mn':
+                        mcards.append(c)
+                    elif c.dtype in ('MTn', 'MPNn'):
+                        extra.setdefault(c.name, []).append(c.card(comment=False))
+                    elif c.dtype == 'TRn':
+                        trcards.append(c)
+
+            keys = [mt.material_key(c.card(comment=False), extra.get(c.name, ()))
+                    for c in mcards]
+            ml = list(zip(mcards, keys))
+            if trcards:
+                from numjuggler import transforms as tf
+                tra = tf.TRArray([(c.unit, [v[0] for v in c.values[1:]])
+                                  for c in trcards],
+                                 [c.name for c in trcards])
+                ml += [(c, ('tr',) + k) for c, k in zip(trcards, tra.keys())]
+
+            # References in TRCL parameters and in data cards, e.g. SDEF or
+            # FMn, are not renumbered. Duplicates used there are kept.
+            from numjuggler.refindex import card_refs
+            fixed = set()
+            for c in cards:
+                if c.ctype in (mp.CID.cell, mp.CID.data):
+                    fixed.update(card_refs(c.ctype, c.dtype,
+                                           c.card(comment=False)))
+
+            # first card with given key is kept, the others are mapped to it
+            kept = {}
+            dicts = {'mat': {}, 'tr': {}}
+            for c, k in ml:
+                t = 'tr' if c.dtype == 'TRn' else 'mat'
+                if k in kept and (c.name, t) not in fixed:
+                    dicts[t][c.name] = kept[k]
+                else:
+                    kept[k] = c.name
+            maps = {}
+            for t, d in dicts.items():
+                maps[t] = lf.LikeDictFunction(d, log=args.log != '')
+                maps[t].doc = 'Duplicates removing function for {}'.format(t)
+
+            for c in cards:
+                if c.ctype == mp.CID.data and c.dtype in ('Mn', 'MTn', 'MPNn'):
+                    if c.name in dicts['mat']:
+                        continue
+                elif c.ctype == mp.CID.data and c.dtype == 'TRn':
+                    if c.name not in dicts['tr']:
+                        # original lines, not rendered from float values
+                        print(''.join(c.lines), end='')
+                    continue
+                c.apply_map(maps)
+                print(c.card(), end='')
+
+            if args.log != '':
+                with open(args.log, 'w') as flog:
+                    for k, m in sorted(maps.items()):
+                        m.write_log_as_map(k[0], flog)
+
         elif args.mode == 'mnew':
             # read from map definition of new materials in terms of existing
             # materials, and add new to the modified input.
+            from numjuggler import materials as mt
 
-            # Read new material definitions from the map file:
-            dd = {} # definition dictionary
+            # Read new material definitions from the map file. Each line
+            # contains the new material name followed by triplets: reference
+            # material, its density and its volume fraction.
+            dl = [] # definitions list
             rms = set() # reference materials set
             with open(args.map) as fmap:
                 for l in fmap:
                     tl = l.split()
-                    rml = map(int, tl[1::3])
-                    dd[tl[0]] = zip(rml,
-                                    map(float, tl[2::3]),
-                                    map(float, tl[3::3]))
+                    if not tl:
+                        continue
+                    rml = list(map(int, tl[1::3]))
+                    dl.append((tl[0], list(zip(rml,
+                                               map(float, tl[2::3]),
+                                               map(float, tl[3::3])))))
                     rms.update(rml)
 
-            # read reference materials and create Materials
-            assert Material is not None,  "pirs Material class is not imported"
+            # read reference materials
             rmd = {}
             for c in cards:
                 if c.ctype == mp.CID.data:
                     c.get_values()
-                    if c.dtype == 'Mn' and c.name in rml:
-                        m = Material.parseCard(c)
-                        m.name = 'm{} from {}'.format(c.name, args.inp)
-                        rmd[c.name] = m
+                    if c.dtype == 'Mn' and c.name in rms:
+                        rmd[c.name] = mt.read_material(c.card(comment=False))
 
             # create new materials
-            for n, d in dd.items():
-                r = [] # recipe
-                for i in d:
-                    r.append(rmd[i[0]])
-                    r.append((i[1] * i[2], 2))
-                m = Material(*r)
-                print('\nc '.join(m.report().splitlines()))
-                print(m.card().format(n))
+            for n, d in dl:
+                r = [(rmd[i], x * y) for i, x, y in d]
+                m = mt.mix(r)
+                print('c Material {} mixed from {}, by mass:'.format(n, args.inp))
+                for i, x, y in d:
+                    print('c    m{} {}'.format(i, x * y))
+                print('c Molar mass {:.6g} g/mol'.format(m.molar_mass()))
+                print(m.card(n), end='')
 
 
         elif args.mode == 'sdupl':
@@ -605,6 +933,7 @@ def main(args=sys.argv[1:]):
                                               pci=pcl.get(c.stype, [])):
                             # If c is close to s, print s instead
                             s.values[0] = (c.values[0][0], s.values[0][1])
+                            s.modified = True
                             print(s.card(), end='')
                             s.values[0] = (sn, s.values[0][1])
                             break
@@ -629,9 +958,11 @@ def main(args=sys.argv[1:]):
                         for i in c.input[1:]:
                             inp.append('c msimpl ' + i)
                         c.input = inp
+                        c.modified = True
                 print(c.card(), end='')
 
         elif args.mode == 'remu':
+            from numjuggler.refindex import from_cards
             if args.u[0] == '!':
                 # -u option starts with !. In this case, remove all other
                 # universes.
@@ -672,17 +1003,15 @@ def main(args=sys.argv[1:]):
 
             # get list of cells to be removed
             # and list of surfaces to be preserved
+            ri = from_cards(cards)
             for c in cards:
                 if c.ctype == mp.CID.cell:
                     if c.get_u() in uref:
                         cset.add(c.name)
                     elif c.name not in cset:
                         # collect surfaces needed for other cells
-                        for v, t in c.values:
-                            if t == 'sur':
-                                sset.add(v)
-                            if t == 'mat':
-                                mset.add(v)
+                        sset.update(ri.used('cel', c.name, 'sur'))
+                        mset.update(ri.used('cel', c.name, 'mat'))
 
             # Prepare additional lines to be added to cell and surface blocks:
             newcell = 'c '
@@ -710,6 +1039,7 @@ def main(args=sys.argv[1:]):
                             v, t = c.values[i]
                             if t == 'cel' and v in cset:
                                 c.values[i] = ('___', 'cel')
+                                c.modified = True
                     # If the cell is filled with a universe to delete,
                     # change its fill to newfill:
                     # if c.get_f() in uref:
@@ -743,7 +1073,7 @@ def main(args=sys.argv[1:]):
             # Combine cells, listed in -c flag.
 
             # Get cells to be combined from command line parameter
-            clst1 = map(int, rin.expand(args.c.split()))
+            clst1 = list(map(int, rin.expand(args.c.split())))
 
             # Get the cell geometry
             d = {}
@@ -776,17 +1106,18 @@ def main(args=sys.argv[1:]):
 
 
         elif args.mode == 'zrotate':
-
-            assert  Vector3 is not None, "pirs Vector3 class is not imported"
+            from numjuggler import transforms as tf
             ag = float(args.c)    # in grad
-            ar = ag * Pi / 180.   # in radians
 
             # new transformation number:
             trn = args.t
             trcard = '*tr{} 0 0 0 {} {} 90   {} {} 90   90 90 0'.format(
                 trn, ag, ag-90, 90+ag, ag)
-            # change all tr cards and surface cards:
-            for c in cards:
+
+            # change all surface cards and collect tr cards:
+            trcards = []
+            first = None  # where the new tr card is put
+            for i, c in enumerate(cards):
                 if c.ctype == mp.CID.surface:
                     c.get_values()
                     # Surface parameters are not parsed, only surface number and
@@ -796,61 +1127,111 @@ def main(args=sys.argv[1:]):
                         inpt = '\n'.join(c.input)
                         inpt = inpt.replace('} ', '} ' + trn + ' ', 1)
                         c.input = inpt.split('\n')
+                        c.modified = True
 
                 if c.ctype == mp.CID.data:
                     c.get_values()
+                    if first is None:
+                        first = i
                     if c.dtype == 'TRn':
-                        # put new tr card just before the 1-st tr card in the
-                        # input:
-                        if trcard:
-                            print(trcard)
-                            trcard = None
-                        # apply changes, assuming that tr card contains all 12
-                        # entries:
-                        o = Vector3(car=[v[0] for v in c.values[1:4]])
-                        o.t += ar
-                        c.values[1] = (o.x, 'float')
-                        c.values[2] = (o.y, 'float')
-                        c.values[3] = (o.z, 'float')
-
-                        def e1(v):
-                            return v[0]
-                        if c.unit == '':
-                            # rotation matrix contains cos
-                            b1 = Vector3(car=list(map(e1, c.values[4:7])))
-                            b2 = Vector3(car=list(map(e1, c.values[7:10])))
-                            b3 = Vector3(car=list(map(e1, c.values[10:13])))
-                            b1.t += ar
-                            b2.t += ar
-                            b3.t += ar
-                            c.values[4] = (b1.x, 'float')
-                            c.values[5] = (b1.y, 'float')
-                            c.values[6] = (b1.z, 'float')
-                            c.values[7] = (b2.x, 'float')
-                            c.values[8] = (b2.y, 'float')
-                            c.values[9] = (b2.z, 'float')
-                            c.values[10] = (b3.x, 'float')
-                            c.values[11] = (b3.y, 'float')
-                            c.values[12] = (b3.z, 'float')
-                        else:
-                            # rotation matrix contains angles in grad.
-                            b1, b2, b3, b4, b5, b6, b7, b8, b9 = list(map(e1, c.values[4:13]))
-
-                            # Assume that it already describes rotation around z
-                            # axis
-                            assert (b3 == 90 and b6 == 90 and b7 == 90 and
-                                    b8 == 90 and b9 == 0)
-
-                            b1 += ag
-                            b2 += ag
-                            b4 += ag
-                            b5 += ag
-                            c.values[4] = (b1, 'float')
-                            c.values[5] = (b2, 'float')
-                            c.values[7] = (b4, 'float')
-                            c.values[8] = (b5, 'float')
+                        if not trcards:
+                            # put new tr card just before the 1-st tr card
+                            first = i
+                        trcards.append(c)
+
+            # rotate all tr cards at once
+            tra = tf.TRArray([(c.unit, [v[0] for v in c.values[1:]])
+                              for c in trcards], [c.name for c in trcards])
+            tra.apply(tf.zrotation(ag))
+            for c, vals in zip(trcards, tra.values()):
+                n = len(vals) + 1 - len(c.values)
+                if n > 0:
+                    # displacement-only card gets rotation matrix
+                    c.input[-1] += ' {}' * n
+                    c.values.extend([(0., 'float')] * n)
+                for i, v in enumerate(vals, 1):
+                    c.values[i] = (tf.fmt(v), 'float')
+                c.modified = True
+
+            for i, c in enumerate(cards):
+                if i == first:
+                    print(trcard)
+                print(c.card(c.ctype == mp.CID.data and c.dtype == 'TRn'), end='')
+
+        elif args.mode == 'transform':
+            from numjuggler import transforms as tf
+            t = tf.read_affine(args.map)
+
+            # surfaces without transformation and tr cards:
+            trcards = []
+            surfaces = []
+            first = None  # where the new tr card is put
+            for i, c in enumerate(cards):
+                if c.ctype == mp.CID.surface:
+                    c.get_values()
+                    if len(c.values) == 1:
+                        surfaces.append(c)
+                if c.ctype == mp.CID.data:
+                    c.get_values()
+                    if first is None:
+                        first = i
+                    if c.dtype == 'TRn':
+                        if not trcards:
+                            first = i
+                        trcards.append(c)
 
-                print(c.card(), end='')
+            # new transformation number:
+            trn = args.t
+            if trn == '0':
+                trn = str(max([c.name for c in trcards] + [0]) + 1)
+
+            # surfaces that are changed, the rest gets the new tr
+            baked = {}
+            if args.bake:
+                res = tf.bake([(c.stype, c.scoefs) for c in surfaces], t)
+                for c, r in zip(surfaces, res):
+                    if r is not None:
+                        baked[c.name] = r
+            for c in surfaces:
+                if c.name not in baked:
+                    inpt = '\n'.join(c.input)
+                    inpt = inpt.replace('} ', '} ' + trn + ' ', 1)
+                    c.input = inpt.split('\n')
+                    c.modified = True
+            trcard = None
+            if len(baked) < len(surfaces):
+                trcard = 'tr{} {}'.format(trn, ' '.join(map(tf.fmt, tf.tr_values(t))))
+
+            # compose all tr cards with the transformation at once
+            tra = tf.TRArray([(c.unit, [v[0] for v in c.values[1:]])
+                              for c in trcards], [c.name for c in trcards])
+            tra.apply(t)
+            for c, vals in zip(trcards, tra.values()):
+                n = len(vals) + 1 - len(c.values)
+                if n > 0:
+                    # displacement-only card gets rotation matrix
+                    c.input[-1] += ' {}' * n
+                    c.values.extend([(0., 'float')] * n)
+                for i, v in enumerate(vals, 1):
+                    c.values[i] = (tf.fmt(v), 'float')
+                c.modified = True
+
+            for i, c in enumerate(cards):
+                if i == first and trcard:
+                    c0 = mp.Card([trcard + '\n'], mp.CID.data, 0)
+                    c0.get_input()
+                    print(c0.card(True), end='')
+                if c.ctype == mp.CID.surface and c.name in baked:
+                    st, cf = baked[c.name]
+                    pfx = c.lines[0].lstrip()[0]
+                    pfx = pfx if pfx in '*+' else ''
+                    l = '{}{} {} {}'.format(pfx, c.name, st, ' '.join(map(tf.fmt, cf)))
+                    if '$' in c.lines[0]:
+                        # keep comment of the 1-st line
+                        l += ' $' + c.lines[0].split('$', 1)[1].rstrip()
+                    print(l)
+                else:
+                    print(c.card(c.ctype == mp.CID.data and c.dtype == 'TRn'), end='')
 
         elif args.mode == 'annotate':
             # Read text from map file, add "c" to each line and put after the
@@ -886,6 +1267,7 @@ def main(args=sys.argv[1:]):
                         print(ccc, end='')
 
         elif args.mode == 'extr':
+            from numjuggler.refindex import from_cards
             # extract cell specified in -c keyword and necessary materials, and
             # surfaces.
             cset = set()
@@ -907,6 +1289,7 @@ def main(args=sys.argv[1:]):
                 c.get_values()
                 if c.ctype == mp.CID.cell:
                     aset.add(c.name)
+            ri = from_cards(cards)
 
             extract_parents_flag = True
             if args.u != '0':
@@ -944,8 +1327,8 @@ def main(args=sys.argv[1:]):
             for c in cards:
                 if c.ctype == mp.CID.cell:
                     if c.name in cset:
-                        if extract_parents_flag and c.get_f() is not None:
-                            uset.add(c.get_f())
+                        if extract_parents_flag:
+                            uset.update(c.get_fills())
                         if extract_parents_flag and c.get_u() is not None:
                             fset.add(c.get_u())
 
@@ -957,16 +1340,16 @@ def main(args=sys.argv[1:]):
                     if c.ctype == mp.CID.cell:
                         if c.get_u() in uset:
                             cset.add(c.name)
-                            if c.get_f() is not None:
-                                if c.get_f() not in uset:
-                                    uset.add(c.get_f())
+                            for f in c.get_fills():
+                                if f not in uset:
+                                    uset.add(f)
                                     again = True
                         if c.name in cset:
                             cref = c.get_refcells()
                             if cref.difference(cset):
                                 again = True
                                 cset = cset.union(cref)
-                        if c.get_f() in fset:
+                        if fset.intersection(c.get_fills()):
                             # this cell is parent of one of cset.
                             pset.add(c.name)
                             if c.get_u() not in Uset:
@@ -979,22 +1362,14 @@ def main(args=sys.argv[1:]):
 
             # final run: for all cells find surfaces, materials, etc.
             cset = cset.union(pset)
-            for c in cards:
-                if c.ctype == mp.CID.cell and c.name in cset:
-                    # get all surface names and the material, if any.
-                    for v, t in c.values:
-                        if t == 'sur':
-                            sset.add(v)
-                        elif t == 'mat':
-                            mset.add(v)
-                        elif t == 'tr':
-                            tset.add(v)
-
-                if c.ctype == mp.CID.surface and c.name in sset:
-                    # surface card can refer to tr
-                    for v, t in c.values:
-                        if t == 'tr':
-                            tset.add(v)
+            for n in cset:
+                # get all surface names and the material, if any.
+                sset.update(ri.used('cel', n, 'sur'))
+                mset.update(ri.used('cel', n, 'mat'))
+                tset.update(ri.used('cel', n, 'tr'))
+            for n in sset:
+                # surface card can refer to tr
+                tset.update(ri.used('sur', n, 'tr'))
 
             blk = None
             for c in cards:
@@ -1160,6 +1535,7 @@ def main(args=sys.argv[1:]):
                     trd = {}
 
         elif args.mode == 'count':
+            from numjuggler.complexity import get_stats
             # take the maximal number of surfaces from -s:
             Nmax = int(args.s)
             if Nmax == 0:
@@ -1174,28 +1550,20 @@ def main(args=sys.argv[1:]):
             su = 0  # unique surface counter
             ma = 0  # maximal number of all surfaces
             mu = 0  # maximal number of unique surfaces
-            for c in cards:
-                if c.ctype == mp.CID.cell:
-                    c.get_values()
-                    # get list of surfaces used in the cell:
-                    los = []
-                    for v, t in c.values:
-                        if 'sur' in t:
-                            los.append(v)
-
-                    # output number of surfaces:
-                    a = len(los)       # number of all surfaces
-                    u = len(set(los))  # number of unique surfaces
-                    print(('{:>10d}'*4).format(c.name, c.pos, a, u), end='')
-                    if a > Nmax:
-                        print(' *')
-                    else:
-                        print(' ')
-                    sc += 1
-                    sa += a
-                    su += u
-                    ma = max(ma, a)
-                    mu = max(mu, u)
+            for cs in get_stats(args.inp, preservetabs=args.preservetabs):
+                # output number of surfaces:
+                a = len(cs.surfaces)  # number of all surfaces
+                u = cs.unique         # number of unique surfaces
+                print(('{:>10d}'*4).format(cs.name, cs.pos, a, u), end='')
+                if a > Nmax:
+                    print(' *')
+                else:
+                    print(' ')
+                sc += 1
+                sa += a
+                su += u
+                ma = max(ma, a)
+                mu = max(mu, u)
             print()
             print('sum', ('{:>10d}'*3).format(sc, sa, su))
             print('max', ('{:>10d}'*3).format(00, ma, mu))
@@ -1238,7 +1606,7 @@ def main(args=sys.argv[1:]):
                     c.get_values()
                     m = c.get_m()
                     d = c.get_d()
-                    u = c.get_u()
+                    u = c.get_u() or 0
                     l = res.get(m, [])
                     if not l:
                         res[m] = l
@@ -1271,36 +1639,37 @@ def main(args=sys.argv[1:]):
             # -m argument is the mctal name followed by tally number of the
             # tally containing cell volumes.
             if args.m != '0':
-                assert Mctal is not None, "pirs Mctal class is not imported"
-                mctal = Mctal()
+                from numjuggler import materials as mt
+                from numjuggler.mctal import read_tally
+                from numjuggler.celltable import CellTable
                 fname, tn = args.m.split()
-                tn = int(tn)
-                mctal.read_complete(fname)
-                tv = mctal.mctaltallies[tn]
-                cn = tv.fnl_numpy    # cell numbers
-                cv = tv.vals_numpy   # cell volumes
+                tally = read_tally(fname, int(tn))
+                cn = tally.fbins   # cell numbers
+                cv = tally.fvals()[0]   # cell volumes
 
-                # Compute material weights
-                res = {}   # values are tuples (volume, weight)
+                # Materials, to convert atomic densities to g/cm3
+                mats = {}
                 for c in cards:
-                    if c.ctype == mp.CID.cell:
-                        if c.name in cn:
-                            m = c.get_m()
-                            d = c.get_d()
-                            if m not in res:
-                                res[m] = (0., 0.)
-                            v = cv[0, cn == c.name][0]
-
-                            res[m] = (res[m][0] + v, res[m][1] + v*d)
-                        else:
-                            print('No volume for cell ', c.name)
-                    if c.ctype == mp.CID.surface:
-                        break
+                    if c.ctype == mp.CID.data:
+                        c.get_values()
+                        if c.dtype == 'Mn':
+                            mats[c.name] = mt.read_material(c.card(comment=False))
+
+                # Compute material weights
+                table = CellTable(cards)
+                ml, vl, wl, missing = table.material_weights(cn, cv, mats)
+                for n in missing.tolist():
+                    print('No volume for cell ', n)
+                for n in table.no_material(mats).tolist():
+                    print('No material card for cell ', n)
+                unresolved = table.resolved()[0] == -2
+                for n in table.name[unresolved].tolist():
+                    print('Like-but cell is not included ', n)
 
                 print(('{:>20s}'*3).format('Material', 'Volume', 'Weight'))
                 sv = 0.0
                 sw = 0.0
-                for m, (v, w) in sorted(res.items()):
+                for m, v, w in zip(ml.tolist(), vl.tolist(), wl.tolist()):
                     print('{:20d}{:20e}{:20e}'.format(m, v, w))
                     if m > 0:
                         sv += v
@@ -1309,24 +1678,13 @@ def main(args=sys.argv[1:]):
 
 
         elif args.mode == 'uinfo':
+            from numjuggler.universes import get_tree
             # for each universe return list of its cells.
-            res = {}
-            fd = {}  # dictionary of cells, filled with another universe
+            tree = get_tree(args.inp, preservetabs=args.preservetabs)
+            res = dict((u, l) for u, l in tree.cells.items() if l)
 
             # flag to sort cells in the output list:
             sflag = False if args.s == "0" else True
-            for c in cards:
-                if c.ctype == mp.CID.cell:
-                    c.get_values()
-                    u = c.get_u()
-                    f = c.get_f()
-                    u = 0 if u is None else u
-                    l = res.get(u, [])
-                    if not l:
-                        res[u] = l
-                    l.append(c.name)
-                elif c.ctype == mp.CID.surface:
-                    break
             # print out
             if args.u == '0':
                 for u, l in sorted(res.items()):
@@ -1344,13 +1702,21 @@ def main(args=sys.argv[1:]):
                     l = sorted(l)
                 for e in rin.shorten(l):
                     print(e, end='')
-            # print tabulated "tree", see E-mail of Marco Fabri, 8.11.2017
+            # print tabulated "tree", see E-mail of Marco Fabri, 8.11.2017.
+            # The second column is left empty, as in the earlier versions.
             for u, cl in sorted(res.items()):
                 print('Cells in universe ', u)
                 for c in cl:
-                    print(c, fd.get(c, ''))
-
-
+                    print(c, '')
+            # print universe tree
+            print('Universe tree')
+            for l in tree.tree():
+                print(l)
+            print('Unused universes:', ' '.join(map(str, tree.unused())))
+            print('Undefined universes:',
+                  ' '.join(map(str, tree.undefined())))
+            if args.export:
+                tree.write_json(args.export)
 
         elif args.mode == 'impinfo':
 
@@ -1373,26 +1739,93 @@ def main(args=sys.argv[1:]):
                     print(c.card(), end='')
 
         elif args.mode == 'sinfo':
+            from numjuggler.refindex import from_cards
             # first, get the list of surfaces:
             sl = {}
             st = set()  # set of used surface types
             for c in cards:
-                if c.ctype == mp.CID.surface:
+                if c.ctype in (mp.CID.cell, mp.CID.surface, mp.CID.data):
                     c.get_values()
-                    sl[c.name] = (set(), c.stype)
+                if c.ctype == mp.CID.surface:
+                    sl[c.name] = c.stype
                     st.add(c.stype)
             # for each surface return list of cells:
-            for c in cards:
-                if c.ctype == mp.CID.cell:
-                    c.get_values()
-                    for v, t in c.values:
-                        if t == 'sur':
-                            sl[v][0].add(c.name)
+            ri = from_cards(cards)
             # print out:
-            for s, (cs, t) in sorted(sl.items()):
-                print(s, t, sorted(cs))
+            for s, t in sorted(sl.items()):
+                print(s, t, ri.referrers('sur', s, 'cel'))
             for s in sorted(st):
                 print(s)
+            undefined = ri.undefined('sur')
+            if undefined:
+                print('Undefined surfaces:')
+                for s in undefined:
+                    print(s, ri.referrers('sur', s, 'cel'))
+            if args.export:
+                ri.write(args.export, types=('sur',))
+
+        elif args.mode == 'unused':
+            from numjuggler.refindex import get_index, type_names
+            ri = get_index(args.inp, preservetabs=args.preservetabs)
+            # cells are not expected to be referred to
+            for t in ('sur', 'mat', 'tr', 'u'):
+                l = rin.shorten(ri.unused(t))
+                print('Unused {}:'.format(type_names[t]), *l)
+            for t in ('cel', 'sur', 'mat', 'tr', 'u'):
+                l = rin.shorten(ri.undefined(t))
+                print('Undefined {}:'.format(type_names[t]), *l)
+            if args.export:
+                ri.write(args.export)
+
+        elif args.mode == 'prune':
+            from numjuggler.refindex import get_index, type_names
+            # Surfaces, materials and transformations not used by cells,
+            # tallies or other data cards are removed.
+            ri = get_index(args.inp, preservetabs=args.preservetabs)
+            live = ri.live()
+            dtypes = {'Mn': 'mat', 'MTn': 'mat', 'MPNn': 'mat', 'TRn': 'tr'}
+            removed = dict((t, []) for t in ('sur', 'mat', 'tr'))
+            for lines, ctype, pos in mp.get_raw_cards(
+                    args.inp, preservetabs=args.preservetabs):
+                dtype, vals = scanner.scan_card(lines, ctype)
+                if ctype == mp.CID.surface and vals:
+                    t = 'sur'
+                else:
+                    t = dtypes.get(dtype)
+                if t is not None and vals[0][0] not in live[t]:
+                    if dtype != 'MTn' and dtype != 'MPNn':
+                        removed[t].append(vals[0][0])
+                    continue
+                print(''.join(lines), end='')
+            if args.log != '':
+                with open(args.log, 'w') as flog:
+                    for t in ('sur', 'mat', 'tr'):
+                        l = rin.shorten(sorted(removed[t]))
+                        print('Removed {}:'.format(type_names[t]), *l,
+                              file=flog)
+
+        elif args.mode == 'cinfo':
+            from numjuggler.complexity import get_stats, histogram, columns
+            stats = list(get_stats(args.inp, preservetabs=args.preservetabs))
+            keys = [a for a, h in columns]
+            if args.sort:
+                # largest values first
+                k = keys.index(args.sort)
+                rows = sorted((cs.row() for cs in stats),
+                              key=lambda r: r[k], reverse=True)
+            else:
+                k = keys.index('words')
+                rows = [cs.row() for cs in stats]
+            print(('{:>8s}'*len(columns)).format(*[h for a, h in columns]))
+            for r in rows:
+                print(('{:>8d}'*len(r)).format(*r))
+            print()
+            print('Histogram of', columns[k][1])
+            hist = histogram([r[k] for r in rows])
+            nmax = max([n for v1, v2, n in hist] + [1])
+            for v1, v2, n in hist:
+                bar = '*' * int(round(50. * n / nmax))
+                print('{:>8d} -- {:<8d}{:>8d} {}'.format(v1, v2 - 1, n, bar))
 
         elif args.mode == 'minfo':
 
@@ -1410,29 +1843,25 @@ def main(args=sys.argv[1:]):
      Estimated memory requirement :     {:5.1f}{}
      %cell length, %number #      :       {:4.1%}   {:4.1%}"""
             hashcellfmt = "   {:>9s}        {d[0]:3}      {d[1]:3}      {d[2]:3}"
+            from numjuggler.complexity import cell_stats, estimate_lja
             munits=['bytes','kB','MB','GB','TB']
             stat_tot  = [0,0,0,0]
             longest_c = None
             maxword   = 0
-            ic = 0
             mlja = 0
             hashlist = []
-            for c in cards:
-               if c.ctype == mp.CID.cell:
-                  ic += 1
-                  cardstr = stc.cell_card_string(''.join(c.lines))
-                  cs=cardstr.get_stat()
-                  if ( ic > 50 and mlja > 3250) :
-                      mlja += 7 * cs[0]
-                  else:
-                      mlja += 17 * cs[0]
-                  if ( cs[0] > maxword ) :
-                      c.get_values()
-                      maxword   = cs[0]
-                      longest_c = c.name
-                  stat_tot=[a+b for a,b in zip(stat_tot,cs)]
-                  if ( cs[1] > 0 ):
-                      hashlist.append([cardstr.headstr.split()[0],cs[1:]])
+            cells = [''.join(c.lines) for c in cards if c.ctype == mp.CID.cell]
+            stats = stc.map_cells(cell_stats, cells, jobs=args.jobs)
+            for cs in estimate_lja(filter(None, stats)):
+                  mlja += cs.lja
+                  if ( cs.words > maxword ) :
+                      maxword   = cs.words
+                      longest_c = cs.name
+                  hashes = [cs.hashcell + cs.hashsurf, cs.hashcell,
+                            cs.hashsurf]
+                  stat_tot=[a+b for a,b in zip(stat_tot,[cs.words] + hashes)]
+                  if ( hashes[0] > 0 ):
+                      hashlist.append([str(cs.name), hashes])
             mljacell = mlja
             mlja = mlja + 2*17*maxword*stat_tot[1]
             mem  = mlja * 4 * 4.   # 4 times mlja, 4 bytes integer
@@ -1632,45 +2061,88 @@ def main(args=sys.argv[1:]):
                     if dll:
                         if c.name in dll:
                             c.input[-1] += dll[c.name]
+                            c.modified = True
                     else:
                         m = c.get_m()
                         f = c.get_f()
                         imp = c.get_imp()
                         if imp['imp:n'] > 0 and m == M and f in [0, None]:
                             c.input[-1] += N
+                            c.modified = True
                 print(c.card(), end='')
 
-        elif args.mode == 'renum':
-            if args.map:
-                maps = lf.read_map_file(args.map, log=args.log != '')
-            else:
-                maps = {}
-
+        elif args.mode == 'plan':
+            indent = ' '*8
+            maps = renum_maps(args,
+                              lambda: scanner.get_numbers(
+                                  args.inp, preservetabs=args.preservetabs))
+            names = scanner.get_names(args.inp,
+                                      preservetabs=args.preservetabs)
+            ncol = 0
+            for t in ['cel', 'sur', 'mat', 'u', 'tr']:
+                if t not in names:
+                    continue
+                f = maps.get(t, lf.trivial)
+                image, collisions = mn.get_plan(names[t], f)
+                print('-' * 40, t, len(image))
+                print('-' * 20, t, ' collisions', len(collisions))
+                for nnew, nn in collisions:
+                    print('{}{:>3s} {} <- {}'.format(
+                        indent, t[0], nnew,
+                        ' '.join(map(str, rin.shorten(nn)))))
+                ncol += len(collisions)
+                print('-' * 20, t, ' image')
+                rp = None
+                nfree = 0
+                for r1, r2 in mn._get_ranges_from_set(image):
+                    print('{}{:>3s}'.format(indent, t[0]), end='')
+                    if r1 == r2:
+                        rs = ' {}'.format(r1)
+                    else:
+                        rs = ' {} -- {}'.format(r1, r2)
+                    if rp is not None:
+                        fr = '{}'.format(r1 - rp - 1)
+                        nfree += r1 - rp - 1
+                    else:
+                        fr = ''
+                    ur = '{}'.format(r2 - r1 + 1)
+                    print('{:<30s} {:>8s} {:>8s}'.format(rs, ur, fr))
+                    rp = r2
+                print('{}unused numbers between ranges: {}'.format(indent,
+                                                                   nfree))
+            print('-' * 40, 'total collisions', ncol)
+        elif args.mode == 'compact':
             for c in cards:
                 c.get_values()
 
-            # index dictionary only if needed:
-            if 'i' in (args.c, args.s, args.m, args.u):
-                imaps = lf.get_indices(cards, log=args.log != '')
+            # Ranges to keep unchanged are given in -c, -s, etc.
+            types = ['cel', 'sur', 'mat', 'u', 'tr']
+            pinned = {}
+            for t in types:
+                rs = getattr(args, t[0])
+                if rs != '0':
+                    pinned[t] = [(r.x1, r.x2) for r in lf._get_map_ranges(rs)]
+
+            dicts = mn.get_compact_maps(mn.get_numbers(cards), pinned,
+                                        inorder=args.inorder, types=types,
+                                        universes=mn.get_universes(cards))
+            maps = {}
+            for t, d in dicts.items():
+                maps[t] = lf.LikeDictFunction(d, log=args.log != '')
+                maps[t].doc = 'Compacting function for {}'.format(t)
 
-            for t in ['cel', 'sur', 'mat', 'u', 'tr']:
-                # If command line paramters are specified, they rewrite maps
-                # from the map file
-                dn = getattr(args, t[0])
-                if dn == 'i':
-                    maps[t] = imaps[t]
-                    maps[t].doc = 'Indexing function for {}'.format(t)
-                    maps[t].default = None   # This will raise error if applied to non-existent value
-                elif dn != '0':
-                    maps[t] = lf.LikeFunction(log=args.log != '')
-                    maps[t].default = lf.add_func(int(dn))
-
-                    # do not modify zero numbers (important for material
-                    # numbers)
-                    maps[t].mappings[lf.Range(0)] = lf.const_func(0)
-
-                    maps[t].doc = 'Function for {} from command line'.format(t)
+            for c in cards:
+                c.apply_map(maps)
+                print(c.card(), end='')
+
+            if args.log != '':
+                for k, m in maps.items():
+                    m.write_log_as_map(k[0], args.log)
+        elif args.mode == 'renum':
+            for c in cards:
+                c.get_values()
 
+            maps = renum_maps(args, lambda: mn.get_numbers(cards))
 
             for c in cards:
                 c.apply_map(maps)
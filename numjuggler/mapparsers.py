@@ -44,3 +44,42 @@ def cdens(fname):
         if len(rr) == 0:
             resdef[t] = float(val), fmt
     return res, resdef
+
+
+# Parameters that can be changed in the variants mode
+variant_keys = ('d', 'imp:n', 'imp:p', 'imp:e', 'fill')
+
+
+def variants(fname):
+    """
+    Table of variants: each line defines changes of cell parameters in a
+    variant, e.g.
+
+        v1 c 1 -- 10: d=-1.0 imp:n=2  # density and importance in cells 1--10
+        v1 m 3: d=0.5                 # density in cells with material 3
+        v2 u 4: fill=7                # fill of cells in universe 4
+
+    Return OrderedDict, variant name -> list of (t, ranges, params), where t
+    is the selection type, ranges -- list of Range instances and params --
+    OrderedDict of new parameter values as strings.
+    """
+    res = OrderedDict()
+    with open(fname, 'r') as f:
+        for l in f:
+            ll = l.split('#')[0].strip()
+            if not ll or ':' not in ll:
+                continue
+            name, rest = ll.split(None, 1)
+            t = rest[0].lower()
+            ranges, vals = rest[1:].split(':', 1)
+            rr = list(_get_map_ranges(ranges.strip()))
+            params = OrderedDict()
+            for e in vals.split():
+                k, v = e.split('=')
+                k = k.lower()
+                if k not in variant_keys:
+                    raise ValueError('Unknown parameter {} in {}'.format(
+                        k, repr(l)))
+                params[k] = v
+            res.setdefault(name, []).append((t, rr, params))
+    return res
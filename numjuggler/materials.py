@@ -0,0 +1,320 @@
+"""
+Material cards.
+
+The meaningful part of an Mn card is read into a Material: an array of
+ZAIDs, an array of fractions, library suffixes and a dictionary of keyword
+options, e.g. nlib. Materials can be normalized, converted between atomic
+and weight fractions, mixed and compared by their keys: normalized and
+rounded tuples that do not depend on the order of the nuclides, on the
+normalization of fractions or on the formatting of the card.
+
+Nuclide masses are taken from the bundled tables: standard atomic weights of
+the elements for natural ZAIDs (A = 0), masses of the lightest isotopes and,
+for other isotopes, the semi-empirical mass formula, accurate to about 0.01%.
+"""
+
+from __future__ import print_function
+
+import re
+
+try:
+    # try because numpy might be unavailable.
+    import numpy
+except ImportError:
+    print("Numpy package is required to work with materials but ")
+    print("cannot be found. Install it with ")
+    print("")
+    print(" > pip install numpy")
+    print("")
+    raise
+except:
+    raise
+
+# keyword options, with optional spaces around `=`
+re_kw = re.compile(r'\s*=\s*')
+
+# Standard atomic weights of elements, g/mol, indexed by Z. For elements
+# without stable isotopes, mass number of the longest-lived isotope.
+element_masses = (
+    0.,
+    1.008, 4.002602, 6.94, 9.0121831, 10.81,                       # H - B
+    12.011, 14.007, 15.999, 18.998403163, 20.1797,                 # C - Ne
+    22.98976928, 24.305, 26.9815385, 28.085, 30.973761998,         # Na - P
+    32.06, 35.45, 39.948, 39.0983, 40.078,                         # S - Ca
+    44.955908, 47.867, 50.9415, 51.9961, 54.938044,                # Sc - Mn
+    55.845, 58.933194, 58.6934, 63.546, 65.38,                     # Fe - Zn
+    69.723, 72.630, 74.921595, 78.971, 79.904,                     # Ga - Br
+    83.798, 85.4678, 87.62, 88.90584, 91.224,                      # Kr - Zr
+    92.90637, 95.95, 98., 101.07, 102.90550,                       # Nb - Rh
+    106.42, 107.8682, 112.414, 114.818, 118.710,                   # Pd - Sn
+    121.760, 127.60, 126.90447, 131.293, 132.90545196,             # Sb - Cs
+    137.327, 138.90547, 140.116, 140.90766, 144.242,               # Ba - Nd
+    145., 150.36, 151.964, 157.25, 158.92535,                      # Pm - Tb
+    162.500, 164.93033, 167.259, 168.93422, 173.045,               # Dy - Yb
+    174.9668, 178.49, 180.94788, 183.84, 186.207,                  # Lu - Re
+    190.23, 192.217, 195.084, 196.966569, 200.592,                 # Os - Hg
+    204.38, 207.2, 208.98040, 209., 210.,                          # Tl - At
+    222., 223., 226., 227., 232.0377,                              # Rn - Th
+    231.03588, 238.02891, 237., 244., 243.,                        # Pa - Am
+    247., 247., 251., 252., 257.)                                  # Cm - Fm
+
+# Masses of light isotopes, where the semi-empirical formula is not
+# applicable, g/mol
+light_masses = {(1, 1): 1.00782503, (1, 2): 2.01410178, (1, 3): 3.01604928,
+                (2, 3): 3.01602932, (2, 4): 4.00260325,
+                (3, 6): 6.0151228, (3, 7): 7.0160034}
+
+# Neutron and hydrogen atom masses, g/mol, and MeV in g/mol
+m_n = 1.00866492
+m_h = 1.00782503
+mev = 1. / 931.494
+
+# Avogadro constant, in 1/(barn cm) per g/cm3 for molar mass 1 g/mol
+avogadro = 0.602214076
+
+
+def nuclide_masses(zaids):
+    """
+    Return array of masses, in g/mol, of nuclides given by integer ZAIDs.
+    Metastable states, with A increased by 400, are recognized.
+    """
+    zaids = numpy.asarray(zaids, dtype=int)
+    z = zaids // 1000
+    a = zaids % 1000
+    a = numpy.where(a > 300, a - 400, a)
+    if (z < 1).any() or (z >= len(element_masses)).any():
+        raise ValueError('Unknown element in ZAIDs {}'.format(
+            zaids[(z < 1) | (z >= len(element_masses))]))
+    res = numpy.array(element_masses)[z]
+
+    # isotopes, the semi-empirical mass formula
+    iso = a > 0
+    zi = z[iso].astype(float)
+    ai = a[iso].astype(float)
+    pairing = 11.18 / numpy.sqrt(ai)
+    pairing *= numpy.where(zi % 2 == 0, 1, -1) * (ai % 2 == 0)
+    b = (15.75 * ai - 17.8 * ai**(2. / 3.) -
+         0.711 * zi * (zi - 1) / ai**(1. / 3.) -
+         23.7 * (ai - 2 * zi)**2 / ai + pairing)
+    res[iso] = zi * m_h + (ai - zi) * m_n - numpy.maximum(b, 0) * mev
+
+    for (zz, aa), m in light_masses.items():
+        res[(z == zz) & (a == aa)] = m
+    return res
+
+
+def parse_material(inpt):
+    """
+    Return tuple (zaids, fractions, options) for the meaningful part of a
+    material card inpt, including the card name. ZAIDs are strings in lower
+    case, fractions are floats (negative for weight fractions), options is a
+    dictionary keyword -> value, both in lower case.
+    """
+    zaids = []
+    fracs = []
+    opts = {}
+    tokens = re_kw.sub('=', inpt).split()[1:]
+    i = 0
+    while i < len(tokens):
+        t = tokens[i].lower()
+        if '=' in t:
+            k, v = t.split('=', 1)
+            opts[k] = v
+            i += 1
+        else:
+            zaids.append(t)
+            fracs.append(float(tokens[i + 1]))
+            i += 2
+    return zaids, fracs, opts
+
+
+class Material(object):
+    """
+    Material composition.
+
+    Attributes:
+
+        name -- material number
+        zaids -- numpy array of integer ZAIDs
+        suffixes -- list of library suffixes, e.g. '80c', or ''
+        fractions -- numpy array of fractions, negative for weight fractions
+        options -- dictionary of keyword options, e.g. {'nlib': '80c'}
+    """
+    def __init__(self, zaids, fractions, suffixes=None, options=None, name=0):
+        self.name = name
+        self.zaids = numpy.array(zaids, dtype=int)
+        self.fractions = numpy.array(fractions, dtype=float)
+        if suffixes is None:
+            suffixes = [''] * len(self.zaids)
+        self.suffixes = list(suffixes)
+        self.options = dict(options or {})
+        return
+
+    def __len__(self):
+        return len(self.zaids)
+
+    def copy(self):
+        return Material(self.zaids, self.fractions, self.suffixes,
+                        self.options, self.name)
+
+    def is_weight(self):
+        """
+        True if fractions are weight fractions.
+        """
+        return bool((self.fractions < 0).any())
+
+    def normalize(self, s=1.):
+        """
+        Scale fractions so that the sum of their absolute values is s. The
+        sign of fractions is not changed.
+        """
+        t = numpy.abs(self.fractions).sum()
+        if t > 0:
+            self.fractions *= s / t
+        return
+
+    def merge(self):
+        """
+        Sum fractions of repeated nuclides, i.e. with the same ZAID and
+        suffix. Nuclides keep the order of their first appearance.
+        """
+        ind = {}
+        inv = numpy.array([ind.setdefault(k, len(ind)) for k in
+                           zip(self.zaids.tolist(), self.suffixes)], dtype=int)
+        if len(ind) == len(self.zaids):
+            return
+        first = numpy.full(len(ind), len(inv))
+        numpy.minimum.at(first, inv, numpy.arange(len(inv)))
+        self.fractions = numpy.bincount(inv, weights=self.fractions,
+                                        minlength=len(ind))
+        self.zaids = self.zaids[first]
+        self.suffixes = [self.suffixes[i] for i in first]
+        return
+
+    def masses(self):
+        """
+        Return array of nuclide masses, g/mol.
+        """
+        return nuclide_masses(self.zaids)
+
+    def atomic(self):
+        """
+        Return new material with atomic fractions normalized to 1.
+        """
+        m = self.copy()
+        if m.is_weight():
+            m.fractions = -m.fractions / m.masses()
+        m.normalize()
+        return m
+
+    def weight(self):
+        """
+        Return new material with weight fractions normalized to -1.
+        """
+        m = self.copy()
+        if not m.is_weight():
+            m.fractions = -m.fractions * m.masses()
+        m.normalize()
+        return m
+
+    def molar_mass(self):
+        """
+        Return mean mass of the material atoms, g/mol.
+        """
+        return float(self.atomic().fractions.dot(self.masses()))
+
+    def mass_density(self, d):
+        """
+        Return density in g/cm3 for the density d given as on the cell card:
+        atomic density in 1/(barn cm), if positive, or g/cm3, if negative.
+        """
+        if d < 0:
+            return -d
+        return d * self.molar_mass() / avogadro
+
+    def key(self, digits=6, suffixes=True):
+        """
+        Return hashable key of the material composition and options.
+        Fractions of repeated nuclides are summed, fractions are normalized
+        and rounded to digits significant digits. If suffixes is False,
+        nuclides with different library suffixes are considered equal.
+        """
+        m = self.copy()
+        if not suffixes:
+            m.suffixes = [''] * len(m)
+        m.merge()
+        m.normalize()
+        fmt = '{{:.{}g}}'.format(digits)
+        comp = tuple(sorted((z, s, float(fmt.format(f))) for z, s, f in
+                            zip(m.zaids.tolist(), m.suffixes,
+                                m.fractions.tolist())))
+        return comp, tuple(sorted(m.options.items()))
+
+    def card(self, name=None):
+        """
+        Return multi-line string of the material card, with one nuclide per
+        line. If name is not given, the material name is used.
+        """
+        if name is None:
+            name = self.name
+        lines = []
+        for z, s, f in zip(self.zaids.tolist(), self.suffixes,
+                           self.fractions.tolist()):
+            zs = '{}.{}'.format(z, s) if s else str(z)
+            lines.append('{} {:.8e}'.format(zs, f))
+        for k, v in sorted(self.options.items()):
+            lines.append('{}={}'.format(k, v))
+        return 'm{} '.format(name) + '\n     '.join(lines) + '\n'
+
+
+def read_material(inpt):
+    """
+    Return Material for the meaningful part inpt of an Mn card.
+    """
+    zaids, fracs, opts = parse_material(inpt)
+    zl = []
+    sl = []
+    for z in zaids:
+        z, s = (z.split('.', 1) + [''])[:2]
+        zl.append(int(z))
+        sl.append(s)
+    name = int(inpt.split()[0][1:])
+    return Material(zl, fracs, sl, opts, name)
+
+
+def mix(recipe):
+    """
+    Return new material mixed from materials in recipe, a list of tuples
+    (material, mass). Fractions of the result are atomic, normalized to 1.
+    Options are taken from the first material.
+    """
+    zl = []
+    sl = []
+    fl = []
+    for m, w in recipe:
+        a = m.atomic()
+        zl.append(a.zaids)
+        sl.extend(a.suffixes)
+        # number of atoms of each nuclide, in moles
+        fl.append(a.fractions * w / m.molar_mass())
+    res = Material(numpy.concatenate(zl), numpy.concatenate(fl), sl,
+                   recipe[0][0].options)
+    res.merge()
+    res.normalize()
+    return res
+
+
+def material_key(inpt, extra=(), digits=6):
+    """
+    Return hashable key of the material card with meaningful part inpt.
+    Fractions of repeated ZAIDs are summed, fractions are normalized to 1
+    and rounded to digits significant digits. extra is the list of the
+    meaningful parts of the MTn and MPNn cards of the material, they are
+    included into the key too.
+    """
+    ext = []
+    for e in extra:
+        t = e.lower().split()
+        # card name without material number, e.g. mt or mpn
+        ext.append((t[0].rstrip('0123456789'), tuple(sorted(t[1:]))))
+    return read_material(inpt).key(digits) + (tuple(sorted(ext)),)
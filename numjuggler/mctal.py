@@ -0,0 +1,129 @@
+"""
+Reader of MCTAL files.
+
+Only one tally is read from the file: lines before the tally are skipped
+without parsing, and reading stops at the tally fluctuation chart of the
+requested tally. Bins are read into numpy arrays: tally values and relative
+errors are arrays with one axis for each bin type, in the MCTAL order f, d,
+u, s, m, c, e, t.
+"""
+
+from __future__ import print_function
+
+try:
+    # try because numpy might be unavailable.
+    import numpy
+except ImportError:
+    print("Numpy package is required to read MCTAL files but ")
+    print("cannot be found. Install it with ")
+    print("")
+    print(" > pip install numpy")
+    print("")
+    raise
+except:
+    raise
+
+# Bin types, in order of the MCTAL file
+axes = 'fdusmcet'
+
+
+def _is_number(s):
+    try:
+        float(s)
+    except ValueError:
+        return False
+    return True
+
+
+class Tally(object):
+    """
+    Tally read from MCTAL file.
+
+    Attributes:
+
+        name -- tally number
+        particle -- particle type, as on the tally line
+        ttype -- tally type, as on the tally line
+        counts -- dictionary bin type -> number of bins, at least 1
+        flags -- dictionary bin type -> '', 't' (with total bin) or 'c'
+                 (cumulative bins)
+        fbins -- numpy array of cell or surface numbers of the f bins. Empty
+                 for detector tallies
+        bounds -- dictionary bin type -> numpy array of bin boundaries, for
+                  bin types c, e and t
+        vals -- numpy array of tally values, one axis per bin type
+        errs -- numpy array of relative errors, of the same shape
+    """
+    def __init__(self, name, particle=0, ttype=0):
+        self.name = name
+        self.particle = particle
+        self.ttype = ttype
+        self.counts = dict((a, 1) for a in axes)
+        self.flags = dict((a, '') for a in axes)
+        self.fbins = numpy.array([], dtype=int)
+        self.bounds = {}
+        self.vals = None
+        self.errs = None
+        return
+
+    def shape(self):
+        return tuple(self.counts[a] for a in axes)
+
+    def fvals(self):
+        """
+        Return tuple of arrays (values, errors) for the f bins, in the last
+        bin of other bin types, i.e. in the total bin, where it is present.
+        """
+        n = self.counts['f']
+        return (self.vals.reshape((n, -1))[:, -1],
+                self.errs.reshape((n, -1))[:, -1])
+
+
+def read_tally(fname, n):
+    """
+    Return Tally with number n read from the MCTAL file fname.
+    """
+    with open(fname) as f:
+        for l in f:
+            t = l.split()
+            if len(t) > 1 and t[0] == 'tally' and int(t[1]) == n:
+                break
+        else:
+            raise ValueError('Tally {} not found in {}'.format(n, fname))
+
+        res = Tally(n, *map(int, t[2:4]))
+        lists = dict((a, []) for a in axes)
+        vals = []
+        axis = None
+        for l in f:
+            t = l.split()
+            if not t:
+                continue
+            if l[0].isspace():
+                # entries of the last keyword line. Other indented lines,
+                # e.g. particle list or FC comment, are skipped.
+                if axis == 'vals':
+                    vals.extend(t)
+                elif axis is not None and _is_number(t[0]):
+                    lists[axis].extend(t)
+                continue
+            k = t[0]
+            if k == 'vals':
+                axis = k
+            elif k in ('tfc', 'tally', 'kcode'):
+                break
+            elif k[0] in axes and len(k) <= 2 and len(t) > 1:
+                axis = k[0]
+                res.counts[axis] = max(int(t[1]), 1)
+                res.flags[axis] = k[1:]
+            else:
+                axis = None
+
+    a = numpy.array(vals, dtype=float).reshape(res.shape() + (2,))
+    res.vals = a[..., 0]
+    res.errs = a[..., 1]
+    res.fbins = numpy.array(lists['f'], dtype=int)
+    for k in 'cet':
+        if lists[k]:
+            res.bounds[k] = numpy.array(lists[k], dtype=float)
+    return res
@@ -5,6 +5,7 @@ from __future__ import print_function
 
 import warnings
 import collections
+from bisect import bisect_right
 
 
 class _Range(object):
@@ -165,6 +166,29 @@ def get_numbers(scards):
             if t not in r:
                 r[t] = []
             r[t].append(v)
+        if getattr(c, 'fillarray', None) is not None:
+            # universes in the lattice fill array, including zeros, and
+            # transformations of its elements
+            r.setdefault('fill', []).extend(c.fillarray.u.tolist())
+            trl = c.fillarray.transformations()
+            if trl:
+                r.setdefault('tr', []).extend(trl)
+    return r
+
+
+def get_universes(scards):
+    """
+    Return list of universe numbers, u and fill, in order of their
+    appearance in the cards. Universes of a lattice fill array follow the
+    other numbers of its card.
+    """
+    r = []
+    for c in scards:
+        for v, t in c.values:
+            if t in ('u', 'fill'):
+                r.append(v)
+        if getattr(c, 'fillarray', None) is not None:
+            r.extend(c.fillarray.u.tolist())
     return r
 
 
@@ -195,24 +219,166 @@ def get_indices(scards):
     return res
 
 
+def get_ranges(vals, types=('cel', 'sur', 'mat', 'u', 'tr')):
+    """
+    Return dictionary with keys -- number types and values -- tuples (min,
+    max) of numbers used in the input file.
+
+    vals is an iterable over lists of (v, t) tuples, e.g. over values of
+    parsed cards, or over values returned by scanner.scan().
+
+    Only numbers of types listed in `types` are considered. Fill numbers are
+    counted as universes, zero numbers (void material, zero universe) are
+    skipped.
+    """
+    r = {}
+    for vl in vals:
+        for v, t in vl:
+            if t == 'fill':
+                t = 'u'
+            if t in types and v != 0:
+                if t in r:
+                    n1, n2 = r[t]
+                    r[t] = (min(n1, v), max(n2, v))
+                else:
+                    r[t] = (v, v)
+    return r
+
+
+def get_offsets(ranges):
+    """
+    Return list of offset dictionaries, one for each element of `ranges`.
+
+    Elements of `ranges` are dictionaries, as returned by get_ranges(), for
+    a sequence of input files. The offsets are chosen so that numbers of
+    each type do not overlap after the offset is added: numbers of an input
+    file are shifted only when they do not lie above the numbers of all
+    previous input files.
+    """
+    res = []
+    nlast = {}  # last number used by previous inputs, by type
+    for rd in ranges:
+        od = {}
+        for t, (n1, n2) in rd.items():
+            n0 = nlast.get(t, 0)
+            od[t] = n0 + 1 - n1 if n1 <= n0 else 0
+            nlast[t] = n2 + od[t]
+        res.append(od)
+    return res
+
+
+def get_plan(names, f):
+    """
+    Apply mapping f to all names and return tuple (image, collisions).
+
+    names is an iterable over numbers of one type, e.g. cell names as
+    returned by scanner.get_names(). image is the sorted list of unique new
+    numbers. collisions is a list of tuples (nnew, [n1, n2, ...]), where n1,
+    n2, ... are different old numbers mapped to the same new number nnew.
+
+    The old numbers are mapped once each, and collisions are found as equal
+    neighbours in the list of (new, old) pairs sorted by new number.
+    """
+    pairs = sorted((f(n), n) for n in set(names))
+    image = []
+    collisions = []
+    for nnew, n in pairs:
+        if image and image[-1] == nnew:
+            if collisions and collisions[-1][0] == nnew:
+                collisions[-1][1].append(n)
+            else:
+                collisions.append((nnew, [nprev, n]))
+        else:
+            image.append(nnew)
+        nprev = n
+    return image, collisions
+
+
+def get_compact_maps(numbers, pinned={}, inorder=False,
+                     types=('cel', 'sur', 'mat', 'u', 'tr'), universes=None):
+    """
+    Return dictionary type -> dictionary old -> new number, that compacts
+    numbers of each type to the sequence 1, 2, 3, ...
+
+    numbers is a dictionary type -> list of numbers, as returned by
+    get_numbers(). Fill numbers are considered as universes. Each number is
+    taken once: in increasing order or, if inorder is True, in order of the
+    first appearance. For universes, the order of appearance is given by
+    universes, the list of u and fill numbers as returned by
+    get_universes(). If it is not given, fill numbers follow all u numbers.
+
+    pinned is a dictionary type -> list of tuples (n1, n2). Numbers in these
+    ranges are not changed and other numbers are not mapped into these ranges.
+    Zero numbers, i.e. void material and zero universe, are not changed.
+    """
+    res = {}
+    for t in types:
+        vals = numbers.get(t, [])
+        if t == 'u':
+            if universes is not None:
+                vals = universes
+            else:
+                vals = vals + numbers.get('fill', [])
+        if inorder:
+            seen = set()
+            unique = []
+            for v in vals:
+                if v not in seen:
+                    seen.add(v)
+                    unique.append(v)
+        else:
+            unique = sorted(set(vals))
+
+        # Merged pinned ranges, sorted, to be skipped by the counter
+        rl = []
+        for n1, n2 in sorted(pinned.get(t, [])):
+            if rl and n1 <= rl[-1][1] + 1:
+                rl[-1] = (rl[-1][0], max(n2, rl[-1][1]))
+            else:
+                rl.append((n1, n2))
+
+        starts = [r[0] for r in rl]
+
+        d = {}
+        cn = 1  # next number to use
+        ir = 0  # index of the next pinned range in rl
+        for v in unique:
+            i = bisect_right(starts, v) - 1
+            if v == 0 or (i >= 0 and v <= rl[i][1]):
+                d[v] = v
+                continue
+            while ir < len(rl) and rl[ir][1] < cn:
+                ir += 1
+            if ir < len(rl) and rl[ir][0] <= cn:
+                cn = rl[ir][1] + 1
+                ir += 1
+            d[v] = cn
+            cn += 1
+        res[t] = d
+    return res
+
+
 def _get_ranges_from_set(nn):
+    """
+    Iterable, return tuples (n1, n2) -- ranges of consecutive numbers in nn.
+
+    The sorted numbers are traversed only once, thus the time is dominated by
+    sorting.
+    """
     nnl = sorted(nn)
     if nnl:                         # nnl can be empty
-        if [e for e in nn if not isinstance(e, int)]:
+        if [e for e in nnl if not isinstance(e, int)]:
             # for float elements of nn only one range, (min, max), is returned
             yield (nnl[0], nnl[-1])
         else:
-            n1 = nnl.pop(0)  # start of 1-st range
-            np = n1          # previous item
-            while nnl:
-                n = nnl.pop(0)
-                if np in [n-1, n]:
-                    # range is continued
-                    np = n
-                else:
+            n1 = nnl[0]  # start of 1-st range
+            np = n1      # previous item
+            for n in nnl:
+                if n - np > 1:
+                    # range stops at np
                     yield (n1, np)
                     n1 = n
-                    np = n
+                np = n
             yield (n1, np)
 
 
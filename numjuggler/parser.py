@@ -38,6 +38,12 @@ re_prm = re.compile(r'([it]mp:*[npe]*[=\s]+)(\S+)', flags=re.IGNORECASE)
 # fill keyword
 re_fll = re.compile(r'\*{0,1}fill[=\s]+', flags=re.IGNORECASE)  # TODO: this will also match fill===
 
+# lat parameter in cell card
+re_lat = re.compile(r'(lat[=\s]+)(\d+)', flags=re.IGNORECASE)
+
+# fill keyword followed by index ranges of a lattice fill array
+re_fla = re.compile(r'fill[=\s]+-?\d+\s*:', flags=re.IGNORECASE)
+
 
 # If type specifier not given, any data type can be formatted:
 def fmt_gen(s):
@@ -111,6 +117,11 @@ class Card(object):
         # used in remove_hash function
         self.cstrg = False
 
+        # True if values, meaningful or hidden parts of the card have been
+        # changed, i.e. the card must be rendered with card(). Otherwise
+        # card() returns the original lines.
+        self.modified = False
+
         # data card type. Defined from the get_values() method.
         # Has sense only to data cards (see ctype). For other card types
         # is None.
@@ -137,6 +148,10 @@ class Card(object):
         # to prevent its modification.
         self.hidden = {}
 
+        # Lattice fill array, an instance of lattice.FillArray. None, if the
+        # card has no fill array.
+        self.fillarray = None
+
         # List of (v, t) tuples, where v -- value and t -- its type.
         self.values = []
 
@@ -152,6 +167,9 @@ class Card(object):
         self.__d = ''  # density
         self.__i = -1  # importances
         self.__cr = -1  # set of reference cells.
+        # Positions in self.values: first position of each type and all
+        # positions of surfaces and cells. None means not computed.
+        self.__vi = None
         # surface properties
         self.__st = ''  # '' means undefined.
 
@@ -160,25 +178,43 @@ class Card(object):
         self.get_input()
         return
 
+    def _value_index(self):
+        """
+        Returns tuple (first, pos), where first is a dictionary type -> index
+        of the first value of this type in self.values, and pos -- dictionary
+        with lists of indices of all 'sur' and 'cel' values.
+
+        The index is computed once, by get_values() or on the first call. It
+        remains valid as long as values are replaced without changing their
+        types.
+        """
+        if self.__vi is None:
+            first = {}
+            pos = {'sur': [], 'cel': []}
+            for i, (v, t) in enumerate(self.values):
+                if t not in first:
+                    first[t] = i
+                if t in pos:
+                    pos[t].append(i)
+            self.__vi = (first, pos)
+        return self.__vi
+
     def _get_value_by_type(self, t):
         """
         Returns the first value of type t found in self.values.
         """
-        vl, tl = zip(*self.values)
-        try:
-            i = tl.index(t)
-        except ValueError:
+        i = self._value_index()[0].get(t)
+        if i is None:
             return None
-        finally:
-            return vl[i]
+        return self.values[i][0]
 
     def _set_value_by_type(self, t, v):
         """
         Sets the first value of type t to v in self.values.
         """
-        vl, tl = zip(*self.values)
-        i = tl.index(t)
+        i = self._value_index()[0][t]
         self.values[i] = (v, t)
+        self.modified = True
 
     @property
     def geom_prefix(self):
@@ -308,6 +344,18 @@ class Card(object):
                 d['~'].append(s2)
                 inpt = inpt.replace(s1 + s2, s1 + '~', 1)
 
+            # lattice type is not a number to be renumbered
+            sbl = re_lat.findall(inpt)
+            if sbl:
+                for s1, s2 in sbl:
+                    inpt = inpt.replace(s1 + s2, s1 + '^', 1)
+                d['^'] = [s2 for s1, s2 in sbl]
+
+            # lattice fill array. It is hidden line by line, to keep the
+            # number of meaningful parts.
+            if re_fla.search(inpt):
+                inpt, d['`'] = _hide_fill_array(inpt, self)
+
         # replace repitition syntax in junks:
         sbl = re_rpt.findall(inpt)
         if sbl:
@@ -352,6 +400,9 @@ class Card(object):
                 unit, inpt, fvals = _parse_tr(inpt)
                 self.unit = unit
                 vt += fvals
+                # TR parameters are parsed to floats and are rendered
+                # differently from the original lines
+                self.modified = True
             if self.dtype is not None:
                 self.name = vt[0][0]
         else:
@@ -360,6 +411,8 @@ class Card(object):
 
         self.input = inpt
         self.values = vt
+        self.__vi = None
+        self._value_index()
 
         self.print_debug('get_values', 'iv')
         return
@@ -373,24 +426,32 @@ class Card(object):
         if self.__cr != -1:
             return self.__cr
         else:
-            s = set()
-            for v, t in self.values:
-                if t == 'cel':
-                    s.add(v)
-            self.__cr = s
+            self.__cr = set(self.values[i][0]
+                            for i in self._value_index()[1]['cel'])
             return self.__cr
 
+    def get_surfaces(self):
+        """
+        Returns list of surfaces used in the cell card, in order of their
+        appearance. Surfaces used several times are repeated.
+        """
+        if self.ctype != CID.cell:
+            return None
+        return [self.values[i][0] for i in self._value_index()[1]['sur']]
+
     def get_geom(self):
         """
         Returns part of the cell card describing geometry, as a (multiline)
         string.
         """
         p, s = self.geom_prefix, self.geom_suffix
+        m = self.modified
         self.geom_prefix = '§'
         self.geom_suffix = '§'
         geom = self.card().split('§')[1]
         self.geom_prefix = p
         self.geom_suffix = s
+        self.modified = m
         return geom
 
     def get_u(self):
@@ -403,12 +464,7 @@ class Card(object):
             return self.__u
         else:
             # get it only once:
-            for v, t in self.values:
-                if t == 'u':
-                    self.__u = v
-                    break
-            else:
-                self.__u = None
+            self.__u = self._get_value_by_type('u')
             return self.__u
 
     def get_m(self):
@@ -424,11 +480,8 @@ class Card(object):
             if 'like' in ''.join(self.input).lower():
                 # material name should be given in another cell.
                 pass
-            for v, t in self.values:
-                if t == 'mat':
-                    self.__m = v
-                    break
-            else:
+            self.__m = self._get_value_by_type('mat')
+            if self.__m is None:
                 # raise ValueError("Cell does not have material specs")
                 self.__m = -2
             return self.__m
@@ -462,6 +515,7 @@ class Card(object):
         if self.get_m() > 0:
             self.hidden['~'][0] = v
             self.__d = float(v)
+            self.modified = True
 
     def get_f(self, newv=None):
         """
@@ -474,18 +528,21 @@ class Card(object):
             return self.__f
         else:
             # get it only once:
-            for i in range(len(self.values)):
-                v, t = self.values[i]
-                if t == 'fill':
-                    if newv is not None:
-                        v = newv
-                        self.values[i] = (v, t)
-                    self.__f = v
-                    break
-            else:
-                self.__f = None
+            if newv is not None and 'fill' in self._value_index()[0]:
+                self._set_value_by_type('fill', newv)
+            self.__f = self._get_value_by_type('fill')
             return self.__f
 
+    def get_fills(self):
+        """
+        Returns list of universes, the cell is filled with. For lattice cells
+        with fill array, these are non-zero universes of the array.
+        """
+        if self.fillarray is not None:
+            return self.fillarray.universes()
+        f = self.get_f()
+        return [] if f is None else [f]
+
     def get_imp(self, vals={}):
         """
         Returns importances, if explicitly specified in the cell card.
@@ -513,6 +570,7 @@ class Card(object):
                         if res[key] != vals[p]:
                             res[key] = vals[p]
                             self.hidden['~'][n] = str(vals[p])
+                            self.modified = True
 
                 # for s in self.hidden.get('~', []):
                 #     sl = s.lower()
@@ -573,13 +631,19 @@ class Card(object):
                 self.input[n] = i
                 break
 
+        self.modified = True
         self.print_debug('remove_fill', 'iv')
         return
 
     def card(self, wrap=False, comment=True):
         """
         Return multi-line string representing the card.
+
+        If the card has not been modified, the original lines are returned.
         """
+        if not self.modified and not wrap and comment:
+            return ''.join(self.lines)
+
         if self.input:
             # put values back to meaningful parts:
             inpt = '\n'.join(self.input)
@@ -672,6 +736,7 @@ class Card(object):
                 inpt.append(i)
                 self.print_debug(i, '')
             self.input = inpt
+            self.modified = True
             self.print_debug('after remove_spaces', 'i')
         return
 
@@ -696,7 +761,14 @@ class Card(object):
             else:
                 newval = t[0]
             newvals.append((newval, t[1]))
+        if newvals != self.values:
+            self.modified = True
         self.values = newvals
+        if self.fillarray is not None:
+            fu = f.get('u', lambda x: x)
+            if self.fillarray.apply_map(fu, f.get('tr')):
+                self.hidden['`'] = self.fillarray.pieces()
+                self.modified = True
         self.print_debug('after apply_map', 'vi')
         return
 
@@ -874,6 +946,9 @@ def _split_cell(input_, self):
             inpt_parm = inpt_parm.replace(vs, tp, 1)
             vals.append((vv, vt))
             fmts.append(vf)
+        elif 'fill' in s.lower() and t and t[0] == '`':
+            # lattice fill array is hidden and is not a part of values
+            t.pop(0)
         elif 'fill' in s.lower():
             # print '_split_cell: has fill!'
             # assume that only one integer follows the fill keyword, optionally
@@ -942,13 +1017,6 @@ def _split_cell(input_, self):
                     vals.append((vv, vt))
                     fmts.append(vf)
 
-            # warn if there is possibility for an array following the fill
-            # keyword:
-            # TODO fill value can be an array
-            if 'fill' is s.lower() and 'lat' in ''.join(parm).lower():
-                print('WARNING: fill keyword followed by an array', end=' ')
-                print('cannot be parsed')
-
     inpt = inpt_geom + inpt_parm
 
     # replace '_' with fmts:
@@ -958,6 +1026,35 @@ def _split_cell(input_, self):
     return inpt.split('\n'), vals
 
 
+def _hide_fill_array(inpt, card):
+    """
+    Replace the lattice fill array in the meaningful part inpt of a cell card
+    with '`', once in each line the array spans. Set the fillarray attribute
+    of card and return the modified inpt and the list of hidden strings.
+    ValueError is raised if the index ranges of the array cannot be read.
+    """
+    # numpy is needed only for inputs with fill arrays
+    from numjuggler.lattice import FillArray, find_array
+
+    r = find_array(inpt)
+    if r is None:
+        raise ValueError('Cannot read index ranges of the lattice fill array '
+                         'in the cell card on line {}'.format(card.pos))
+    a, b, n = r
+    pieces = []
+    hidden = []
+    for l in inpt[a:b].split('\n'):
+        p = l.strip()
+        if p:
+            i = l.index(p)
+            pieces.append(l[:i] + '`' + l[i + len(p):])
+            hidden.append(p)
+        else:
+            pieces.append(l)
+    card.fillarray = FillArray(hidden)
+    return inpt[:a] + '\n'.join(pieces) + inpt[b:], hidden
+
+
 def _split_surface(input_):
     """
     Similar to _split_cell(), but for surface cards.
@@ -1222,9 +1319,22 @@ def get_cards_from_input(inp, debug=None, preservetabs=False):
 
     inp -- is the filename.
     """
+    for card, ct, ln in get_raw_cards(inp, preservetabs=preservetabs):
+        yield Card(card, ct, ln, debug)
+
+
+def get_raw_cards(inp, preservetabs=False):
+    """
+    Iterable, return tuples (lines, ctype, pos) representing cards in the
+    input file.
+
+    Input file is split into cards exactly as in get_cards_from_input(), but
+    instances of the Card() class are not created. This is used where only
+    the card's text is needed.
+    """
 
     def _yield(card, ct, ln):
-        return Card(card, ct, ln, debug)
+        return card, ct, ln
 
     def replace_tab(l, cln, preserve=False, ts=8):
         """
@@ -1371,6 +1481,48 @@ def get_blocks(cards):
     return d
 
 
+def get_block(inp, cid, debug=None, preservetabs=False):
+    """
+    Iterable, return cards of the block cid from the input file inp.
+
+    Unlike get_blocks(), the input file is read lazily and reading stops as
+    soon as the block is over, i.e. only the part of the input file up to the
+    end of the block is read, and only one card is kept in memory. Comment
+    cards preceding the 1-st card of the block belong to the block, as in
+    get_blocks().
+    """
+    cards = get_cards_from_input(inp, debug=debug, preservetabs=preservetabs)
+    cbt = None  # current block type
+    cbc = []    # comments preceding the 1-st card of the current block
+    try:
+        for c in cards:
+            if c.ctype == CID.blankline:
+                if cbt == cid:
+                    break
+                cbt = None
+                cbc = []
+            elif c.ctype == CID.title:
+                if cid == CID.title:
+                    yield c
+                    break
+            elif cbt is None and c.ctype > 0:
+                cbt = c.ctype
+                if cbt > cid:
+                    # the block is absent in the input
+                    break
+                if cbt == cid:
+                    for cc in cbc:
+                        yield cc
+                    yield c
+                cbc = []
+            elif cbt is None:
+                cbc.append(c)
+            elif cbt == cid:
+                yield c
+    finally:
+        cards.close()
+
+
 def are_close_vals(x, y, re=1e-6, ra=0.):
     """
     Return True if x and y are closer then re or ra.
@@ -0,0 +1,398 @@
+"""
+Reverse-reference index of an MCNP model.
+
+The index is built in one pass over the cards. For each cell, surface,
+material, transformation and universe it lists the cards (cells, surfaces,
+tallies or other data cards) that refer to it, and for each card -- the
+entities it uses. The index answers questions like "which cells use surface
+5" or "which materials are not used in any cell" without reading the cards
+again.
+
+Besides the numbers found by the scanner, references given by the TRCL
+parameter of cell cards, materials given by the MAT parameter of like-but
+cells and references from data cards are indexed: materials of FMn cards,
+surfaces of FSn, SFn and SSW cards, surfaces, cells and transformations of
+the SDEF card and the transformation of FMESH cards. Data cards that are not
+known to be free of references, e.g. source distributions or cell parameters
+given in the data block, refer to all surfaces, materials and
+transformations with numbers appearing in them.
+"""
+
+from __future__ import print_function
+
+import csv
+import json
+import re
+
+from numjuggler import parser as mp
+from numjuggler import scanner
+
+# Types of indexed entities
+ref_types = ('cel', 'sur', 'mat', 'tr', 'u')
+
+# Names of entity types, for reports
+type_names = {'cel': 'cells', 'sur': 'surfaces', 'mat': 'materials',
+              'tr': 'transformations', 'u': 'universes'}
+
+# Data card types defining entities
+def_dtypes = {'Mn': 'mat', 'TRn': 'tr'}
+
+# Names of data cards, without numbers and particle designators, that do not
+# refer to surfaces, materials or transformations. Data cards of types
+# defined by Card.get_values() are not listed.
+no_refs = set(('mode', 'nps', 'ctme', 'prdmp', 'print', 'talnp', 'imp',
+               'vol', 'area', 'pwt', 'ext', 'vect', 'fcl', 'cut', 'phys',
+               'tmp', 'thtme', 'e', 't', 'c', 'fc', 'fq', 'fu', 'ft', 'de',
+               'df', 'em', 'tm', 'cm', 'sd', 'tf', 'dd', 'pd', 'cf', 'dbcn',
+               'lost', 'rand', 'nonu', 'kcode', 'ksrc', 'kopts', 'void',
+               'elpt', 'esplt', 'tsplt', 'wwe', 'wwt', 'wwn', 'wwp', 'wwg',
+               'wwge', 'wwgt', 'mesh', 'files', 'idum', 'rdum', 'histp',
+               'act', 'lca', 'lcb', 'lcc', 'lea', 'leb', 'mgopt', 'nlev',
+               'notrn', 'ptrac', 'mplot', 'spdtl', 'dxt', 'dxc', 'bbrem',
+               'fmult', 'stop'))
+
+# Keywords of SDEF and FMESH cards referring to entities, and their types
+ref_keywords = {'sur': 'sur', 'cel': 'cel', 'ccc': 'cel', 'tr': 'tr'}
+
+# Integer entries, with the optional sign and parentheses
+re_entry = re.compile(r'^[(]*[-+]?(\d+)[)]*$')
+
+# TRCL parameter given by the transformation number
+re_trcl = re.compile(r'(?<![a-z])\*?trcl\s*=?\s*(\d+)(?![\d.])', re.I)
+
+# MAT parameter of like-but cells
+re_mat = re.compile(r'(?<![a-z])mat\s*=?\s*(\d+)(?![\d.])', re.I)
+
+# keyword = value, with optional spaces around `=`
+re_kw = re.compile(r'([a-z]+)\s*=\s*(\S+)', re.I)
+
+
+class RefIndex(object):
+    """
+    Index of references between cards.
+
+    Attributes:
+
+        names -- dictionary t -> list of names of type t defined in the input,
+                 in order of their appearance. Universes are defined by the u
+                 parameter of cell cards.
+        refs -- dictionary t -> dictionary n -> list of referrers (rt, rn),
+                where rt is 'cel', 'sur', 'tal' or 'dat', rn is the referrer's
+                name. Data cards other than tallies, rt = 'dat', are named by
+                their first entry in lower case, e.g. 'sdef' or 'fm4'.
+        uses -- dictionary (rt, rn) -> list of (t, n) used by the referrer.
+
+    Material 0 and universe 0 are not indexed. A lattice filled with its own
+    universe does not refer to it.
+    """
+    def __init__(self):
+        self.names = dict((t, []) for t in ref_types + ('tal', 'dat'))
+        self.refs = dict((t, {}) for t in ref_types)
+        self.uses = {}
+
+        # Sets of defined names, by type
+        self.__defined = dict((t, set()) for t in self.names)
+        return
+
+    def __define(self, t, n):
+        if t != 'u' or n not in self.__defined[t]:
+            self.names[t].append(n)
+        self.__defined[t].add(n)
+
+    def add(self, ctype, dtype, vals, refs=()):
+        """
+        Add card given by its type ctype, data card type dtype and list of
+        values (v, t), as returned by scanner.scan_card() or as in
+        Card.values. refs is the list of additional references (v, t) of the
+        card, as returned by card_refs().
+        """
+        if ctype == mp.CID.data and dtype not in ('Mn', 'TRn', 'Fn', 'fmesh'):
+            # other data cards are named by their first entry
+            if refs:
+                self.add_refs('dat', refs[0][0], refs[1:])
+            return
+        if not vals:
+            return
+        n = vals[0][0]
+        u = 0
+        if ctype == mp.CID.cell:
+            rt = 'cel'
+            for v, tt in vals[1:]:
+                if tt == 'u':
+                    u = v
+            if u != 0:
+                self.__define('u', u)
+        elif ctype == mp.CID.surface:
+            rt = 'sur'
+        elif dtype in def_dtypes:
+            self.__define(def_dtypes[dtype], n)
+            return
+        elif dtype in ('Fn', 'fmesh'):
+            rt = 'tal'
+        else:
+            return
+        self.add_refs(rt, n, vals[1:] + list(refs), u)
+
+    def add_refs(self, rt, n, vals, u=0):
+        """
+        Add referrer n of type rt and the list of values (v, t) it uses. u is
+        the universe of the cell, a fill with it is not a reference.
+        """
+        self.__define(rt, n)
+
+        used = []
+        for v, tt in vals:
+            if tt == 'fill':
+                tt = 'u'
+                if v == u:
+                    continue
+            elif tt == 'u' and rt == 'cel':
+                # universe of the cell, not a reference
+                continue
+            if tt not in self.refs or (v == 0 and tt in ('mat', 'u')):
+                continue
+            used.append((tt, v))
+            self.refs[tt].setdefault(v, []).append((rt, n))
+        self.uses[(rt, n)] = used
+        return
+
+    def referrers(self, t, n, rt=None):
+        """
+        Return list of referrers of the entity n of type t. If rt is given,
+        return sorted list of names of the referrers of type rt.
+        """
+        rl = self.refs[t].get(n, [])
+        if rt is None:
+            return list(rl)
+        return sorted(set(rn for rrt, rn in rl if rrt == rt))
+
+    def used(self, rt, rn, t=None):
+        """
+        Return list of entities (t, n) used by the card rn of type rt. If t is
+        given, return list of names of type t only.
+        """
+        ul = self.uses.get((rt, rn), [])
+        if t is None:
+            return list(ul)
+        return [v for tt, v in ul if tt == t]
+
+    def unused(self, t):
+        """
+        Return sorted list of names of type t that are defined, but not
+        referred to.
+        """
+        return sorted(n for n in self.__defined[t] if n not in self.refs[t])
+
+    def undefined(self, t):
+        """
+        Return sorted list of names of type t that are referred to, but not
+        defined.
+        """
+        return sorted(set(self.refs[t]) - self.__defined[t])
+
+    def live(self, roots=('cel', 'tal', 'dat')):
+        """
+        Return dictionary t -> set of names of type t that are reachable from
+        cards of types roots, i.e. used by these cards directly or through
+        other cards. E.g. a transformation used by a surface of a live cell is
+        live.
+        """
+        res = dict((t, set()) for t in ref_types)
+        stack = []
+        for rt in roots:
+            for n in self.names[rt]:
+                if rt in res:
+                    res[rt].add(n)
+                stack.append((rt, n))
+        while stack:
+            for t, n in self.uses.get(stack.pop(), []):
+                if n not in res[t]:
+                    res[t].add(n)
+                    stack.append((t, n))
+        return res
+
+    def rows(self, types=ref_types):
+        """
+        Iterable over rows (t, n, defined, rt, referrers) for all entities of
+        types, where referrers is a sorted list of names of referrers of type
+        rt. Entities without referrers give one row with empty rt.
+        """
+        for t in types:
+            defined = self.__defined[t]
+            for n in sorted(defined | set(self.refs[t])):
+                rts = sorted(set(rt for rt, rn in self.refs[t].get(n, [])))
+                if not rts:
+                    yield t, n, n in defined, '', []
+                for rt in rts:
+                    yield t, n, n in defined, rt, self.referrers(t, n, rt)
+
+    def to_dict(self, types=ref_types):
+        """
+        Return dictionary with the index, suitable for JSON export.
+        """
+        res = {}
+        for t, n, d, rt, rl in self.rows(types):
+            e = res.setdefault(t, {}).setdefault(str(n), {'defined': d})
+            if rt:
+                e[rt] = rl
+        res['unused'] = dict((t, self.unused(t)) for t in types)
+        res['undefined'] = dict((t, self.undefined(t)) for t in types)
+        return res
+
+    def write(self, fname, types=ref_types):
+        """
+        Write the index to file fname. If fname ends with .csv, one row per
+        entity and referrer type is written, otherwise JSON is written.
+        """
+        if fname.lower().endswith('.csv'):
+            with open(fname, 'w') as f:
+                w = csv.writer(f, lineterminator='\n')
+                w.writerow(('type', 'name', 'defined', 'referrer', 'names'))
+                for t, n, d, rt, rl in self.rows(types):
+                    w.writerow((t, n, int(d), rt, ' '.join(map(str, rl))))
+        else:
+            with open(fname, 'w') as f:
+                json.dump(self.to_dict(types), f, indent=1, sort_keys=True)
+
+
+def _sdef_refs(t):
+    res = []
+    for k, v in re_kw.findall(' '.join(t)):
+        k = k.lower()
+        m = re_entry.match(v)
+        if k in ref_keywords and m:
+            res.append((int(m.group(1)), ref_keywords[k]))
+    return res
+
+
+def _fm_refs(t):
+    """
+    Materials of the FMn card: the second entry of each multiplier set.
+    """
+    inpt = ' '.join(t)
+    if '(' in inpt:
+        # sets in parentheses. Reaction lists can be in nested parentheses.
+        sets = []
+        depth = 0
+        for e in re.split(r'([()])', inpt):
+            if e == '(':
+                if depth == 0:
+                    sets.append('')
+                depth += 1
+            elif e == ')':
+                depth -= 1
+            elif depth > 0:
+                sets[-1] += ' ' + e.replace('(', ' ').replace(')', ' ')
+    else:
+        sets = [inpt]
+    res = []
+    for st in sets:
+        st = st.split()
+        if len(st) > 1:
+            m = re_entry.match(st[1])
+            if m and int(m.group(1)) != 0:
+                res.append((int(m.group(1)), 'mat'))
+    return res
+
+
+def _ssw_refs(t):
+    """
+    Surfaces of the SSW card, and cells given in parentheses after them.
+    """
+    res = []
+    depth = 0
+    for e in ' '.join(t).replace('(', ' ( ').replace(')', ' ) ').split():
+        if e == '(':
+            depth += 1
+        elif e == ')':
+            depth -= 1
+        else:
+            m = re_entry.match(e)
+            if m is None:
+                # keywords follow
+                break
+            res.append((int(m.group(1)), 'cel' if depth else 'sur'))
+    return res
+
+
+def card_refs(ctype, dtype, inpt):
+    """
+    Return list of references (v, t) of the card, given by its meaningful
+    part inpt, that are not listed in the values returned by the scanner or
+    by Card.get_values().
+
+    For cell cards, this is the transformation given by the TRCL parameter
+    and, for like-but cells, the material given by the MAT parameter.
+    For FMESH cards -- the transformation given by the tr keyword. For other
+    data cards, except Mn, TRn, tally and related cards, the first tuple is
+    (name, 'dat'), where name is the card name, followed by the references.
+    If the card is not known, all integer entries are considered as
+    references to surfaces, materials and transformations.
+    """
+    if ctype == mp.CID.cell:
+        res = [(int(v), 'tr') for v in re_trcl.findall(inpt)]
+        t = inpt.split(None, 2)
+        if len(t) > 2 and t[1].lower() == 'like':
+            res.extend((int(v), 'mat') for v in re_mat.findall(t[2]))
+        return res
+    if ctype != mp.CID.data or not inpt.strip():
+        return []
+    t = inpt.split()
+    name = t.pop(0).lower()
+    if dtype == 'fmesh':
+        return [(v, tt) for v, tt in _sdef_refs(t) if tt == 'tr']
+    elif dtype is not None:
+        return []
+    k = re.match('[a-z]*', name.lstrip('*')).group()
+    if k in no_refs:
+        return []
+    elif k == 'sdef':
+        res = _sdef_refs(t)
+    elif k == 'fm':
+        res = _fm_refs(t)
+    elif k in ('fs', 'sf'):
+        res = [(int(m.group(1)), 'sur') for m in map(re_entry.match, t) if m]
+    elif k == 'ssw':
+        res = _ssw_refs(t)
+    else:
+        res = []
+        for m in map(re_entry.match, t):
+            if m:
+                v = int(m.group(1))
+                res.extend([(v, 'sur'), (v, 'mat'), (v, 'tr')])
+    if res:
+        return [(name, 'dat')] + res
+    return []
+
+
+def from_cards(cards):
+    """
+    Return RefIndex for the list of cards. Method get_values() must be called
+    for all cards before.
+    """
+    ri = RefIndex()
+    for c in cards:
+        vals = c.values
+        fa = getattr(c, 'fillarray', None)
+        if fa is not None:
+            vals = vals + [(v, 'fill') for v in fa.u.tolist()]
+            vals = vals + [(v, 'tr') for v in fa.transformations()]
+        refs = []
+        if c.ctype in (mp.CID.cell, mp.CID.data):
+            refs = card_refs(c.ctype, c.dtype, c.card(comment=False))
+        ri.add(c.ctype, c.dtype, vals, refs)
+    return ri
+
+
+def get_index(inp, preservetabs=False):
+    """
+    Return RefIndex for the input file inp, read with the scanner.
+    """
+    ri = RefIndex()
+    for lines, ctype, pos in mp.get_raw_cards(inp, preservetabs=preservetabs):
+        dtype, vals = scanner.scan_card(lines, ctype)
+        refs = []
+        if ctype in (mp.CID.cell, mp.CID.data):
+            refs = card_refs(ctype, dtype, scanner._meaningful(lines))
+        ri.add(ctype, dtype, vals, refs)
+    return ri
@@ -11,46 +11,49 @@ from __future__ import print_function
 
 def shorten(list_, rmin=2, imin=2):
     """
-    Generator of list elements that uses 'Nr' and 'Ni' notation where
+    Return list of list elements that uses 'Nr' and 'Ni' notation where
     applicable.
-    """
 
+    The list is traversed once, series are detected by comparing the
+    difference of neighbour elements with the previous difference.
+    """
+    res = []
     if len(list_) < 2:
-        for e in list_:
-            yield e
-    else:
-        def _yield():
-            if dp == 0:
-                # R-series stops here. x does not belong to it.
-                if n > rmin:
-                    yield str(n) + 'r'
-                else:
-                    for i in range(n):
-                        yield xp
-            else:
-                # I-series stops here. x does not belong to it.
-                if n > imin:
-                    yield str(n-1) + 'i'
-                else:
-                    for i in range(n-1, 0, -1):
-                        yield xp - dp*i
-                yield xp
-        xp = list_[0]
-        dp = list_[1] - xp  # ensure that 1st two elements compose a series.
-        n = 0
-        yield xp
-        for x in list_[1:]:
+        res.extend(list_)
+        return res
+
+    append = res.append
+    xp = list_[0]
+    dp = list_[1] - xp  # ensure that 1st two elements compose a series.
+    n = 0
+    append(xp)
+    for i in range(1, len(list_) + 1):
+        if i < len(list_):
+            x = list_[i]
             d = x - xp
             if d == dp:
                 n += 1
+                xp = x
+                continue
+        # Series of n elements ending with xp stops here. x does not belong
+        # to it.
+        if dp == 0:
+            if n > rmin:
+                append(str(n) + 'r')
+            else:
+                res.extend([xp] * n)
+        else:
+            if n > imin:
+                append(str(n-1) + 'i')
             else:
-                for y in _yield():
-                    yield y
-                n = 1
+                for k in range(n-1, 0, -1):
+                    append(xp - dp*k)
+            append(xp)
+        if i < len(list_):
+            n = 1
             xp = x
             dp = d
-        for y in _yield():
-            yield y
+    return res
 
 
 def expand(list_):
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fast scanner of numbers used in an MCNP input file.
+
+In contrast to Card.get_values(), the scanner does not construct card
+templates and does not hide parts of the cards, it only extracts names and
+referenced numbers (cells, surfaces, materials, transformations, universes
+and tallies) from the meaningful parts of the cards. The numbers are
+classified by type in the same way as by the parser, so the results can be
+used instead of the fully parsed cards wherever only numbers are needed:
+in the info mode, for computation of offsets and for collision checks.
+"""
+
+from __future__ import print_function
+
+from numjuggler import parser as mp
+
+# Types of numbers that are names of cards, by card type. Universe names are
+# given by the "u" parameter of cell cards.
+name_types = {mp.CID.cell: 'cel', mp.CID.surface: 'sur'}
+
+
+def _meaningful(lines):
+    """
+    Return meaningful part of the card given by its lines, i.e. without
+    comment lines and without comments after `$` or `&`.
+    """
+    res = []
+    for l in lines:
+        if not mp.is_commented(l):
+            res.append(l[:mp.index_(l, '$&')])
+    return '\n'.join(res)
+
+
+def _int_or_none(s):
+    try:
+        return int(s)
+    except ValueError:
+        return None
+
+
+def _scan_cell(inpt):
+    vals = []
+    t = inpt.replace('=', ' ').split()
+    vals.append((int(t.pop(0)), 'cel'))
+    if t[0].lower() == 'like':
+        # like-but syntax: reference cell, and parameters after "but"
+        vals.append((int(t[1]), 'cel'))
+        parm = t[3:]
+    else:
+        m = int(t.pop(0))
+        vals.append((m, 'mat'))
+        if m != 0:
+            t.pop(0)  # density
+        geom = []
+        parm = []
+        while t:
+            e = t.pop(0)
+            if e[0].isalpha() or e[0] == '*':
+                parm = [e] + t
+                break
+            else:
+                geom.append(e)
+        for s in mp.re_int.findall(' '.join(geom)):
+            tpe = 'cel' if s[0] == '#' else 'sur'
+            s = s if s[0].isdigit() else s[1:]
+            vals.append((int(s), tpe))
+
+    while parm:
+        s = parm.pop(0).lower()
+        if s == 'u' and parm:
+            v = _int_or_none(parm.pop(0))
+            if v is not None:
+                vals.append((v, 'u'))
+        elif 'fill' in s and parm:
+            vs = parm.pop(0)
+            if '(' in vs:
+                i = vs.index('(')
+                parm.insert(0, vs[i:])
+                vs = vs[:i]
+            v = _int_or_none(vs)
+            if v is None:
+                if ':' in vs:
+                    # fill followed by a lattice array
+                    vals.extend(_scan_fill_array(vs, parm))
+                continue
+            vals.append((v, 'fill'))
+            if parm and '(' in parm[0]:
+                # transformation number or parameters in parentheses
+                vals.extend(_scan_tr(parm))
+    return None, vals
+
+
+def _scan_fill_array(vs, parm):
+    """
+    Return list of (v, t) tuples for universes in the lattice fill array and
+    for transformation numbers of its elements. vs is the first index range,
+    parm -- list of the following entries, the array entries are removed from
+    it.
+    """
+    ranges = [vs] + parm[:2]
+    del parm[:2]
+    n = 1
+    for r in ranges:
+        i1, i2 = r.split(':')
+        n *= int(i2) - int(i1) + 1
+    res = []
+    nu = 0  # number of elements
+    while parm and (nu < n or parm[0][0] == '('):
+        e = parm[0]
+        if e[0] == '(':
+            # transformation of the previous element
+            res.extend(_scan_tr(parm))
+            continue
+        if '(' in e:
+            i = e.index('(')
+            parm[0] = e[i:]
+            e = e[:i]
+        else:
+            parm.pop(0)
+        if e[-1].lower() == 'r' and e[:-1].isdigit() and nu:
+            # repetition of the previous element
+            k = int(e[:-1])
+            res.extend([(v, 'fill')] * k)
+            nu += k
+            continue
+        v = _int_or_none(e)
+        if v is None:
+            # next keyword
+            parm.insert(0, e)
+            break
+        res.append((v, 'fill'))
+        nu += 1
+    return res
+
+
+def _scan_tr(parm):
+    """
+    Remove transformation in parentheses from the beginning of parm. Return
+    [(tr, 'tr')] if it is given by number, otherwise an empty list.
+    """
+    parm[0] = parm[0].replace('(', '', 1)
+    tpl = []
+    while parm:
+        vs = parm.pop(0)
+        if ')' in vs:
+            vs = vs.replace(')', '', 1)
+            if vs:
+                tpl.append(vs)
+            break
+        elif vs:
+            tpl.append(vs)
+    if len(tpl) == 1:
+        # only one entry in parentheses -- it is tr number
+        return [(int(tpl[0]), 'tr')]
+    return []
+
+
+def _scan_surface(inpt):
+    vals = []
+    t = inpt.split()
+    js = t.pop(0)
+    if not js[0].isdigit():
+        js = js[1:]
+    vals.append((int(js), 'sur'))
+    ns = t[0]
+    if ns[0].isdigit():
+        vals.append((int(ns), 'tr'))
+    elif ns[0] == '-':
+        vals.append((int(ns[1:]), 'sur'))
+    return None, vals
+
+
+def _scan_data(inpt):
+    vals = []
+    t0 = inpt.split(None, 1)[0]
+    k = t0.lower()
+    dtype = None
+    if 'tr' in k[:3]:
+        ns = mp._get_int(t0)
+        if ns:
+            dtype = 'TRn'
+            vals.append((int(ns), 'tr'))
+    elif k[0] == 'm' and 'mode' not in k and 'mesh' not in k:
+        ms = mp._get_int(t0)
+        if ms:
+            vals.append((int(ms), 'mat'))
+            if k[1].isdigit():
+                dtype = 'Mn'
+            elif k[1] == 't':
+                dtype = 'MTn'
+            elif k[1] == 'p':
+                dtype = 'MPNn'
+    elif k[0] == 'f' and k[1:2].isdigit():
+        dtype = 'Fn'
+        ns = mp._get_int(t0)
+        vals.append((int(ns), 'tal'))
+        nv = int(ns[-1])
+        if nv in [1, 2]:
+            typ = 'sur'
+        elif nv in [4, 6, 7, 8]:
+            typ = 'cel'
+        else:
+            typ = ''
+        if typ:
+            # Repetitions and lattice indices are not numbers to be scanned
+            inpt = mp.re_rpt.sub('!', inpt)
+            inpt = mp.re_ind.sub('|', inpt)
+            inpt = inpt.replace(ns, '_', 1)
+            hasu = 'u' in inpt.lower() and '=' in inpt.lower()
+            pe = 0  # end of previous number
+            for m in mp.re_int.finditer(inpt):
+                tpe = typ
+                if hasu:
+                    part = inpt[pe:m.start() + 1].replace(' ', '')
+                    if part[-2:].lower() == 'u=':
+                        tpe = 'u'
+                pe = m.end()
+                vals.append((int(m.group()[1:]), tpe))
+    elif k[:5] == 'fmesh' and k[5:6].isdigit():
+        dtype = 'fmesh'
+        vals.append((int(mp._get_int(t0)), 'tal'))
+    return dtype, vals
+
+
+def scan_card(lines, ctype):
+    """
+    Return tuple (dtype, values) for the card given by its lines and type.
+
+    values is a list of (v, t) tuples, similar to Card.values, but only
+    integer entries are listed. dtype is the data card type, as defined by
+    Card.get_values(), for other cards it is None.
+    """
+    if ctype not in (mp.CID.cell, mp.CID.surface, mp.CID.data):
+        return None, []
+    inpt = _meaningful(lines)
+    if not inpt.strip():
+        return None, []
+    if ctype == mp.CID.cell:
+        return _scan_cell(inpt)
+    elif ctype == mp.CID.surface:
+        return _scan_surface(inpt)
+    else:
+        return _scan_data(inpt)
+
+
+def scan(inp, preservetabs=False):
+    """
+    Iterable, return tuples (ctype, dtype, values) for all cards in the input
+    file inp. See scan_card() for meaning of dtype and values.
+    """
+    for lines, ctype, pos in mp.get_raw_cards(inp, preservetabs=preservetabs):
+        dtype, vals = scan_card(lines, ctype)
+        yield ctype, dtype, vals
+
+
+def get_numbers(inp, preservetabs=False):
+    """
+    Return dictionary with keys -- number types and values -- list of numbers
+    used in the input file, as numbering.get_numbers() does for parsed cards.
+    """
+    r = {}
+    for ctype, dtype, vals in scan(inp, preservetabs):
+        for v, t in vals:
+            if t not in r:
+                r[t] = []
+            r[t].append(v)
+    return r
+
+
+def get_names(inp, preservetabs=False):
+    """
+    Return dictionary with keys -- number types and values -- list of names
+    defined in the input file, in order of their appearance.
+
+    Names are numbers of cell and surface cards, numbers of Mn, TRn and tally
+    cards, and universe numbers given in cell cards. Unlike get_numbers(),
+    references, e.g. surfaces used in cell cards, are not listed.
+    """
+    r = {}
+    for ctype, dtype, vals in scan(inp, preservetabs):
+        if not vals:
+            continue
+        t = None
+        if ctype in name_types:
+            t = name_types[ctype]
+        elif dtype in ('Mn', 'TRn', 'Fn', 'fmesh'):
+            t = vals[0][1]
+        if t is not None:
+            r.setdefault(t, []).append(vals[0][0])
+        if ctype == mp.CID.cell:
+            for v, tt in vals:
+                if tt == 'u':
+                    r.setdefault('u', []).append(v)
+    return r
@@ -1,5 +1,9 @@
 import re
+import warnings
+import multiprocessing
+from functools import partial
 from numjuggler import numbering as mn
+from numjuggler import geometry
 from numjuggler import parser as mp
 
 
@@ -398,108 +402,317 @@ class cell_card_string():
 # function called by main.py
 ############################################################
 
-def remove_hash(cards,logfile=''):
-
-#########################################################################
-    def remove(card,cname):
-       """ remove complementary operator and subtitute by complementary cell """
-       celline=''.join(card.lines)
-       cardstr = cell_card_string(celline)
-       cardstr.get_stat()
-       if (not cardstr.hproc) or (cardstr.stat['hash'] == 0) :return   # no complementary operator or cannot be # cannot be removed
-
-       cell=cardstr.geom
-
-       # find all operators in the cell and
-       # substitute all complementary operators
-       # locate object in list to reverse iteration
-       hashgroup=[]
-       start = 0
-       hlist = []
-
-       lencel = len(cell.str)
-       while True:
-          ic   = cell.str.lower().find('c',start)
-          idol = cell.str.find('$',start)
-          if idol < 0 : idol = lencel
-          if ic   < 0 : ic   = lencel
-          end = min(idol, ic)
-          for m in (rehash.finditer(cell.str,start,end)):
-             hashgroup.append(m)
-          start = cell.str.find('\n',end)
-          if (end  == lencel) : break
-
-       for m in reversed(hashgroup):
-          start=m.start()
-          if m.group(1) == '(':                       # complementary cell defined as surface intersections
-             hcell,end=cell.get_hashcell(start)
-             hlist.append(('surf',hcell.str))
-             cellmod=cell.str[0:start] + complementary(hcell) + cell.str[end:]
-          else:
-             hcname=int(m.group(1))                  # complementary cell defined with other cell index
-             remove(cards[dcel[hcname]],hcname)      # remove complementary operator in new cell if necessary
-             hlist.append(('cell',hcname))
-             end=m.end()
-             celline=''.join(cards[dcel[hcname]].lines)
-             hcell=cell_card_string(celline).geom
-             cellmod=cell.str[0:start]+                                  \
-                 '\nC  Complementary cell %i start\n' %hcname  \
-                 + '      '+complementary(hcell) +                          \
-                 '\nC  Complementary cell %i end  \n' %hcname  \
-                 + cell.str[end:]
-
-          # complementary cell inserted  at the operator location
-          cardstr.geom.str = cellmod
-
-          cards[dcel[cname]].cstrg = True
-          cards[dcel[cname]].lines = cardstr.get_lines()
-       if wrtlog:
-          logtab.append((int(cname),hlist))
-       return
-#########################################################################
-
-    dcel={}
-    wrtlog = False
-    if logfile != '' :
-      wrtlog = True
-      logtab = []
-    for i,c in enumerate(cards):
-         if c.ctype == mp.CID.cell:
-              c.get_values()
-              dcel[c.name]=i
-    for c in cards:
-         if c.ctype == mp.CID.cell:
-              remove(c,c.name)
-
-    if wrtlog :
-       logtab.sort
-       flog = open(logfile,'w')
-       for cell in logtab:
-          flog.write(' Cell {:>9} :\n'.format(cell[0]))
-          cc = False
-          for h in cell[1]:
-             if (h[0] == 'surf'):
-                cc = True
-                flog.write('\n      Complementary cell definition :\n')
-                break
-          if cc:
-             for i,h in enumerate(cell[1]):
-                if (h[0] == 'surf'):
-                    flog.write(' {:>2}:   {}\n'.format(i+1,h[1]) )
-          cc = False
-          for h in cell[1]:
-             if (h[0] == 'cell'):
-                cc = True
-                flog.write('\n      Complementary cell number :\n')
-                break
-          if cc:
-             for i,h in enumerate(cell[1]):
-                if (h[0] == 'cell'):
-                    flog.write(' {:>2}:  {:>9}\n'.format(i+1,h[1]) )
-          flog.write('\n---------------------------------------------------\n')
-       flog.close()
-
-    return cards
+def remove_redundant_card(card,remopt='nochg'):
+   """ remove redundant parentheses in the cell card given as string.
+       Return tuple (lines, cell name, removedp) """
+   cardstr = cell_card_string(card)
+   cardstr.geom.remove_redundant(remopt=remopt)
+   return cardstr.get_lines(), cardstr.headstr.split()[0], cardstr.geom.removedp
+
+
+def simplify_card(card):
+   """ simplify geometry of the cell card given as string, see the geometry
+       module. Return tuple (lines, cell name, words, newwords), where words
+       is the number of words in the geometry and newwords -- in the
+       simplified geometry. Lines are changed only when the geometry is
+       changed, newwords is then a number. Otherwise newwords is None, or
+       'empty' or 'all' if the geometry is an empty set or the whole space.
+       Comments inside changed geometry are removed """
+   lines = card.splitlines(True)
+   cardstr = cell_card_string(card)
+   name = cardstr.headstr.split()[0]
+   geom = cardstr.geom.str
+   if geom.lstrip().lower().startswith('like'): return lines, name, None, None
+
+   cell = cline(geom)
+   cell.remove_comments()
+   try:
+      tl = geometry.tokens(re.sub(comments,' ',cell.str))
+      node = geometry.simplify(geometry.parse(' '.join(tl)))
+   except ValueError:
+      return lines, name, None, None
+   words = count_words(geom)
+   if node == geometry.FALSE : return lines, name, words, 'empty'
+   if node == geometry.TRUE  : return lines, name, words, 'all'
+   new = geometry.to_string(node)
+   if geometry.tokens(new) == tl : return lines, name, words, None
+
+   if not cardstr.parm.str.strip():
+      card = cardstr.headstr.rstrip() + ' ' + new + '\n'
+   elif geom.rstrip(' ').endswith('\n'):
+      card = cardstr.headstr.rstrip() + ' ' + new + '\n     ' + cardstr.parm.str.lstrip(' ')
+   else:
+      card = cardstr.headstr.rstrip() + ' ' + new + ' ' + cardstr.parm.str.lstrip(' ')
+   if not card.endswith('\n') : card += '\n'
+   return card.splitlines(True), name, words, count_words(new)
+
+
+def card_stat(card):
+   """ return tuple (cell name, statistics) for the cell card given as
+       string. See cell_card_string.get_stat() """
+   cardstr = cell_card_string(card)
+   return cardstr.headstr.split()[0], cardstr.get_stat()
+
+
+def map_cells(func,cards,jobs=1,pool=None,**kwargs):
+   """ return list of func(card, **kwargs) for all cell cards given as
+       strings, in the order of cards. If jobs > 1, cards are processed
+       by jobs worker processes. If pool is given, it is used instead of
+       a new pool of jobs processes """
+   if kwargs : func = partial(func,**kwargs)
+   if jobs <= 1 or len(cards) < 2 :
+      return list(map(func,cards))
+   if pool is not None :
+      return pool.map(func,cards,chunksize=max(1,len(cards)//(4*jobs)))
+   pool = multiprocessing.Pool(jobs)
+   try:
+      return pool.map(func,cards,chunksize=max(1,len(cards)//(4*jobs)))
+   finally:
+      pool.close()
+      pool.join()
+
+
+def find_hashes(cell):
+   """ return list of complementary operators (rehash matches) in the
+       geometry cell (cline object), operators in comments excluded """
+   hashgroup=[]
+   start = 0
+   lencel = len(cell.str)
+   while True:
+      ic   = cell.str.lower().find('c',start)
+      idol = cell.str.find('$',start)
+      if idol < 0 : idol = lencel
+      if ic   < 0 : ic   = lencel
+      end = min(idol, ic)
+      for m in (rehash.finditer(cell.str,start,end)):
+         hashgroup.append(m)
+      start = cell.str.find('\n',end)
+      if (end  == lencel) : break
+   return hashgroup
+
+
+def hash_refs(card):
+   """ return list of cells referred by #n operators in the cell card given
+       as string, in the order of their substitution. Return None if the
+       card has no complementary operator or it cannot be removed """
+   cardstr = cell_card_string(card)
+   cardstr.get_stat()
+   if (not cardstr.hproc) or (cardstr.stat['hash'] == 0) : return None
+   return [int(m.group(1)) for m in reversed(find_hashes(cardstr.geom))
+           if m.group(1) != '(']
+
+
+def count_words(geom):
+   """ return the number of words in the geometry string, comments
+       excluded """
+   cell = cline(geom)
+   cell.remove_comments()
+   return len(reword.findall(cell.str))
+
+
+def expand_hash(card,refs,budget=0):
+   """ remove complementary operators in the cell card given as string and
+       substitute them by complementary cells. refs is a dictionary
+       n -> card string of the cell n referred as #n, without complementary
+       operators; #n operators for cells not in refs are kept.
+
+       If budget > 0, a #n operator is kept also when the number of words in
+       the cell geometry would exceed budget after the substitution.
+
+       Return tuple (lines, hlist), where lines is None if the card is not
+       changed, and hlist is the list of operators: ('surf', definition),
+       ('cell', n, words) for substituted and ('kept', n, words) for kept
+       operators. words is None for cells not in refs """
+   cardstr = cell_card_string(card)
+   cell=cardstr.geom
+   hlist = []
+   changed = False
+   size = cardstr.get_stat()[0]
+
+   for m in reversed(find_hashes(cell)):
+      start=m.start()
+      if m.group(1) == '(':                       # complementary cell defined as surface intersections
+         hcell,end=cell.get_hashcell(start)
+         hlist.append(('surf',hcell.str))
+         cellmod=cell.str[0:start] + complementary(hcell) + cell.str[end:]
+      else:
+         hcname=int(m.group(1))                  # complementary cell defined with other cell index
+         if hcname not in refs:
+            hlist.append(('kept',hcname,None))
+            continue
+         hcomp=complementary(cell_card_string(refs[hcname]).geom)
+         words=count_words(hcomp)
+         if budget > 0 and size + words - 2 > budget:
+            hlist.append(('kept',hcname,words))
+            continue
+         size += words - 2
+         hlist.append(('cell',hcname,words))
+         end=m.end()
+         cellmod=cell.str[0:start]+                                  \
+             '\nC  Complementary cell %i start\n' %hcname  \
+             + '      '+hcomp +                          \
+             '\nC  Complementary cell %i end  \n' %hcname  \
+             + cell.str[end:]
+
+      # complementary cell inserted  at the operator location
+      cardstr.geom.str = cellmod
+      changed = True
+
+   if changed :
+      return cardstr.get_lines(), hlist
+   return None, hlist
+
+
+def _expand_item(item):
+   """ expand_hash for item = (card, refs, budget) """
+   return expand_hash(*item)
+
+
+def remove_hash(cards,logfile='',jobs=1,budget=0):
+   """ remove complementary operators in cell cards and substitute them by
+       complementary cells.
+
+       The dependency graph of #n references is built first. Cells are then
+       processed level by level: a cell is expanded when all cells it refers
+       to are expanded, cells of one level are independent and are processed
+       by jobs worker processes. Cells with cyclic references, and cells
+       referring to them, are not changed and are reported.
+
+       If budget > 0, complementary cells making the cell geometry longer
+       than budget words are not substituted, see expand_hash(). Cells
+       referring to cells with kept operators keep their operators too """
+
+   dcel={}
+   wrtlog = False
+   if logfile != '' :
+     wrtlog = True
+     logtab = []
+   for i,c in enumerate(cards):
+        if c.ctype == mp.CID.cell:
+             c.get_values()
+             dcel[c.name]=i
+   order = sorted(dcel, key=dcel.get)
+
+   pool = None
+   if jobs > 1 : pool = multiprocessing.Pool(jobs)
+   try:
+      # card strings, updated when the cell is expanded
+      text = dict((n, ''.join(cards[dcel[n]].lines)) for n in order)
+
+      # dependency graph: cells to be processed and their #n references
+      refs = {}
+      for n, r in zip(order, map_cells(hash_refs, [text[n] for n in order], jobs, pool)):
+         if r is not None : refs[n] = r
+      users = {}
+      pending = {}
+      for n in refs:
+         deps = set(h for h in refs[n] if h in refs)
+         pending[n] = len(deps)
+         for h in deps:
+            users.setdefault(h, []).append(n)
+
+      hlists = {}
+      kept = set()   # cells with kept #n operators
+      level = [n for n in order if n in refs and pending[n] == 0]
+      while level:
+         items = [(text[n], dict((h, text[h]) for h in refs[n] if h not in kept), budget)
+                  for n in level]
+         nxt = []
+         for n, (lines, hlist) in zip(level, map_cells(_expand_item, items, jobs, pool)):
+            hlists[n] = hlist
+            if [h for h in hlist if h[0] == 'kept'] : kept.add(n)
+            if lines is not None:
+               text[n] = ''.join(lines)
+               cards[dcel[n]].cstrg = True
+               cards[dcel[n]].lines = lines
+            for u in users.get(n, []):
+               pending[u] -= 1
+               if pending[u] == 0 : nxt.append(u)
+         level = sorted(nxt, key=dcel.get)
+   finally:
+      if pool is not None:
+         pool.close()
+         pool.join()
+
+   # cells left with pending references are in cycles or refer to cycles.
+   # Cells nobody in the rest refers to are dropped to keep cycles only
+   left = set(n for n in refs if n not in hlists)
+   cycles = set(left)
+   while True:
+      used = set(h for n in cycles for h in refs[n])
+      rest = cycles & used
+      if rest == cycles : break
+      cycles = rest
+   if left:
+      warnings.warn('Cyclic complement references in cells ' +
+                    ' '.join(map(str, sorted(cycles, key=dcel.get))) +
+                    '. {} cells are not changed'.format(len(left)))
+
+   if wrtlog :
+      # log in the order of depth-first substitution: referred cells first
+      for c in order:
+         stack = [(c, iter(refs.get(c, [])))] if c in hlists else []
+         while stack:
+            n, it = stack[-1]
+            for h in it:
+               if h in hlists:
+                  stack.append((h, iter(refs[h])))
+                  break
+            else:
+               stack.pop()
+               logtab.append((int(n),hlists.pop(n)))
+
+      flog = open(logfile,'w')
+      for cell in logtab:
+         flog.write(' Cell {:>9} :\n'.format(cell[0]))
+         cc = False
+         for h in cell[1]:
+            if (h[0] == 'surf'):
+               cc = True
+               flog.write('\n      Complementary cell definition :\n')
+               break
+         if cc:
+            for i,h in enumerate(cell[1]):
+               if (h[0] == 'surf'):
+                   flog.write(' {:>2}:   {}\n'.format(i+1,h[1]) )
+         cc = False
+         for h in cell[1]:
+            if (h[0] == 'cell'):
+               cc = True
+               flog.write('\n      Complementary cell number :\n')
+               break
+         if cc:
+            for i,h in enumerate(cell[1]):
+               if (h[0] == 'cell'):
+                   flog.write(' {:>2}:  {:>9}\n'.format(i+1,h[1]) )
+         cc = False
+         for h in cell[1]:
+            if (h[0] == 'kept'):
+               cc = True
+               flog.write('\n      Complementary cell kept, words :\n')
+               break
+         if cc:
+            for i,h in enumerate(cell[1]):
+               if (h[0] == 'kept'):
+                   flog.write(' {:>2}:  {:>9} {:>9}\n'.format(i+1,h[1],'-' if h[2] is None else h[2]) )
+         flog.write('\n---------------------------------------------------\n')
+      if left:
+         flog.write(' Cyclic complement references, cells not changed :\n')
+         for n in sorted(left, key=dcel.get):
+            flog.write(' {:>9}\n'.format(n))
+         flog.write('\n---------------------------------------------------\n')
+      if budget > 0:
+         # expensive substitutions, largest first
+         hsize = [(h[2], cell[0], h[1]) for cell in logtab for h in cell[1] if h[0] == 'cell']
+         hsize.sort(key=lambda x: -x[0])
+         flog.write(' Largest complementary cells, budget {} words :\n'.format(budget))
+         flog.write('      Cell         #n     words\n')
+         for w, c, h in hsize[:20]:
+            flog.write(' {:>9}  {:>9} {:>9}\n'.format(c,h,w))
+         flog.write('\n---------------------------------------------------\n')
+      flog.close()
+
+   return cards
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,335 @@
+"""
+Coordinate transformations of TR cards.
+
+All TR cards of an input are collected into one array with 12 columns: the
+displacement vector O and the three unit vectors of the auxiliary system
+x', y' and z', given in the main system, i.e. the rows of the rotation
+matrix as on the TR card in the cosine form. The array is normalized: angles
+of `*TR` cards are converted to cosines, missing rotation entries are
+computed (for cards with one vector x', the other two vectors are chosen as
+MCNP does, arbitrarily, but deterministically), and the displacement of
+cards with M = -1 is expressed in the main system. An affine transformation
+of the model, given as a 4x4 matrix, is then applied to all cards in one
+operation and the cards are written back in their original form.
+"""
+
+from __future__ import print_function
+
+try:
+    # try because numpy might be unavailable.
+    import numpy
+except ImportError:
+    print("Numpy package is required to transform TR cards but ")
+    print("cannot be found. Install it with ")
+    print("")
+    print(" > pip install numpy")
+    print("")
+    raise
+except:
+    raise
+
+# Identity rotation, as the last 9 entries of a TR card
+identity = (1., 0., 0., 0., 1., 0., 0., 0., 1.)
+
+# Supported number of entries on a TR card: displacement only, displacement
+# and one vector, displacement and two vectors, full matrix, full matrix and M.
+tr_lengths = (3, 6, 9, 12, 13)
+
+
+def zrotation(ag):
+    """
+    Return 4x4 matrix of rotation around the z axis by ag degrees.
+    """
+    ar = numpy.radians(ag)
+    c = numpy.cos(ar)
+    s = numpy.sin(ar)
+    return numpy.array([[c, -s, 0., 0.],
+                        [s, c, 0., 0.],
+                        [0., 0., 1., 0.],
+                        [0., 0., 0., 1.]])
+
+
+def translation(v):
+    """
+    Return 4x4 matrix of translation by vector v.
+    """
+    t = numpy.identity(4)
+    t[:3, 3] = v
+    return t
+
+
+class TRArray(object):
+    """
+    Set of TR cards.
+
+    Attributes:
+
+        a -- numpy array N x 12. Each row contains the displacement in the
+             main system and the unit vectors x', y' and z' in the main system
+        units -- list of units, '*' for cards with angles in degrees
+        lengths -- list of the number of entries on each card
+        m -- numpy array of M values
+    """
+    def __init__(self, trs, names=None):
+        """
+        trs is a list of tuples (unit, vals), where unit is '*' or '' and
+        vals is the list of TR card entries, without the card name. names is
+        the list of card numbers, used in error messages.
+        """
+        n = len(trs)
+        self.units = [u for u, v in trs]
+        self.lengths = [len(v) for u, v in trs]
+        for i, l in enumerate(self.lengths):
+            if l not in tr_lengths:
+                name = ' tr{}'.format(names[i]) if names else ''
+                raise ValueError('TR card{} with {} entries is not '
+                                 'supported'.format(name, l))
+        a = numpy.zeros((n, 13))
+        a[:, 3:12] = identity
+        a[:, 12] = 1.
+        for i, (u, v) in enumerate(trs):
+            a[i, :len(v)] = v
+        lengths = numpy.array(self.lengths, dtype=int)
+        deg = numpy.array([u == '*' for u in self.units], dtype=bool)
+        deg &= lengths > 3
+
+        # angles to cosines
+        rot = a[:, 3:12]
+        rot[deg] = numpy.cos(numpy.radians(rot[deg]))
+
+        # y' orthogonal to x', in the plane of x' and the main axis most
+        # orthogonal to it
+        one = lengths == 6
+        x = rot[one, 0:3]
+        e = numpy.identity(3)[numpy.abs(x).argmin(axis=1)]
+        y = e - x * (e * x).sum(axis=1)[:, None]
+        rot[one, 3:6] = y / numpy.sqrt((y * y).sum(axis=1))[:, None]
+
+        # z' from x' and y'
+        two = (lengths == 9) | one
+        rot[two, 6:9] = numpy.cross(rot[two, 0:3], rot[two, 3:6])
+
+        # displacement in the main system
+        self.m = a[:, 12].copy()
+        inv = self.m == -1
+        o = a[:, :3]
+        r = rot.reshape((n, 3, 3))
+        o[inv] = -numpy.einsum('nj,nji->ni', o[inv], r[inv])
+
+        self.a = a[:, :12]
+        return
+
+    def __len__(self):
+        return len(self.a)
+
+    def apply(self, t):
+        """
+        Apply affine transformation given by 4x4 matrix t to all cards.
+        """
+        n = len(self.a)
+        q = t[:3, :3]
+        o = self.a[:, :3].dot(q.T) + t[:3, 3]
+        r = self.a[:, 3:].reshape((n, 3, 3)).dot(q.T)
+        self.a = numpy.hstack((o, r.reshape((n, 9))))
+        return
+
+    def keys(self, digits=6):
+        """
+        Return list of hashable keys of the cards: tuples of 12 normalized
+        entries rounded to digits decimal places. Cards describing the same
+        transformation, e.g. with angles and with cosines, have equal keys.
+        """
+        a = numpy.round(self.a, digits) + 0.  # + 0. turns -0. to 0.
+        return [tuple(r) for r in a.tolist()]
+
+    def values(self):
+        """
+        Return list of lists of TR card entries, in the form of the original
+        cards. Cards with the displacement only get the rotation matrix.
+        """
+        n = len(self.a)
+        o = self.a[:, :3].copy()
+        r = self.a[:, 3:].reshape((n, 3, 3))
+        inv = self.m == -1
+        o[inv] = -numpy.einsum('nij,nj->ni', r[inv], o[inv])
+        rot = self.a[:, 3:].copy()
+        deg = numpy.array([u == '*' for u in self.units], dtype=bool)
+        rot[deg] = numpy.degrees(numpy.arccos(numpy.clip(rot[deg], -1, 1)))
+        rot[numpy.abs(rot) < 1e-12] = 0.
+        o[numpy.abs(o) < 1e-12] = 0.
+
+        res = []
+        for i, l in enumerate(self.lengths):
+            vals = o[i].tolist() + rot[i].tolist()
+            if l in (6, 9):
+                vals = vals[:l]
+            elif l == 13:
+                vals.append(self.m[i])
+            res.append(vals)
+        return res
+
+
+def fmt(v):
+    """
+    Return string representation of the TR card entry v.
+    """
+    s = '{:.12g}'.format(v)
+    return '0' if s == '-0' else s
+
+
+def read_affine(fname):
+    """
+    Return 4x4 matrix of affine transformation read from file fname. The
+    file contains 12 or 16 numbers: the first three rows of the matrix and,
+    optionally, the last row that must be 0 0 0 1. Text after `$` or `#` is
+    ignored. The 3x3 rotation part must be orthogonal with determinant 1.
+    """
+    vals = []
+    with open(fname) as f:
+        for l in f:
+            l = l.split('$')[0].split('#')[0]
+            vals.extend(map(float, l.split()))
+    if len(vals) not in (12, 16):
+        raise ValueError('Transformation matrix must have 12 or 16 '
+                         'entries, {} found'.format(len(vals)))
+    t = numpy.identity(4)
+    t[:len(vals) // 4] = numpy.array(vals).reshape((-1, 4))
+    if not numpy.allclose(t[3], (0, 0, 0, 1)):
+        raise ValueError('Last row of the matrix must be 0 0 0 1')
+    q = t[:3, :3]
+    if not (numpy.allclose(q.dot(q.T), numpy.identity(3), atol=1e-6) and
+            numpy.linalg.det(q) > 0):
+        raise ValueError('Rotation part of the matrix is not a rotation')
+    return t
+
+
+def tr_values(t):
+    """
+    Return list of 12 entries of the TR card representing the affine
+    transformation t.
+    """
+    tra = TRArray([('', [0., 0., 0.])])
+    tra.apply(t)
+    return tra.values()[0]
+
+
+# Surface types that can be transformed by changing their coefficients:
+# planes, spheres and cylinders parallel to an axis.
+axes = 'xyz'
+planes = ('px', 'py', 'pz', 'p')
+spheres = ('so', 's', 'sx', 'sy', 'sz')
+cylinders = ('cx', 'cy', 'cz', 'c/x', 'c/y', 'c/z')
+
+
+def _axis(v, tol=1e-9):
+    """
+    Return index of the axis parallel to vector v, or None.
+    """
+    a = numpy.abs(v)
+    k = int(a.argmax())
+    if (a - a[k] * (numpy.arange(3) == k) < tol * a[k]).all():
+        return k
+    return None
+
+
+def _zero(v, tol=1e-9):
+    return (numpy.abs(v) < tol).all()
+
+
+def bake(surfaces, t):
+    """
+    Apply affine transformation t to surfaces given as list of tuples
+    (stype, coefficients). Return list of new tuples (stype, coefficients),
+    or None for surfaces that cannot be transformed without TR card:
+    surfaces of other types, planes given by three points and cylinders
+    whose axis is not parallel to a coordinate axis after transformation.
+    Planes whose normal becomes opposite to a coordinate axis are written
+    as p planes, to keep their sense.
+    """
+    q = t[:3, :3]
+    tv = t[:3, 3]
+    res = [None] * len(surfaces)
+
+    # collect surfaces by kind: normal or axis vectors, points and
+    # constants
+    ind = dict((k, []) for k in ('p', 's', 'c'))
+    vec = dict((k, []) for k in ind)
+    pnt = dict((k, []) for k in ind)
+    for i, (st, cf) in enumerate(surfaces):
+        st = st.lower()
+        if st in planes[:3] and len(cf) == 1:
+            n = numpy.zeros(3)
+            n[axes.index(st[1])] = 1.
+            ind['p'].append(i)
+            vec['p'].append(n)
+            pnt['p'].append(cf[0])
+        elif st == 'p' and len(cf) == 4:
+            ind['p'].append(i)
+            vec['p'].append(cf[:3])
+            pnt['p'].append(cf[3])
+        elif st in spheres:
+            if st == 'so' and len(cf) == 1:
+                c = [0., 0., 0.]
+            elif st == 's' and len(cf) == 4:
+                c = cf[:3]
+            elif len(st) == 2 and st != 'so' and len(cf) == 2:
+                c = numpy.zeros(3)
+                c[axes.index(st[1])] = cf[0]
+            else:
+                continue
+            ind['s'].append(i)
+            vec['s'].append(c)
+            pnt['s'].append(cf[-1])
+        elif st in cylinders:
+            k = axes.index(st[-1])
+            n = numpy.zeros(3)
+            n[k] = 1.
+            c = numpy.zeros(3)
+            if st[1] == '/' and len(cf) == 3:
+                c[[j for j in range(3) if j != k]] = cf[:2]
+            elif len(cf) != 1:
+                continue
+            ind['c'].append(i)
+            vec['c'].append(numpy.concatenate((n, c)))
+            pnt['c'].append(cf[-1])
+
+    # transform all surfaces of one kind at once
+    if ind['p']:
+        n = numpy.array(vec['p'], dtype=float).dot(q.T)
+        d = numpy.array(pnt['p']) + n.dot(tv)
+        for i, nn, dd in zip(ind['p'], n, d):
+            k = _axis(nn)
+            if k is None or nn[k] < 0:
+                # px, py or pz with the opposite normal would change the
+                # sense of the surface
+                res[i] = ('p', list(nn) + [dd])
+            else:
+                res[i] = ('p' + axes[k], [dd / nn[k]])
+    if ind['s']:
+        c = numpy.array(vec['s'], dtype=float).dot(q.T) + tv
+        for i, cc, r in zip(ind['s'], c, pnt['s']):
+            if _zero(cc):
+                res[i] = ('so', [r])
+            else:
+                k = _axis(cc)
+                if k is None:
+                    res[i] = ('s', list(cc) + [r])
+                else:
+                    res[i] = ('s' + axes[k], [cc[k], r])
+    if ind['c']:
+        v = numpy.array(vec['c'], dtype=float)
+        n = v[:, :3].dot(q.T)
+        c = v[:, 3:].dot(q.T) + tv
+        for i, nn, cc, r in zip(ind['c'], n, c, pnt['c']):
+            k = _axis(nn)
+            if k is None:
+                continue
+            uv = [cc[j] for j in range(3) if j != k]
+            if _zero(numpy.array(uv)):
+                res[i] = ('c' + axes[k], [r])
+            else:
+                res[i] = ('c/' + axes[k], uv + [r])
+    for i, r in enumerate(res):
+        if r is not None:
+            res[i] = (r[0], [0. if abs(v) < 1e-12 else float(v) for v in r[1]])
+    return res
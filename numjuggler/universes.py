@@ -0,0 +1,225 @@
+"""
+Universe hierarchy of an MCNP model.
+
+The hierarchy is built once from the cell cards: for each universe its cells
+and for each cell universes it is filled with, including universes listed in
+lattice fill arrays. Queries like depth of a universe, its ancestors or all
+cells inside it are answered from this index without reading the cards
+again.
+"""
+
+from __future__ import print_function
+
+import json
+
+from numjuggler import parser as mp
+from numjuggler import scanner
+
+
+class UniverseTree(object):
+    """
+    Universe/fill hierarchy.
+
+    Attributes:
+
+        cells -- dictionary u -> list of cells in universe u, in order of
+                 their appearance in the input
+        fills -- dictionary cell -> list of universes the cell is filled with
+        parents -- dictionary u -> list of universes containing cells filled
+                 with u
+        children -- dictionary u -> list of universes filling cells of u
+
+    Universe 0 is the real world. Zero entries in lattice fill arrays and
+    lattice elements filled with the lattice's own universe are not
+    considered as fills.
+    """
+    def __init__(self):
+        self.cells = {0: []}
+        self.fills = {}
+        self.parents = {}
+        self.children = {}
+
+        # Universe of each cell
+        self.__cu = {}
+        # Cells of universe u filled with f, by (u, f)
+        self.__fc = {}
+        # Depth of universes, computed on demand
+        self.__depth = None
+        return
+
+    def add_cell(self, c, u=0, fills=()):
+        """
+        Add cell c belonging to universe u and filled with universes fills.
+        """
+        self.cells.setdefault(u, []).append(c)
+        self.__cu[c] = u
+        fl = []
+        seen = set([0, u])
+        for f in fills:
+            if f not in seen:
+                seen.add(f)
+                fl.append(f)
+        if fl:
+            self.fills[c] = fl
+            for f in fl:
+                if (u, f) not in self.__fc:
+                    self.__fc[(u, f)] = []
+                    self.parents.setdefault(f, []).append(u)
+                    self.children.setdefault(u, []).append(f)
+                self.__fc[(u, f)].append(c)
+        self.__depth = None
+        return
+
+    def universe_of(self, c):
+        """
+        Return universe the cell c belongs to.
+        """
+        return self.__cu[c]
+
+    def universes(self):
+        """
+        Return sorted list of all universes, defined or used in fills.
+        """
+        return sorted(set(self.cells.keys()) | set(self.parents.keys()))
+
+    def depth(self, u):
+        """
+        Return depth of universe u: 0 for the real world, 1 for universes
+        filling real-world cells, etc. If u is used at several levels, the
+        smallest depth is returned. For universes not reachable from the real
+        world, None is returned.
+        """
+        if self.__depth is None:
+            # breadth-first search from the real world
+            d = {0: 0}
+            level = [0]
+            while level:
+                nxt = []
+                for v in level:
+                    for f in self.children.get(v, []):
+                        if f not in d:
+                            d[f] = d[v] + 1
+                            nxt.append(f)
+                level = nxt
+            self.__depth = d
+        return self.__depth.get(u)
+
+    def ancestors(self, u):
+        """
+        Return set of universes containing universe u directly or through
+        other universes.
+        """
+        return self.__closure(u, self.parents)
+
+    def descendants(self, u):
+        """
+        Return set of universes inside universe u, directly or through other
+        universes.
+        """
+        return self.__closure(u, self.children)
+
+    @staticmethod
+    def __closure(u, links):
+        res = set()
+        stack = list(links.get(u, []))
+        while stack:
+            v = stack.pop()
+            if v not in res:
+                res.add(v)
+                stack.extend(links.get(v, []))
+        return res
+
+    def all_cells(self, u):
+        """
+        Return list of cells in universe u and in all universes inside it.
+        """
+        res = list(self.cells.get(u, []))
+        for v in sorted(self.descendants(u) - set([u])):
+            res.extend(self.cells.get(v, []))
+        return res
+
+    def unused(self):
+        """
+        Return sorted list of universes that have cells, but are not used to
+        fill any cell.
+        """
+        return sorted(u for u in self.cells
+                      if u != 0 and u not in self.parents)
+
+    def undefined(self):
+        """
+        Return sorted list of universes used in fills that have no cells.
+        """
+        return sorted(u for u in self.parents if u not in self.cells)
+
+    def tree(self, indent='    '):
+        """
+        Iterable over lines of the tree report.
+
+        Each universe is followed by the universes filling its cells, with
+        increased indentation. A universe used several times is expanded
+        only at its first occurrence, later occurrences are marked with
+        "(see above)".
+        """
+        shown = set()
+        stack = [(0, 0, None)]
+        while stack:
+            u, level, parent = stack.pop()
+            line = '{}u{} ({} cells)'.format(indent * level, u,
+                                            len(self.cells.get(u, [])))
+            if parent is not None:
+                cl = self.__fc[(parent, u)]
+                line += ' in cells ' + ' '.join(map(str, cl))
+            if u in shown:
+                yield line + ' (see above)'
+                continue
+            yield line
+            shown.add(u)
+            for f in reversed(self.children.get(u, [])):
+                stack.append((f, level + 1, u))
+
+    def to_dict(self):
+        """
+        Return dictionary with the hierarchy, suitable for JSON export.
+        """
+        ud = {}
+        for u in self.universes():
+            ud[str(u)] = {
+                'cells': self.cells.get(u, []),
+                'parents': self.parents.get(u, []),
+                'children': self.children.get(u, []),
+                'depth': self.depth(u),
+            }
+        fd = dict((str(c), fl) for c, fl in self.fills.items())
+        return {'universes': ud,
+                'fills': fd,
+                'unused': self.unused(),
+                'undefined': self.undefined()}
+
+    def write_json(self, fname):
+        """
+        Write hierarchy to JSON file fname.
+        """
+        with open(fname, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+
+
+def get_tree(inp, preservetabs=False):
+    """
+    Return UniverseTree for the input file inp, read with the scanner.
+    """
+    t = UniverseTree()
+    for ctype, dtype, vals in scanner.scan(inp, preservetabs):
+        if ctype == mp.CID.surface:
+            break
+        if ctype != mp.CID.cell or not vals:
+            continue
+        u = 0
+        fills = []
+        for v, tp in vals[1:]:
+            if tp == 'u':
+                u = v
+            elif tp == 'fill':
+                fills.append(v)
+        t.add_cell(vals[0][0], u, fills)
+    return t
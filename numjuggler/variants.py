@@ -0,0 +1,103 @@
+"""
+Input file variants that differ in parameters of a few cells.
+
+All variants are generated from one parsed model. The cards of the model are
+rendered once; for each variant only the affected cell cards are copied,
+modified and rendered again, and the result is spliced into the rendering
+of the unchanged cards.
+"""
+
+from __future__ import print_function
+
+import copy
+from multiprocessing.pool import ThreadPool
+
+
+def clone(card):
+    """
+    Return copy of the parsed card that can be modified without affecting
+    the original card.
+    """
+    c = copy.copy(card)
+    c.values = list(card.values)
+    c.input = list(card.input)
+    c.hidden = dict((k, list(v)) for k, v in card.hidden.items())
+    return c
+
+
+def set_params(card, params):
+    """
+    Set new parameters of the cell card.
+
+    params is a dictionary with keys 'd', 'imp:n', 'imp:p', 'imp:e' or 'fill'
+    and string values. Return list of keys that cannot be set, e.g. density
+    of a void cell, or fill of a cell without the fill keyword.
+    """
+    skipped = []
+    for k, v in params.items():
+        if k == 'd':
+            if card.get_m() > 0:
+                card.set_d(v)
+            else:
+                skipped.append(k)
+        elif k == 'fill':
+            if card.get_f() is not None:
+                card.get_f(newv=int(v))
+            else:
+                skipped.append(k)
+        else:
+            if k in card.get_imp():
+                card.get_imp({k[-1]: v})
+            else:
+                skipped.append(k)
+    return skipped
+
+
+def get_variant(cards, table, rules):
+    """
+    Return tuple (changed, skipped) for the variant defined by rules.
+
+    rules is a list of (t, ranges, params), as returned by
+    mapparsers.variants(). Cells are selected by table, a
+    celltable.CellTable instance. changed is a dictionary card index -> text
+    of the modified card, skipped is a list of (cell, key) for parameters
+    that cannot be set.
+    """
+    clones = {}
+    skipped = []
+    for t, ranges, params in rules:
+        for r in ranges:
+            for i in table.index[table.select(t, r)].tolist():
+                if i not in clones:
+                    clones[i] = clone(cards[i])
+                for k in set_params(clones[i], params):
+                    skipped.append((cards[i].name, k))
+    changed = dict((i, c.card()) for i, c in clones.items())
+    return changed, skipped
+
+
+def write_variants(prefix, cards, base, table, variants, jobs=None):
+    """
+    Write input files for all variants and return list of tuples (fname,
+    number of changed cards, skipped parameters), in order of variants.
+
+    base is the list of rendered cards. Variants is an OrderedDict, name ->
+    rules, as returned by mapparsers.variants(). Input file of variant name
+    is written to prefix.name. Files are written in parallel by jobs threads
+    (by default, one per processor).
+    """
+    def write(item):
+        name, rules = item
+        changed, skipped = get_variant(cards, table, rules)
+        fname = '{}.{}'.format(prefix, name)
+        with open(fname, 'w') as f:
+            for i, text in enumerate(base):
+                print(changed.get(i, text), end='', file=f)
+        return fname, len(changed), skipped
+
+    pool = ThreadPool(jobs)
+    try:
+        return pool.map(write, list(variants.items()))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+from collections import OrderedDict
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler import parser as mp
+from numjuggler import likefunc as lf
+
+numpy = pytest.importorskip('numpy')
+from numjuggler.celltable import CellTable
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.fixture
+def cards():
+    source = str(test_data_path / 'various_cards.mcnp')
+    res = list(mp.get_cards(source))
+    for c in res:
+        if c.ctype == mp.CID.cell:
+            c.get_values()
+    return res
+
+
+def test_columns(cards):
+    t = CellTable(cards)
+    assert t.name.tolist() == [1, 2, 3, 4, 5, 6]
+    assert t.mat.tolist() == [0, 1, -2, 0, 2, 0]
+    assert t.u.tolist() == [0, 2, 3, 0, 3, 0]
+    assert t.fill.tolist() == [2, 0, 0, 3, 0, 0]
+    assert t.imp['imp:n'].tolist() == [1, 1, 1, 1, 1, 0]
+    assert t.select('m', lf.Range(1, 2)).tolist() == [1, 4]
+
+
+def test_scale_densities(cards):
+    t = CellTable(cards)
+    rules = OrderedDict()
+    rules[('c', lf.Range(1, 5))] = (0.3, '{:.2f}')
+    rules[('m', lf.Range(2))] = (3.0, '{:.3f}')
+    default = {'c': (10.0, '{}')}
+    # Rounding is applied after each rule: 0.1*0.3 -> 0.03 -> 0.090
+    assert t.scale_densities(rules, default) == {1: '-2.34', 4: '0.090'}
+    rules = OrderedDict([(('c', lf.Range(5)), (0.5, '{}'))])
+    assert t.scale_densities(rules, default) == {1: '-78.0', 4: '0.05'}
+
+    base = [c.card() for c in cards]
+    text = ''.join(t.render_densities(cards, base, {4: '0.05'}))
+    assert '5 2 0.05 -4' in text
+    assert ''.join(base) == ''.join(c.card() for c in cards)
+
+
+def test_resolved(cards):
+    t = CellTable(cards)
+    assert t.like == {2: (2, None, None)}
+    mat, dens = t.resolved()
+    assert mat.tolist() == [0, 1, 1, 0, 2, 0]
+    assert dens.tolist() == [0, -7.8, -7.8, 0, 0.1, 0]
+
+    # chain of like-but cells, in any order, and unknown reference cell
+    cl = [mp.Card([l], mp.CID.cell, i) for i, l in enumerate([
+        '1 like 2 but rho=-3.0\n',
+        '2 like 3 but mat=2\n',
+        '3 1 -1.0 -1\n',
+        '4 like 9 but mat=5 rho=-2\n',
+        '5 like 3 but MAT 0\n'])]
+    for c in cl:
+        c.get_values()
+    mat, dens = CellTable(cl).resolved()
+    assert mat.tolist() == [2, 2, 1, -2, 0]
+    assert dens.tolist() == [-3., -1., -1., -100., 0.]
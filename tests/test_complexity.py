@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler import parser as mp
+from numjuggler import complexity as cx
+from numjuggler.main import main
+
+test_data_path = path_resolver('tests')('data')
+
+
+def test_cell_stats():
+    cs = cx.CellStats(1, 1, '(-1 2 : #(3 (4 : -5))) #7 1')
+    assert cs.surfaces == [1, 2, 3, 4, 5, 1]
+    assert cs.unique == 5
+    assert cs.hashcell == 1
+    assert cs.hashsurf == 1
+    assert cs.depth == 3
+    assert cs.unions == 2
+    assert cs.words == 17
+
+
+@pytest.mark.parametrize("inp", [
+    'simple_cubes.mcnp',
+    'various_cards.mcnp',
+])
+def test_surfaces(inp):
+    source = str(test_data_path / inp)
+    expected = {}
+    for c in mp.get_cards(source):
+        if c.ctype == mp.CID.cell:
+            c.get_values()
+            expected[c.name] = (c.pos, c.get_surfaces())
+    actual = dict((cs.name, (cs.pos, cs.surfaces))
+                  for cs in cx.get_stats(source))
+    assert expected == actual
+
+
+def test_histogram():
+    assert cx.histogram([0, 1, 2, 3, 4, 9]) == [
+        (0, 1, 1), (1, 2, 1), (2, 4, 2), (4, 8, 1), (8, 16, 1)]
+    assert cx.histogram([]) == []
+
+
+@pytest.mark.parametrize("inp", [
+    'simple_cubes.mcnp',
+    'various_cards.mcnp',
+])
+def test_minfo(capsys, inp):
+    source = str(test_data_path / inp)
+    stats = list(cx.get_stats(source))
+    main(['--mode', 'minfo', source])
+    out, err = capsys.readouterr()
+    d = dict(l.split(':') for l in out.splitlines()[:6])
+    assert int(d[' Total words            ']) == sum(cs.words for cs in stats)
+    assert int(d[' Hashcel                ']) == sum(cs.hashcell
+                                                    for cs in stats)
+    assert int(d[' Hashsurf               ']) == sum(cs.hashsurf
+                                                    for cs in stats)
+    assert int(d[' Words in longest cell  ']) == max(cs.words for cs in stats)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler import geometry as gm
+from numjuggler import string_cells as stc
+
+
+@pytest.mark.parametrize("geom,expected", [
+    ('1 1 -2', '1 -2'),
+    ('(1:1) 2', '1 2'),
+    ('1 (1:2)', '1'),
+    ('1 : 1 2', '1'),
+    ('(1 2):(2 1 3)', '1 2'),
+    ('(1:2) (2:1) 3', '(1:2) 3'),
+    ('((-1 +2)) (3 : (4 : -5))', '-1 2 (3:4:-5)'),
+    ('-1 #(1)', '-1'),
+    ('#(-1) 2 #5 #5', '1 2 #5'),
+    ('# (1 2) 3', '#(1 2) 3'),
+    ('-1.2 1.2 : 3', '3'),
+    ('1 -1', gm.FALSE),
+    ('2 : (1 : -1) 3', '2:3'),
+    ('2 : (1 : -1)', gm.TRUE),
+])
+def test_simplify(geom, expected):
+    res = gm.simplify(gm.parse(geom))
+    if isinstance(expected, str):
+        res = gm.to_string(res)
+    assert res == expected
+
+
+@pytest.mark.parametrize("geom", ['1 (2', '1 2)', '1 : : 2', '# ', '1 x'])
+def test_parse_errors(geom):
+    with pytest.raises(ValueError):
+        gm.parse(geom)
+
+
+def test_simplify_card():
+    card = ('6 3 -1 1 2 3 \n'
+            'C  Complementary cell 5 start\n'
+            '      (3: 4) 3\n'
+            'C  Complementary cell 5 end\n'
+            '     imp:n=1 $ comment\n')
+    lines, name, words, newwords = stc.simplify_card(card)
+    assert lines == ['6 3 -1 1 2 3\n', '     imp:n=1 $ comment\n']
+    assert (name, words, newwords) == ('6', 9, 3)
+    card = '7 0 -1 2 imp:n=1\n'
+    assert stc.simplify_card(card) == ([card], '7', 2, None)
+    card = '8 0 -1 1 imp:n=1\n'
+    assert stc.simplify_card(card) == ([card], '8', 2, 'empty')
+    card = '9 like 8 but imp:n=0\n'
+    assert stc.simplify_card(card) == ([card], '9', None, None)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler import parser as mp
+from numjuggler import numbering as mn
+from numjuggler import scanner
+
+lattice = pytest.importorskip('numjuggler.lattice')
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.fixture
+def cards():
+    source = str(test_data_path / 'lattice_array.mcnp')
+    cards = list(mp.get_cards(source))
+    for c in cards:
+        c.get_values()
+    return cards
+
+
+def test_fill_array():
+    fa = lattice.FillArray(['0:2 0:1 0:0 1 2R', '3 (1 0 0) 0 5'])
+    assert fa.ranges == [(0, 2), (0, 1), (0, 0)]
+    assert fa.u.tolist() == [1, 1, 1, 3, 0, 5]
+    assert fa.tr == {3: '(1 0 0)'}
+    assert fa.universes() == [1, 3, 5]
+    assert not fa.apply_map(lambda x: x)
+    assert fa.apply_map(lambda x: x + 10)
+    assert fa.u.tolist() == [11, 11, 11, 13, 0, 15]
+    assert fa.pieces() == ['0:2 0:1 0:0 11 11 11', '13 (1 0 0) 0 15']
+
+
+def test_find_array():
+    inpt = '2 0 -2 lat=1 fill=0:1 0:0 0:0 2 3 (1) u=1'
+    a, b, n = lattice.find_array(inpt)
+    assert n == 2
+    assert inpt[a:b] == '0:1 0:0 0:0 2 3 (1)'
+    assert lattice.find_array('1 0 -1 fill=2') is None
+
+
+def test_malformed_ranges():
+    # index ranges of a fill array must be given for 3 dimensions
+    c = mp.Card(['2 0 -2 lat=1 fill=0:1 2 3 u=1\n'], mp.CID.cell, 7)
+    with pytest.raises(ValueError) as e:
+        c.get_values()
+    assert 'line 7' in str(e.value)
+
+
+def test_numbers(cards):
+    source = str(test_data_path / 'lattice_array.mcnp')
+    expected = mn.get_numbers(cards)
+    actual = scanner.get_numbers(source)
+    for t in ('cel', 'sur', 'u', 'fill', 'tr'):
+        assert expected.get(t, []) == actual.get(t, []), t
+
+
+def test_renumber_array(cards):
+    c = cards[2]
+    assert c.get_fills() == [2, 3, 4]
+    c.apply_map({'u': lambda x: x + 10})
+    assert c.modified
+    assert c.card() == ('2 0 -2 lat=1 imp:n=1 fill=-2:2 -1:1 0:0\n'
+                        '        12 13 12 12 12\n'
+                        '        13 13 (1) 12 12 12\n'
+                        '        14 4r u=11\n')
+    c = cards[8]
+    c.apply_map({'u': lambda x: x})
+    assert not c.modified
+    assert c.card() == ''.join(c.lines)
@@ -52,3 +52,21 @@ def test_LikeFunction(
             with pytest.raises(ValueError):
                 like_function.write_log_as_map(k, actual)
     assert actual.getvalue() == expected_text
+
+
+@pytest.mark.parametrize("x, expected", [
+    (0, []),
+    (1, ['a']),
+    (5, ['a', 'b', 'c']),
+    (6, ['a', 'c']),
+    (10, ['a', 'c']),
+    (11, ['c']),
+    (21, []),
+])
+def test_RangeIndex(x, expected):
+    ri = lf.RangeIndex([
+        (lf.Range(1, 10), 'a'),
+        (lf.Range(5), 'b'),
+        (lf.Range(20, 5), 'c'),
+    ])
+    assert ri.get(x) == expected
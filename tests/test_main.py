@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, nested_scopes
 
+import os
+
 import pytest
 import six
 from numjuggler.utils.resource import path_resolver
@@ -48,3 +50,535 @@ def test_test_main(tmpdir, capsys, inp, command, expected):
     assert expected_numbers == actual_numbers, "Output of numjuggler is wrong"
 
 
+
+
+def test_mmerge_offset(tmpdir, capsys):
+    source = str(test_data_path / 'simple_cubes.mcnp')
+    with cd_temporarily(tmpdir):
+        main(['--mode', 'mmerge', '--offset', '-m', source, source])
+    out, err = capsys.readouterr()
+    actual_numbers = load_line_heading_numbers(out.split('\n'))
+    cells = list(range(1, 15))
+    surfaces = [1, 2, 3, 4, 5, 6, 7, 20, 21, 22, 23, 24, 25,
+                30, 31, 32, 33, 34, 35]
+    surfaces += [s + 35 for s in surfaces]
+    assert cells + surfaces == actual_numbers
+    assert 'm3 ' in out and 'm4 ' in out
+
+
+def test_plan(tmpdir, capsys):
+    source = str(test_data_path / 'various_cards.mcnp')
+    with cd_temporarily(tmpdir):
+        with open('map', 'w') as f:
+            f.write('c 1 -- 5: 100\ns: +1000\n')
+        main(['--mode', 'plan', '--map', 'map', source])
+    out, err = capsys.readouterr()
+    assert 'c 100 <- 1 3i 5' in out
+    assert 's 1001 -- 1007' in out
+    assert out.rstrip().endswith('total collisions 1')
+
+
+def test_compact_pinned(tmpdir, capsys):
+    source = str(test_data_path / 'simple_cubes.mcnp')
+    with cd_temporarily(tmpdir):
+        main(['--mode', 'compact', '-s', '20--25', source])
+    out, err = capsys.readouterr()
+    actual_numbers = load_line_heading_numbers(out.split('\n'))
+    cells = list(range(1, 8))
+    surfaces = list(range(1, 8)) + list(range(20, 26)) + list(range(8, 14))
+    assert cells + surfaces == actual_numbers
+
+
+def test_compact_inorder_universes(tmpdir, capsys):
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('compact\n'
+                    '1 0 -1 fill=30 imp:n=1\n'
+                    '2 0 -2 u=20 imp:n=1\n'
+                    '3 0 -3 u=30 fill=20 imp:n=1\n'
+                    '4 0 1 imp:n=0\n'
+                    '\n'
+                    '1 so 1\n'
+                    '2 so 2\n'
+                    '3 so 3\n'
+                    '\n')
+        main(['--mode', 'compact', '--inorder', 'inp'])
+    out, err = capsys.readouterr()
+    lines = [' '.join(l.split()) for l in out.splitlines()]
+    # fill=30 in cell 1 is the first appearance of universe 30
+    assert lines[1:4] == ['1 0 -1 fill=1 imp:n=1',
+                          '2 0 -2 u=2 imp:n=1',
+                          '3 0 -3 u=1 fill=2 imp:n=1']
+
+
+def test_variants(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    source = str(test_data_path / 'various_cards.mcnp')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(open(source).read())
+        with open('table', 'w') as f:
+            f.write('v1 c 1 -- 5: d=-1.0 imp:n=2\n'
+                    'v2 u 3: imp:p=4  # comment\n')
+        main(['--mode', 'variants', '--map', 'table', 'inp'])
+        v1 = open('inp.v1').read()
+        v2 = open('inp.v2').read()
+    out, err = capsys.readouterr()
+    assert '2 1 -1.0 -2 #1 imp:n 2 u=2' in v1
+    assert '5 2 0.1 -4 5 6 imp:n=1 imp:p=4 u=3' in v2
+    assert '1 0 -1 imp:n=1 fill=2 (3)' in v2
+    assert 'imp:p is not set in cell 3' in out
+
+
+def test_unused(tmpdir, capsys):
+    source = str(test_data_path / 'various_cards.mcnp')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(open(source).read().replace('5 6 7 imp:n=0', '5 6 8 imp:n=0'))
+        main(['--mode', 'unused', 'inp'])
+        out, err = capsys.readouterr()
+        main(['--mode', 'sinfo', 'inp'])
+        sinfo, err = capsys.readouterr()
+    assert 'Unused surfaces: 7\n' in out
+    assert 'Unused transformations: 4\n' in out
+    assert 'Undefined surfaces: 8\n' in out
+    assert sinfo.endswith('Undefined surfaces:\n8 [6]\n')
+
+
+def test_prune(tmpdir, capsys):
+    source = str(test_data_path / 'various_cards.mcnp')
+    text = open(source).read()
+    text = text.replace('7 pz 2\n', '7 pz 2\n8 5 px 3\n9 px 4\n')
+    text = text.replace('tr3 ', 'm3 1001 1\nmt3 lwtr.10t\ntr5 1 0 0\nf2 9\ntr3 ')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(text)
+        main(['--mode', 'prune', '--log', 'log', 'inp'])
+        log = open('log').read()
+    out, err = capsys.readouterr()
+    for l in ('8 5 px 3', 'm3 1001 1', 'mt3 lwtr.10t', 'tr5 1 0 0', '*tr4 0'):
+        i = text.index(l)
+        text = text[:i] + text[text.index('\n', i) + 1:]
+    assert out == text
+    assert log.splitlines() == ['Removed surfaces: 8',
+                                'Removed materials: 3',
+                                'Removed transformations: 4 5']
+
+
+def test_prune_data_refs(tmpdir, capsys):
+    source = str(test_data_path / 'various_cards.mcnp')
+    text = open(source).read()
+    text = text.replace('*fill=3 (0 0 1)', '*fill=3 (0 0 1) trcl=7')
+    text = text.replace('7 pz 2\n',
+                        '7 pz 2\n8 px 3\n9 px 4\n10 px 5\n11 px 6\n')
+    text = text.replace('tr3 ', 'm5 1001 1\nm6 1001 1\ntr6 1 0 0\n'
+                                'tr7 0 1 0\ntr3 ')
+    text += 'fm4 1 5 107\nsdef sur=8 tr=6\nfs4 -9\nsi1 l 10\n'
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(text)
+        main(['--mode', 'prune', '--log', 'log', 'inp'])
+        log = open('log').read()
+    out, err = capsys.readouterr()
+    for l in ('11 px 6', 'm6 1001 1', '*tr4 0'):
+        i = text.index(l)
+        text = text[:i] + text[text.index('\n', i) + 1:]
+    assert out == text
+    assert log.splitlines() == ['Removed surfaces: 11',
+                                'Removed materials: 6',
+                                'Removed transformations: 4']
+
+
+def test_prune_like_but(tmpdir, capsys):
+    source = str(test_data_path / 'various_cards.mcnp')
+    text = open(source).read()
+    text = text.replace('3 like 2 but u=3', '3 like 2 but mat=5 rho=-2.0 u=3')
+    text = text.replace('tr3 ', 'm5 1001 1\nmt5 lwtr.10t\nm6 1001 1\ntr3 ')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(text)
+        main(['--mode', 'prune', '--log', 'log', 'inp'])
+        log = open('log').read()
+    out, err = capsys.readouterr()
+    for l in ('m6 1001 1', '*tr4 0'):
+        i = text.index(l)
+        text = text[:i] + text[text.index('\n', i) + 1:]
+    assert out == text
+    assert log.splitlines() == ['Removed surfaces:',
+                                'Removed materials: 6',
+                                'Removed transformations: 4']
+
+
+@pytest.mark.parametrize("mode", ['remrp', 'remh', 'gsimp', 'minfo'])
+def test_jobs(tmpdir, capsys, mode):
+    source = str(test_data_path / 'various_cards.mcnp')
+    res = []
+    with cd_temporarily(tmpdir):
+        for jobs in ('1', '2'):
+            main(['--mode', mode, '--jobs', jobs, '--log', 'log', source])
+            out, err = capsys.readouterr()
+            log = open('log').read() if mode != 'minfo' else ''
+            res.append((out, log))
+    assert res[0] == res[1]
+
+
+def test_remh_cycles(tmpdir, capsys):
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('cycles\n'
+                    '1 0 -1 #2 imp:n=1\n'
+                    '2 0 -2 #3 imp:n=1\n'
+                    '3 0 -3 #1 imp:n=1\n'
+                    '4 0 -4 #1 imp:n=1\n'
+                    '5 0 -5 #6 imp:n=1\n'
+                    '6 0 -6 #7 imp:n=1\n'
+                    '7 0 -7 imp:n=1\n'
+                    '\n')
+        with pytest.warns(UserWarning, match='cells 1 2 3. 4 cells'):
+            main(['--mode', 'remh', '--log', 'log', 'inp'])
+        out, err = capsys.readouterr()
+        log = open('log').read()
+    assert '4 0 -4 #1 imp:n=1' in out
+    assert 'Complementary cell 6 start' in out
+    # referred cells are logged first
+    assert log.index('Cell         6') < log.index('Cell         5')
+    cyc = log[log.index('Cyclic complement references'):].splitlines()
+    assert [l.strip() for l in cyc[1:5]] == ['1', '2', '3', '4']
+
+
+def test_remh_budget(tmpdir, capsys):
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('budget\n'
+                    '1 0 -1 2 -3 4 -5 6 imp:n=1\n'
+                    '2 0 -2 #1 imp:n=1\n'
+                    '3 0 -3 #2 imp:n=1\n'
+                    '4 0 -4 #3 imp:n=1\n'
+                    '\n')
+        main(['--mode', 'remh', '--budget', '15', '--log', 'log', 'inp'])
+        out, err = capsys.readouterr()
+        log = open('log').read()
+    assert 'Complementary cell 2 start' in out
+    assert '4 0 -4 #3 imp:n=1' in out
+    assert '  1:          3        18\n' in log
+    assert '         2          1        13\n' in log
+
+
+def test_zrotate(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('zrotate\n'
+                    '1 0 -1 imp:n=1\n'
+                    '2 0 1 imp:n=0\n'
+                    '\n'
+                    '1 1 so 5\n'
+                    '2 px 3\n'
+                    '\n'
+                    'm1 1001 1\n'
+                    'tr1 1 0 0\n'
+                    '*tr2 1 2 3 30 60 90 120 30 90 90 90 0\n'
+                    'tr3 0 0 0 1 0 0\n')
+        main(['--mode', 'zrotate', '-c', '30', '-t', '9', 'inp'])
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert '2 9 px 3' in lines
+    assert lines[-4] == '*tr9 0 0 0 30.0 -60.0 90   120.0 30.0 90   90 90 0'
+    assert lines[-3].split() == ['tr1', '0.866025403784', '0.5', '0',
+                                 '0.866025403784', '0.5', '0', '-0.5',
+                                 '0.866025403784', '0', '0', '0', '1']
+    assert lines[-2].split()[4:] == ['60', '30', '90', '150', '60', '90',
+                                     '90', '90', '0']
+    # card with one vector keeps its form
+    assert lines[-1].split() == ['tr3', '0', '0', '0', '0.866025403784',
+                                 '0.5', '0']
+
+
+@pytest.mark.parametrize("bake", [False, True])
+def test_transform(tmpdir, capsys, bake):
+    pytest.importorskip('numpy')
+    with cd_temporarily(tmpdir):
+        with open('map', 'w') as f:
+            f.write('0 -1 0 10\n1 0 0 0\n0 0 1 0\n')
+        with open('inp', 'w') as f:
+            f.write('transform\n'
+                    '1 0 -1 2 -3 imp:n=1\n'
+                    '2 0 1 imp:n=0\n'
+                    '\n'
+                    '1 so 5\n'
+                    '*2 px 3  $ reflecting\n'
+                    '3 kz 1 2\n'
+                    '4 1 py 1\n'
+                    '\n'
+                    'tr1 1 0 0\n')
+        main(['--mode', 'transform', '--map', 'map', 'inp'] +
+             (['--bake'] if bake else []))
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    if bake:
+        assert lines[4:6] == ['1 sx 10 5', '*2 py 3 $ reflecting']
+    else:
+        assert lines[4:6] == ['1 2 so 5', '*2 2 px 3  $ reflecting']
+    assert lines[6:8] == ['3 2 kz 1 2', '4 1 py 1']
+    assert lines[-2] == 'tr2 10 0 0 0 1 0 -1 0 0 0 0 1'
+    assert lines[-1] == 'tr1 10 1 0 0 1 0 -1 0 0 0 0 1'
+
+
+def test_dedup(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('dedup\n'
+                    '1 1 -1.0 -1 imp:n=1\n'
+                    '2 2 -2.0 1 -2 imp:n=1 fill=5 (2)\n'
+                    '3 3 -3.0 2 imp:n=0\n'
+                    '\n'
+                    '1 1 so 5\n'
+                    '2 3 so 10\n'
+                    '\n'
+                    'm1 1001 2 8016 1\n'
+                    'm2 8016.80c 0.5 1001.80c 1.0\n'
+                    'm3 8016 1 1001 2\n'
+                    'mt2 lwtr\n'
+                    'tr1 1 0 0\n'
+                    '*tr2 1 0 0 0 90 90 90 0 90 90 90 0\n'
+                    'tr3 1 0 0 1 0 0 0 1 0\n')
+        main(['--mode', 'dedup', 'inp', '--log', 'log'])
+        out, err = capsys.readouterr()
+        with open('log') as f:
+            log = f.read().splitlines()
+    lines = out.splitlines()
+    assert lines[1:4] == ['1 1 -1.0 -1 imp:n=1',
+                          '2 2 -2.0 1 -2 imp:n=1 fill=5 (1)',
+                          '3 1 -3.0 2 imp:n=0']
+    assert lines[5:7] == ['1 1 so 5', '2 1 so 10']
+    assert lines[8:] == ['m1 1001 2 8016 1',
+                         'm2 8016.80c 0.5 1001.80c 1.0',
+                         'mt2 lwtr',
+                         'tr1 1 0 0']
+    assert 'm 1: 3' in log and 't 1: 2' in log and 'm 2: 2' in log
+
+
+def test_dedup_unmapped(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    text = ('dedup\n'
+            '1 1 -1.0 -1 imp:n=1 trcl=3\n'
+            '2 3 -2.0 1 imp:n=0\n'
+            '3 like 1 but mat=4 trcl=4\n'
+            '\n'
+            '1 2 so 5\n'
+            '\n'
+            'm1 1001 1\n'
+            'mt1 lwtr\n'
+            'm3 1001 1\n'
+            'mt3 lwtr\n'
+            'm4 1001 1\n'
+            'mt4 lwtr\n'
+            'tr2 1 0 0\n'
+            'tr3 1 0 0\n'
+            'tr4 1 0 0\n'
+            'sdef sur=1 tr=3\n'
+            'f4:n 1\n'
+            'fm4 1 3 -2\n')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(text)
+        main(['--mode', 'dedup', 'inp'])
+        out, err = capsys.readouterr()
+    assert out == text
+
+
+def test_matan(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('matan\n'
+                    '1 0 -1 imp:n=1\n'
+                    '\n'
+                    '1 so 5\n'
+                    '\n'
+                    'm1 1001.80c 2 8016.80c 1\n'
+                    'm2 6000 1\n'
+                    'm3 8016.70c 0.5 1001.70c 1\n')
+        main(['--mode', 'matan', 'inp'])
+        out, err = capsys.readouterr()
+    assert out.splitlines() == ['1 [1, 3]', '2 [2]']
+
+
+def test_mnew(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    with cd_temporarily(tmpdir):
+        with open('map', 'w') as f:
+            f.write('10 1 2.0 0.5 2 4.0 0.5\n')
+        with open('inp', 'w') as f:
+            f.write('mnew\n'
+                    '1 0 -1 imp:n=1\n'
+                    '\n'
+                    '1 so 5\n'
+                    '\n'
+                    'm1 26056 1\n'
+                    'm2 26056 1 6000 1\n')
+        main(['--mode', 'mnew', '--map', 'map', 'inp'])
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert lines[0] == 'c Material 10 mixed from inp, by mass:'
+    assert lines[1:3] == ['c    m1 1.0', 'c    m2 2.0']
+    assert lines[4].startswith('m10 26056 ')
+    assert lines[5].startswith('     6000 ')
+
+
+def test_matinfo_weights(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    mctal = str(test_data_path / 'volumes.mctal')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('matinfo\n'
+                    '1 1 -2.0 -1 imp:n=1\n'
+                    '2 2 0.1 1 -2 imp:n=1\n'
+                    '3 0 2 imp:n=1\n'
+                    '4 0 3 imp:n=0\n'
+                    '\n'
+                    '1 so 5\n'
+                    '2 so 10\n'
+                    '3 so 20\n'
+                    '\n'
+                    'm1 26056 1\n'
+                    'm2 1001 2 8016 1\n')
+        main(['--mode', 'matinfo', '-m', mctal + ' 14', 'inp'])
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    i = lines.index('No volume for cell  4')
+    rows = [l.split() for l in lines[i + 2:]]
+    assert [int(r[0]) for r in rows[:3]] == [0, 1, 2]
+    assert [float(r[1]) for r in rows[:3]] == [90., 30., 60.]
+    assert float(rows[1][2]) == 60.
+    assert float(rows[2][2]) == pytest.approx(60 * 0.1 * 6.0035 / 0.602214,
+                                              rel=1e-3)
+
+
+def test_matinfo_diagnostics(tmpdir, capsys):
+    pytest.importorskip('numpy')
+    mctal = str(test_data_path / 'volumes.mctal')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('matinfo\n'
+                    '1 1 -2.0 -1 imp:n=1\n'
+                    '2 3 0.1 1 -2 imp:n=1\n'
+                    '3 like 1 but mat=2 rho=-1.0\n'
+                    '4 0 3 imp:n=0\n'
+                    '5 like 9 but u=1\n'
+                    '\n'
+                    '1 so 5\n'
+                    '2 so 10\n'
+                    '3 so 20\n'
+                    '\n'
+                    'm1 26056 1\n')
+        main(['--mode', 'matinfo', '-m', mctal + ' 14', 'inp'])
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    i = lines.index('No volume for cell  4')
+    assert lines[i + 1:i + 4] == ['No volume for cell  5',
+                                  'No material card for cell  2',
+                                  'Like-but cell is not included  5']
+    rows = [l.split() for l in lines[i + 5:]]
+    # like-but cell 3 has material 2 and density 1 g/cm3
+    assert [r[0] for r in rows] == ['1', '2', '3', 'total']
+    assert [float(r[1]) for r in rows[:3]] == [30., 90., 60.]
+    assert [float(r[2]) for r in rows[:3]] == [60., 90., 0.]
+    assert rows[3][2:] == ['1.800000e+02', '1.500000e+02']
+
+
+@pytest.mark.parametrize("rules", [
+    'c 1 -- 2: 0.1 {:7.3f}\nm 2: 0.01\nc: 10.0\n',
+    'c 5: 0.5\nm 1 -- 2: 3 {:.2f}\n',
+    'm: 2.0\n',
+])
+def test_cdens(tmpdir, capsys, rules):
+    from numjuggler.main import cdens_text
+    from numjuggler.mapparsers import cdens
+    from numjuggler import parser as mp
+    source = str(test_data_path / 'various_cards.mcnp')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(open(source).read())
+        with open('my map', 'w') as f:
+            f.write(rules)
+        with open('map2', 'w') as f:
+            f.write('c 2: 0.5\n')
+        main(['--mode', 'cdens', '--map', 'my map', 'inp'])
+        out, err = capsys.readouterr()
+
+        # pure-Python variant, used without numpy
+        cards = list(mp.get_cards('inp'))
+        for c in cards:
+            if c.ctype == mp.CID.cell:
+                c.get_values()
+        base = [c.card() for c in cards]
+        m, mdef = cdens('my map')
+        assert ''.join(cdens_text(cards, base, m, mdef)) == out
+        assert ''.join(c.card() for c in cards) == ''.join(base)
+
+        # several map files, results are written to files
+        main(['--mode', 'cdens', '--map',
+              os.pathsep.join(('my map', 'map2')), 'inp'])
+        assert open('inp.my map').read() == out
+        assert '2 1 -3.900e+00 -2' in open('inp.map2').read()
+
+
+def test_tallies_usage(tmpdir, capsys):
+    source = str(test_data_path / 'simple_cubes.mcnp')
+    with pytest.raises(SystemExit) as e:
+        main(['--mode', 'tallies', source])
+    out, err = capsys.readouterr()
+    assert e.value.code == 2
+    assert out == ''
+    assert 'requires --map or -m' in err
+
+
+def test_tallies(tmpdir, capsys):
+    cells = [100 + i*i for i in range(30)]
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write('tallies\n'
+                    '1 0 -1 fill=4 imp:n=1\n'
+                    '2 0 1 -2 fill=5 imp:n=1\n'
+                    '3 0 2 imp:n=0\n')
+            for c in cells:
+                f.write('{} 0 -3 u=4 imp:n=1\n'.format(c))
+            f.write('20 0 -3 u=5 imp:n=1\n'
+                    '21 0 3 u=5 imp:n=1\n'
+                    '\n'
+                    '1 so 5\n'
+                    '2 so 10\n'
+                    '3 so 1\n'
+                    '\n')
+        with open('map', 'w') as f:
+            f.write('c volumes\n'
+                    'f4:n (u5 < 2)\n'
+                    '\n'
+                    'f14:n (u4 < u0)\n')
+        main(['--mode', 'tallies', '--map', 'map', 'inp'])
+        out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert lines[:3] == ['f4:n (20 21 < 2)', 'sd4 1 1r', 'fc4 2']
+    assert lines[-2:] == ['sd14 1 29r', 'fc14 30 3']
+    assert all(len(l) <= 80 for l in lines)
+    f14 = ' '.join(lines[3:-2]).split()
+    assert f14[0] == 'f14:n'
+    assert [int(c.strip('(')) for c in f14[1:31]] == cells
+    assert f14[31:] == ['<', '1', '2', '3)']
+
+
+def test_uinfo(tmpdir, capsys):
+    source = str(test_data_path / 'lattice.mcnp')
+    with cd_temporarily(tmpdir):
+        main(['--mode', 'uinfo', source])
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    # output of earlier versions is followed by the universe tree
+    i = lines.index('Universe tree')
+    assert lines[:4] == ['u0 1 8 ', '2', 'u1 2 ', '1']
+    assert lines[10:13] == ['Cells in universe  0', '1 ', '8 ']
+    assert lines[i + 1] == 'u0 (2 cells)'
+    assert lines[-2].startswith('Unused universes:')
+    assert lines[-1].startswith('Undefined universes:')
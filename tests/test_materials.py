@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+
+np = pytest.importorskip('numpy')
+mt = pytest.importorskip('numjuggler.materials')
+
+
+def test_parse_material():
+    z, f, o = mt.parse_material('m1 1001.80C 2 8016 -1.5e-1 NLIB = 80c')
+    assert z == ['1001.80c', '8016']
+    assert f == [2., -0.15]
+    assert o == {'nlib': '80c'}
+
+
+def test_read_material():
+    m = mt.read_material('m12 1001.80c 2 8016 1 1001.80c 1 nlib=80c')
+    assert m.name == 12
+    assert m.zaids.tolist() == [1001, 8016, 1001]
+    assert m.suffixes == ['80c', '', '80c']
+    m.merge()
+    assert m.zaids.tolist() == [1001, 8016]
+    assert m.fractions.tolist() == [3., 1.]
+    assert m.card() == ('m12 1001.80c 3.00000000e+00\n'
+                        '     8016 1.00000000e+00\n'
+                        '     nlib=80c\n')
+
+
+@pytest.mark.parametrize('zaid, mass', [
+    (1001, 1.00782503),
+    (6000, 12.011),
+    (8016, 15.9949146),
+    (26056, 55.9349375),
+    (92235, 235.0439299),
+    (95642, 242.0595494),
+])
+def test_nuclide_masses(zaid, mass):
+    assert mt.nuclide_masses([zaid])[0] == pytest.approx(mass, rel=2e-4)
+
+
+def test_conversion():
+    m = mt.read_material('m1 1001 2 8016 1')
+    assert not m.is_weight()
+    w = m.weight()
+    assert w.is_weight()
+    assert w.fractions.sum() == pytest.approx(-1.)
+    assert -w.fractions[0] == pytest.approx(2 * 1.00782503 / 18.0106, rel=1e-3)
+    assert w.atomic().fractions == pytest.approx([2 / 3, 1 / 3])
+    assert m.molar_mass() == pytest.approx(18.0106 / 3, rel=1e-3)
+    assert m.mass_density(-1.) == 1.
+    assert m.mass_density(0.1) == pytest.approx(
+        0.1 * m.molar_mass() / 0.602214076)
+
+
+def test_mix():
+    h = mt.read_material('m1 1001 1')
+    o = mt.read_material('m2 8016 1')
+    m = mt.mix([(h, 2 * 1.00782503), (o, 15.9949146)])
+    assert m.zaids.tolist() == [1001, 8016]
+    assert m.fractions == pytest.approx([2 / 3, 1 / 3], rel=1e-3)
+
+
+def test_material_key():
+    k1 = mt.material_key('m1 1001 2 8016 1')
+    assert k1 == mt.material_key('m5 8016 0.5 1001 0.5 1001 0.5')
+    assert k1 == mt.material_key('m5 8016 0.3333333 1001 0.6666667')
+    assert k1 != mt.material_key('m5 8016 -1 1001 -2')
+    assert k1 != mt.material_key('m5 8016 1 1001 2 nlib=80c')
+    assert k1 != mt.material_key('m1 1001 2 8016 1', ['mt1 lwtr'])
+    m1 = mt.read_material('m1 1001.80c 2 8016.80c 1')
+    m2 = mt.read_material('m2 1001.70c 2 8016.70c 1')
+    assert m1.key() != m2.key()
+    assert m1.key(suffixes=False) == m2.key(suffixes=False)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+
+np = pytest.importorskip('numpy')
+mctal = pytest.importorskip('numjuggler.mctal')
+
+test_data_path = path_resolver('tests')('data')
+fname = str(test_data_path / 'volumes.mctal')
+
+
+def test_read_tally():
+    t = mctal.read_tally(fname, 14)
+    assert t.fbins.tolist() == [1, 2, 3]
+    assert t.shape() == (3, 1, 1, 1, 1, 1, 3, 1)
+    assert t.flags['e'] == 't'
+    assert t.bounds['e'].tolist() == [1., 20.]
+    assert t.vals[1].ravel().tolist() == [40., 50., 60.]
+    v, e = t.fvals()
+    assert v.tolist() == [30., 60., 90.]
+    assert e.tolist() == [0.03, 0.02, 0.01]
+
+    t = mctal.read_tally(fname, 4)
+    assert t.fvals()[0].tolist() == [1., 2.]
+
+
+def test_missing_tally():
+    with pytest.raises(ValueError):
+        mctal.read_tally(fname, 24)
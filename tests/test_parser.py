@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler import parser as mp
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.fixture
+def cards():
+    source = str(test_data_path / 'various_cards.mcnp')
+    return list(mp.get_cards(source))
+
+
+def test_unmodified_cards(cards):
+    for c in cards:
+        c.get_values()
+        c.apply_map({})
+        if c.dtype != 'TRn':
+            assert not c.modified
+            assert c.card() == ''.join(c.lines)
+
+
+def test_modified_cards(cards):
+    c = cards[2]
+    c.get_values()
+    c.get_geom()
+    assert not c.modified
+    c.set_d('-1.0')
+    assert c.modified
+    assert c.card() == '2 1 -1.0 -2 #1 imp:n 1 u=2\n'
+
+
+def test_value_accessors(cards):
+    c = cards[5]
+    c.get_values()
+    assert c.get_m() == 2
+    assert c.get_u() == 3
+    assert c.get_f() is None
+    assert c.get_surfaces() == [4, 5, 6]
+    assert c.geom_prefix == ''
+    c.geom_suffix = ' 7'
+    assert c.geom_suffix == ' 7'
+    c = cards[4]
+    c.get_values()
+    assert c.get_refcells() == set([4])
+    assert c.get_surfaces() == [3, 4, 5]
+    assert c.get_f(newv=5) == 5
+    assert c.card().startswith('4 0 -3 #(4 -5) imp:n=1 *fill=5 (0 0 1)')
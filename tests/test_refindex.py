@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import json
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler.utils.io import cd_temporarily
+from numjuggler import parser as mp
+from numjuggler import refindex as ri
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.fixture
+def index():
+    return ri.get_index(str(test_data_path / 'various_cards.mcnp'))
+
+
+def test_references(index):
+    assert index.referrers('sur', 4, 'cel') == [4, 5, 6]
+    assert index.referrers('sur', 2, 'sur') == [3]
+    assert index.referrers('cel', 2) == [('cel', 3), ('tal', 4), ('tal', 14)]
+    assert index.referrers('tr', 3, 'cel') == [1]
+    assert index.referrers('tr', 3, 'sur') == [2]
+    assert index.referrers('u', 3, 'tal') == [14]
+    assert index.used('cel', 2, 'mat') == [1]
+    assert index.used('cel', 4, 'sur') == [3, 4, 5]
+    assert index.used('cel', 4, 'u') == [3]
+    assert index.names['u'] == [2, 3]
+    assert index.unused('tr') == [4]
+    assert index.unused('mat') == []
+    assert index.undefined('u') == []
+
+
+def test_parsed_cards(index):
+    cards = list(mp.get_cards(str(test_data_path / 'various_cards.mcnp')))
+    for c in cards:
+        c.get_values()
+    parsed = ri.from_cards(cards)
+    assert parsed.names == index.names
+    assert parsed.refs == index.refs
+    assert parsed.uses == index.uses
+
+
+def test_lattice():
+    pytest.importorskip('numpy')
+    index = ri.get_index(str(test_data_path / 'lattice_array.mcnp'))
+    assert index.referrers('u', 3, 'cel') == [2]
+    assert index.referrers('tr', 1, 'cel') == [2]
+    assert index.unused('u') == [5]
+
+
+def test_export(index, tmpdir):
+    with cd_temporarily(tmpdir):
+        index.write('refs.csv')
+        index.write('refs.json')
+        rows = open('refs.csv').read().splitlines()
+        d = json.load(open('refs.json'))
+    assert rows[0] == 'type,name,defined,referrer,names'
+    assert 'sur,4,1,cel,4 5 6' in rows
+    assert 'tr,4,1,,' in rows
+    assert d['sur']['4'] == {'defined': True, 'cel': [4, 5, 6]}
+    assert d['unused']['tr'] == [4]
+
+
+def test_live(index):
+    live = index.live()
+    assert live['sur'] == set(range(1, 8))
+    assert live['mat'] == set([1, 2])
+    assert live['tr'] == set([3])
+    assert index.live(roots=('tal',))['cel'] == set([1, 2, 3, 4, 5])
+
+
+def test_data_refs():
+    assert ri.card_refs(mp.CID.cell, None, '1 0 -1 *trcl=2 u=3') == [(2, 'tr')]
+    assert ri.card_refs(mp.CID.cell, None, '1 0 -1 trcl=(1 0 0)') == []
+    assert ri.card_refs(mp.CID.data, None, 'fm4 (1 5 107) (2 0 (1 2))') == [
+        ('fm4', 'dat'), (5, 'mat')]
+    assert ri.card_refs(mp.CID.data, None, 'sdef sur = 3 erg=14 tr=d1') == [
+        ('sdef', 'dat'), (3, 'sur')]
+    assert ri.card_refs(mp.CID.data, None, 'ssw 1 -2 (3) sym=1') == [
+        ('ssw', 'dat'), (1, 'sur'), (2, 'sur'), (3, 'cel')]
+    assert ri.card_refs(mp.CID.data, 'fmesh', 'fmesh4:n tr=5') == [(5, 'tr')]
+    assert ri.card_refs(mp.CID.data, None, 'imp:n 1 1 0') == []
+    assert ri.card_refs(mp.CID.data, None, 'si2 l 4') == [
+        ('si2', 'dat'), (4, 'sur'), (4, 'mat'), (4, 'tr')]
+
+
+def test_like_but_refs(tmpdir):
+    source = str(test_data_path / 'various_cards.mcnp')
+    text = open(source).read()
+    text = text.replace('3 like 2 but u=3', '3 like 2 but mat=5 trcl=4 u=3')
+    text = text.replace('tr3 ', 'm5 1001 1\ntr3 ')
+    with cd_temporarily(tmpdir):
+        with open('inp', 'w') as f:
+            f.write(text)
+        index = ri.get_index('inp')
+    assert index.referrers('mat', 5, 'cel') == [3]
+    assert index.referrers('tr', 4, 'cel') == [3]
+    assert index.unused('mat') == []
+    assert index.unused('tr') == []
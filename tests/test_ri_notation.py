@@ -0,0 +1,67 @@
+import pytest
+
+import numjuggler.ri_notation as rin
+import numjuggler.numbering as mn
+
+
+@pytest.mark.parametrize("list_, expected", [
+    ([], []),
+    ([5], [5]),
+    ([1, 2, 3, 4, 5], [1, '3i', 5]),
+    ([1, 1, 1, 1, 2], [1, '3r', 2]),
+    ([1, 2, 2, 2, 1], [1, 2, 2, 2, 1]),
+    ([1, 2, 3, 7, 9], [1, 2, 3, 7, 9]),
+    ([1, 2, 3, 3, 5, 6, 7, 21, 23, 25], [1, 2, 3, 3, 5, 6, 7, 21, 23, 25]),
+    ([1, 2, 3, 4, 10, 20, 30, 40], [1, '2i', 4, 10, '2i', 40]),
+])
+def test_shorten(list_, expected):
+    assert list(rin.shorten(list_)) == expected
+
+
+@pytest.mark.parametrize("list_", [
+    [1, 2, 2, 2, 1],
+    [1, 1, 1, 2],
+    [1, 2, 3, 4],
+    [1, 1, 2, 3, 3, 4, 5, 5, 5],
+    [1, 3, 4, 5, 7],
+    [1, 2, 4, 9, 11, 13],
+    [1, 2, 3, 3, 4, 5, 6],
+])
+@pytest.mark.parametrize("rmin, imin", [(1, 1), (2, 2), (3, 1), (1, 4)])
+def test_shorten_expand(list_, rmin, imin):
+    ls = rin.shorten(list_, rmin=rmin, imin=imin)
+    assert list(rin.expand(ls)) == list_
+
+
+@pytest.mark.parametrize("nn, expected", [
+    ([], []),
+    ([3], [(3, 3)]),
+    ([5, 1, 2, 3, 3, 7, 8], [(1, 3), (5, 5), (7, 8)]),
+    (set([10, 11, 12, 1]), [(1, 1), (10, 12)]),
+    ([1.5, 3, 2], [(1.5, 3)]),
+])
+def test_get_ranges_from_set(nn, expected):
+    assert list(mn._get_ranges_from_set(nn)) == expected
+
+
+def test_million_elements():
+    # Both functions must be linear in the list length: a million-element
+    # list with many short series takes a fraction of a second.
+    n = 10**6
+    cells = [i + i // 7 for i in range(n)]
+
+    ranges = list(mn._get_ranges_from_set(set(cells)))
+    short = rin.shorten(cells)
+
+    assert len(ranges) == n // 7 + 1
+    assert ranges[0] == (0, 6)
+    assert ranges[-1][1] == cells[-1]
+
+    # Series of 7 consecutive numbers separated by gaps, and the last
+    # incomplete series of n % 7 == 1 element.
+    expected = []
+    for k in range(n // 7):
+        expected.extend([8*k, '5i', 8*k + 6])
+    expected.append(8 * (n // 7))
+    assert short == expected
+    assert list(rin.expand(short)) == cells
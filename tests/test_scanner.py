@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler import parser as mp
+from numjuggler import numbering as mn
+from numjuggler import scanner
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.mark.parametrize("inp", [
+    'simple_cubes.mcnp',
+    'various_cards.mcnp',
+])
+def test_get_numbers(inp):
+    source = str(test_data_path / inp)
+    cards = list(mp.get_cards(source))
+    for c in cards:
+        c.get_values()
+    expected = mn.get_numbers(cards)
+    actual = scanner.get_numbers(source)
+    for t in ('cel', 'sur', 'mat', 'u', 'fill', 'tal', 'tr'):
+        assert expected.get(t, []) == actual.get(t, []), t
+
+
+def test_get_names():
+    source = str(test_data_path / 'various_cards.mcnp')
+    names = scanner.get_names(source)
+    assert names['cel'] == [1, 2, 3, 4, 5, 6]
+    assert names['sur'] == [1, 2, 3, 4, 5, 6, 7]
+    assert names['mat'] == [1, 2]
+    assert names['tr'] == [3, 4]
+    assert names['u'] == [2, 3, 3]
+    assert names['tal'] == [4, 14, 6, 24]
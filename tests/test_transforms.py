@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import pytest
+
+np = pytest.importorskip('numpy')
+tf = pytest.importorskip('numjuggler.transforms')
+
+trs = [('', [1., 2., 3.]),
+       ('*', [1., 2., 3., 30., 60., 90., 120., 30., 90., 90., 90., 0.]),
+       ('', [1., -2., 0.5, 0.6, 0.8, 0., -0.8, 0.6, 0., 0., 0., 1., -1.]),
+       ('*', [0., 0., 1., 30., 60., 90., 120., 30., 90.]),
+       ('*', [0., 1., 0., 90., 0., 90.])]
+
+
+def to_main(o, r, p):
+    # point p given in the auxiliary system, in the main system
+    return o + np.array(r).reshape((3, 3)).T.dot(p)
+
+
+def test_roundtrip():
+    tra = tf.TRArray(trs)
+    for (u, v), vals in zip(trs, tra.values()):
+        if len(v) == 3:
+            vals = vals[:3]
+        assert np.allclose(vals, v)
+
+
+def test_normalized():
+    tra = tf.TRArray(trs)
+    # M = -1: main origin is at (1, -2, 0.5) in the auxiliary system
+    o, r = tra.a[2, :3], tra.a[2, 3:]
+    assert np.allclose(to_main(o, r, [1., -2., 0.5]), 0.)
+    # z' is computed from x' and y'
+    assert np.allclose(tra.a[3, 9:], [0., 0., 1.])
+    assert np.allclose(tra.a[1, 3:], tra.a[3, 3:])
+    # y' and z' are computed from x'
+    r = tra.a[4, 3:].reshape((3, 3))
+    assert np.allclose(r[0], [0., 1., 0.])
+    assert np.allclose(r.dot(r.T), np.identity(3))
+    assert np.allclose(np.linalg.det(r), 1.)
+
+
+@pytest.mark.parametrize("t", [
+    tf.zrotation(30.),
+    tf.translation([1., 2., 3.]),
+    tf.zrotation(-45.).dot(tf.translation([0., 5., 0.])),
+])
+def test_apply(t):
+    tra = tf.TRArray(trs)
+    a0 = tra.a.copy()
+    tra.apply(t)
+    p = np.array([0.3, -1.2, 2.])
+    for r0, r1 in zip(a0, tra.a):
+        q0 = to_main(r0[:3], r0[3:], p)
+        q1 = to_main(r1[:3], r1[3:], p)
+        assert np.allclose(t[:3, :3].dot(q0) + t[:3, 3], q1)
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        tf.TRArray([('', [1., 2., 3., 4.])])
+    with pytest.raises(ValueError, match='TR card tr5 with 8 entries'):
+        tf.TRArray([('', [0.] * 3), ('', [0.] * 8)], [2, 5])
+
+
+def test_bake():
+    t = tf.zrotation(90.).dot(tf.translation([1., 0., 0.]))
+    surfaces = [('px', [2.]), ('p', [1., 1., 0., 1.]), ('so', [3.]),
+                ('sx', [1., 2.]), ('c/z', [1., 0., 2.]), ('cx', [1.]),
+                ('cy', [1.]), ('kz', [1., 2.]), ('p', [0.] * 9)]
+    res = tf.bake(surfaces, t)
+    assert res[0] == ('py', [3.])
+    assert res[1][0] == 'p'
+    assert np.allclose(res[1][1], [-1., 1., 0., 2.])
+    assert res[2] == ('sy', [1., 3.])
+    assert res[3] == ('sy', [2., 2.])
+    assert res[4] == ('c/z', [0., 2., 2.])
+    assert res[5] == ('cy', [1.])
+    assert res[6] == ('c/x', [1., 0., 1.])
+    assert res[7:] == [None, None]
+    # cylinder with tilted axis cannot be baked
+    assert tf.bake([('cx', [1.]), ('cz', [1.])],
+                   tf.zrotation(45.)) == [None, ('cz', [1.])]
+
+
+def test_bake_reflected_normal():
+    # rotation by 180 degrees: normals of px planes point to -x
+    res = tf.bake([('px', [5.]), ('p', [1., 0., 0., -3.]), ('py', [1.])],
+                  tf.zrotation(180.))
+    assert res[0] == ('p', [-1., 0., 0., 5.])
+    assert res[1] == ('p', [-1., 0., 0., -3.])
+    assert res[2] == ('p', [0., -1., 0., 1.])
+    # the sense of the surfaces is kept
+    t = tf.zrotation(180.)
+    for (st, cf), (st1, cf1) in zip([('px', [5.]), ('p', [1., 0., 0., -3.])],
+                                    res):
+        n = np.array(cf[:3] if st == 'p' else [1., 0., 0.])
+        p = np.array([10., 0., 0.])
+        s0 = n.dot(p) - cf[-1]
+        s1 = np.dot(cf1[:3], t[:3, :3].dot(p)) - cf1[-1]
+        assert s0 * s1 > 0
+
+
+def test_read_affine(tmpdir):
+    fname = str(tmpdir.join('map'))
+    with open(fname, 'w') as f:
+        f.write('# rotation and shift\n0 -1 0 10\n1 0 0 0\n0 0 1 0\n')
+    t = tf.read_affine(fname)
+    assert np.allclose(t, [[0, -1, 0, 10], [1, 0, 0, 0], [0, 0, 1, 0],
+                           [0, 0, 0, 1]])
+    assert tf.tr_values(t) == [10., 0., 0., 0., 1., 0., -1., 0., 0., 0.,
+                               0., 1.]
+    with open(fname, 'w') as f:
+        f.write('2 0 0 0\n0 1 0 0\n0 0 1 0\n')
+    with pytest.raises(ValueError):
+        tf.read_affine(fname)
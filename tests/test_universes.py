@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, nested_scopes
+
+import json
+
+import pytest
+from numjuggler.utils.resource import path_resolver
+from numjuggler.utils.io import cd_temporarily
+from numjuggler import universes as un
+
+test_data_path = path_resolver('tests')('data')
+
+
+@pytest.fixture
+def tree():
+    return un.get_tree(str(test_data_path / 'lattice.mcnp'))
+
+
+def test_hierarchy(tree):
+    assert tree.cells == {0: [1, 8], 1: [2], 2: [3, 4], 3: [5, 6], 4: [7]}
+    assert tree.fills == {1: [1], 2: [2, 3], 6: [4]}
+    assert [tree.depth(u) for u in range(5)] == [0, 1, 2, 2, 3]
+    assert tree.ancestors(4) == set([0, 1, 3])
+    assert tree.descendants(1) == set([2, 3, 4])
+    assert tree.all_cells(3) == [5, 6, 7]
+    assert tree.unused() == []
+    assert tree.undefined() == []
+
+
+def test_unused():
+    t = un.UniverseTree()
+    t.add_cell(1, 0, [5])
+    t.add_cell(2, 7)
+    t.add_cell(3, 7, [7, 0])
+    assert t.unused() == [7]
+    assert t.undefined() == [5]
+    assert t.depth(7) is None
+
+
+def test_tree_report(tree, tmpdir):
+    assert list(tree.tree()) == [
+        'u0 (2 cells)',
+        '    u1 (1 cells) in cells 1',
+        '        u2 (2 cells) in cells 2',
+        '        u3 (2 cells) in cells 2',
+        '            u4 (1 cells) in cells 6',
+    ]
+    with cd_temporarily(tmpdir):
+        tree.write_json('tree.json')
+        d = json.load(open('tree.json'))
+    assert d['universes']['3'] == {'cells': [5, 6], 'parents': [1],
+                                   'children': [4], 'depth': 2}